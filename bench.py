@@ -0,0 +1,1080 @@
+"""
+无界面的性能基准。
+
+按 default.plist 中类型、名称和提示词文本的分布生成合成提示词库（默认 1 万、10 万、
+100 万条），分别计时:
+- 从 main.py 和 prompts.py 早期的表结构迁移到最新结构，以及强制整表重建 prompts 表；
+- plist/JSON 导入、导出 JSON、通过本地 HTTP 服务的远程同步（未压缩、gzip/bz2/xz 文件和
+  Content-Encoding: gzip，并记录各自的传输字节数），多个带延迟的源并发和逐个同步，
+  以及服务器中途断开时的断点续传下载；
+- 按 fetchmany 流式导出 plist、CSV、TSV 和由同样条数的预设生成的 styles.csv（同时记录每秒行数），
+  以及子进程中一次构建字典导出 JSON 与流式导出 plist 的峰值 RSS；
+- 连续编辑时每次提交与交给写线程合并提交；
+- 在已同步的库上做 EDIT_COUNT 次编辑后导出增量（变更日志），以及导入该增量；
+- 通过共享文件夹同步：没有修改时的一次同步，一台机器 EDIT_COUNT 次编辑后两台机器各同步一次；
+- 把同样规模、名称大多重复的另一份 JSON 按“覆盖已有”合并进已有的库（暂存、统计和合并）；
+- 子进程中用 json.load 和流式读取导入 JSON 的峰值 RSS；
+- 一次加载整个提示词库、按需加载时的启动（initialize_prompt_type_dict）和第一次选中类型；
+- 常驻提示词库时的 GC 停顿和搜索；
+- 只读 plist 模式的建索引、打开和搜索。
+并比较旧字典结构与按列存放的提示词库的内存占用。
+
+命令行用法:
+    python bench.py [--sizes 10k,100k,1M] [--repeat 3] [--output bench.json]
+                    [--baseline old.json] [--threshold 1.25]
+结果以 JSON 写出；指定 --baseline 时与旧结果逐项比较，任一项的最好成绩变慢超过
+threshold 倍（且绝对差值超过 MIN_DELTA 秒）时退出码为 1；内存节省不足
+MIN_MEMORY_RATIO 倍时同样失败。
+"""
+import argparse
+import functools
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    import resource
+except ImportError:
+    # Windows 没有 resource 模块，跳过峰值 RSS 的测量
+    resource = None
+
+from compressed import CODECS
+from db_worker import DBWorker
+from download import download
+from changelog import export_changes, import_changes, set_state
+from file_sync import sync_folder
+from exporters import export_csv_file, export_plist_file, export_styles_csv, export_tsv_file
+from seed import file_sha256
+from library import (
+    export_json_data, import_json_data, import_json_file, import_plist_file, insert_prompt,
+    insert_type, load_prompt_type_dict, search_prompts, sync_remote_plist,
+)
+from merge import OVERWRITE, apply_merge, stage_json_file
+from migrations import migrate, rebuild_table
+from plist_index import PlistLibrary, index_path_for
+from remote_sync import Source, sync_sources
+from store import PromptStore
+
+DEFAULT_SIZES = "10k,100k,1M"
+DEFAULT_THRESHOLD = 1.25
+# 小于该差值（秒）的变慢视为噪声
+MIN_DELTA = 0.005
+SEARCH_QUERIES = 20
+# 断点续传用例中服务器每次连接发送的字节数占文件的比例
+DROP_FRACTION = 0.25
+# 多源同步的源数和每个源模拟的网络延迟（秒）
+SOURCE_COUNT = 4
+SOURCE_LATENCY = 0.2
+# 连续编辑用例中新增的提示词条数
+EDIT_COUNT = 1000
+# 按列存放的提示词库相对旧字典结构至少应节省的内存倍数
+MIN_MEMORY_RATIO = 3.0
+# 迁移用例中两个入口早期（user_version 为 0）的表结构
+OLD_LAYOUTS = {
+    "main": '''
+        CREATE TABLE prompt_types (id INTEGER PRIMARY KEY AUTOINCREMENT, type_name TEXT UNIQUE);
+        CREATE TABLE prompts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, type_id INTEGER, prompt_name TEXT, prompt_text TEXT,
+            introduction TEXT, FOREIGN KEY (type_id) REFERENCES prompt_types (id)
+        );
+        CREATE TABLE presets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, preset_name TEXT, prompt TEXT, negative_prompt TEXT
+        );
+    ''',
+    "prompts": '''
+        CREATE TABLE prompt_types (id INTEGER PRIMARY KEY AUTOINCREMENT, type_name TEXT UNIQUE);
+        CREATE TABLE prompts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, type_id INTEGER, prompt_name TEXT, prompt_text TEXT,
+            FOREIGN KEY (type_id) REFERENCES prompt_types (id)
+        );
+        CREATE TABLE presets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, preset_name TEXT, prompt TEXT, negative_prompt TEXT,
+            introduction TEXT
+        );
+    ''',
+}
+SEED_PLIST = os.path.join(os.path.dirname(os.path.abspath(__file__)), "default.plist")
+
+
+def parse_size(text):
+    """
+    解析 10k、100k、1M 这样的条数。
+    """
+    text = text.strip().lower()
+    scale = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    if scale != 1:
+        text = text[:-1]
+    return int(float(text) * scale)
+
+
+class LibraryModel:
+    """
+    从种子 plist 统计出的分布：类型频率、每个类型下的名称、变体数、每个变体的词数、
+    词汇表以及介绍的填充率。
+    """
+
+    def __init__(self, path=SEED_PLIST):
+        type_counts = Counter()
+        self.names = {}
+        self.variant_counts = []
+        self.word_counts = []
+        self.words = []
+        self.introductions = []
+        rows = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                fields = line.strip().split('^')
+                if len(fields) != 4:
+                    continue
+                type_name, prompt_name, prompt_text, introduction = fields
+                rows += 1
+                type_counts[type_name] += 1
+                self.names.setdefault(type_name, []).append(prompt_name)
+                variants = [v.split() for v in prompt_text.split('/') if v.strip()]
+                self.variant_counts.append(max(len(variants), 1))
+                for words in variants:
+                    self.word_counts.append(len(words))
+                    self.words.extend(words)
+                if introduction:
+                    self.introductions.append(introduction)
+        self.types = list(type_counts)
+        self.type_weights = [type_counts[t] for t in self.types]
+        self.introduction_rate = len(self.introductions) / max(rows, 1)
+
+    def generate(self, size, seed=0):
+        """
+        生成 size 条 (类型, 名称, 提示词, 介绍)，同一类型下的名称不重复。
+        """
+        rng = random.Random(seed)
+        types = rng.choices(self.types, weights=self.type_weights, k=size)
+        used = Counter()
+        rows = []
+        for type_name in types:
+            base = rng.choice(self.names[type_name])
+            used[type_name, base] += 1
+            count = used[type_name, base]
+            prompt_name = base if count == 1 else f"{base}{count}"
+            variants = []
+            for _ in range(rng.choice(self.variant_counts)):
+                words = rng.choices(self.words, k=rng.choice(self.word_counts))
+                variants.append(" ".join(words))
+            introduction = rng.choice(self.introductions) if rng.random() < self.introduction_rate else ""
+            rows.append((type_name, prompt_name, "/".join(variants), introduction))
+        return rows
+
+    def search_queries(self, count, seed=0):
+        rng = random.Random(seed)
+        queries = [rng.choice(self.words) for _ in range(count // 2)]
+        queries += [rng.choice(self.names[rng.choice(self.types)]) for _ in range(count - len(queries))]
+        return queries
+
+
+def write_plist(rows, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write("^".join(row) + "\n")
+
+
+def write_json(rows, path):
+    json_data = {}
+    for type_name, prompt_name, prompt_text, introduction in rows:
+        json_data.setdefault(type_name, {})[prompt_name] = {
+            "prompt_text": prompt_text,
+            "introduction": introduction
+        }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(json_data, f, ensure_ascii=False, indent=4)
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        # ?delay=秒 模拟远程源的响应延迟
+        query = parse_qs(urlsplit(self.path).query)
+        if "delay" in query:
+            time.sleep(float(query["delay"][0]))
+        if "drop" in query:
+            self._send_dropping(int(query["drop"][0]))
+            return
+        path = self.translate_path(self.path) + ".gz"
+        if query.get("encoding") == ["gzip"] and os.path.exists(path):
+            # 用预先压缩的 .gz 文件模拟 Content-Encoding: gzip 的响应
+            with open(path, "rb") as f:
+                body = f.read()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        super().do_GET()
+
+    def _send_dropping(self, limit):
+        # 支持 "Range: bytes=N-"，每次响应只发送 limit 字节就断开连接
+        path = self.translate_path(self.path)
+        size = os.path.getsize(path)
+        range_header = self.headers.get("Range")
+        start = int(range_header.split("=", 1)[1].split("-", 1)[0]) if range_header else 0
+        if start >= size:
+            self.send_error(416)
+            return
+        self.send_response(206 if range_header else 200)
+        if range_header:
+            self.send_header("Content-Range", f"bytes {start}-{size - 1}/{size}")
+        self.send_header("Content-Length", str(size - start))
+        self.send_header("ETag", f'"{size}"')
+        self.end_headers()
+        with open(path, "rb") as f:
+            f.seek(start)
+            self.wfile.write(f.read(limit))
+        self.close_connection = True
+
+
+class LocalServer:
+    """
+    在后台线程中提供目录下文件的本地 HTTP 服务，代替远程 prompt 地址。
+    """
+
+    def __init__(self, directory, handler=_QuietHandler):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(handler, directory=directory))
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, file_name, delay=None):
+        url = f"http://127.0.0.1:{self.httpd.server_address[1]}/{file_name}"
+        return url if delay is None else f"{url}?delay={delay}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class BenchContext:
+    """
+    单个规模的基准数据：合成的 plist/JSON 文件、一个已导入的数据库和本地 HTTP 服务。
+    """
+
+    def __init__(self, model, size, directory, server):
+        self.model = model
+        self.size = size
+        self.directory = directory
+        self.server = server
+        self.plist_path = os.path.join(directory, f"library_{size}.plist")
+        self.json_path = os.path.join(directory, f"library_{size}.json")
+        self.queries = model.search_queries(SEARCH_QUERIES)
+        rows = model.generate(size)
+        write_plist(rows, self.plist_path)
+        write_json(rows, self.json_path)
+        del rows
+
+        self.conn = self.fresh_db("library")
+        import_plist_file(self.conn, self.plist_path)
+        # 每条提示词对应一个预设，用于导出 styles.csv
+        self.conn.execute('''
+            INSERT INTO presets (preset_name, prompt, negative_prompt)
+            SELECT prompt_name, prompt_text, introduction FROM prompts ORDER BY id
+        ''')
+        self.conn.commit()
+        self.prompt_type_dict = load_prompt_type_dict(self.conn)
+        self.store = PromptStore(self.conn)
+        self.store.reload()
+        self.largest_type = max(self.store, key=lambda t: self.store[t]['count'])
+
+    def source_shards(self):
+        """
+        把 plist 按行轮流分成 SOURCE_COUNT 个源文件，返回带模拟延迟的 Source 列表。
+        """
+        paths = [os.path.join(self.directory, f"source_{self.size}_{i}.plist") for i in range(SOURCE_COUNT)]
+        if not os.path.exists(paths[-1]):
+            files = [open(path, "w", encoding="utf-8") for path in paths]
+            try:
+                with open(self.plist_path, "r", encoding="utf-8") as f:
+                    for i, line in enumerate(f):
+                        files[i % SOURCE_COUNT].write(line)
+            finally:
+                for out in files:
+                    out.close()
+        return [
+            Source(f"source{i}", self.server.url(os.path.basename(path), SOURCE_LATENCY), i)
+            for i, path in enumerate(paths)
+        ]
+
+    def compressed_path(self, suffix):
+        """
+        返回用 suffix 对应的算法压缩的 plist 路径，第一次调用时生成。
+        """
+        path = self.plist_path + suffix
+        if not os.path.exists(path):
+            with open(self.plist_path, "rb") as src, CODECS[suffix].open(path + ".tmp", "wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.replace(path + ".tmp", path)
+        return path
+
+    def merge_json_path(self):
+        """
+        返回用另一个随机种子生成的同规模 JSON，名称与库中的大多重复、内容不同，第一次调用时生成。
+        """
+        path = os.path.join(self.directory, f"merge_{self.size}.json")
+        if not os.path.exists(path):
+            write_json(self.model.generate(self.size, seed=1), path)
+        return path
+
+    def copy_db(self, name):
+        """
+        把已导入的库复制为新的数据库文件并返回其连接。
+        """
+        path = os.path.join(self.directory, f"{name}_{self.size}.db")
+        if os.path.exists(path):
+            os.remove(path)
+        conn = sqlite3.connect(path)
+        self.conn.backup(conn)
+        return conn
+
+    def fresh_db(self, name):
+        path = os.path.join(self.directory, f"{name}_{self.size}.db")
+        if os.path.exists(path):
+            os.remove(path)
+        conn = sqlite3.connect(path)
+        migrate(conn)
+        return conn
+
+    def close(self):
+        self.conn.close()
+
+
+def case_import_plist(ctx):
+    conn = ctx.fresh_db("import_plist")
+    try:
+        start = time.perf_counter()
+        import_plist_file(conn, ctx.plist_path)
+        return time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def case_import_json(ctx):
+    conn = ctx.fresh_db("import_json")
+    try:
+        start = time.perf_counter()
+        with open(ctx.json_path, "r", encoding="utf-8") as f:
+            json_data = json.load(f)
+        import_json_data(conn, json_data)
+        return time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def case_import_json_stream(ctx):
+    # 边读边解析，按批插入
+    conn = ctx.fresh_db("import_json")
+    try:
+        start = time.perf_counter()
+        import_json_file(conn, ctx.json_path)
+        return time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def case_merge_json(ctx):
+    # 暂存到临时表、统计差异，再用 INSERT ... SELECT ... ON CONFLICT 合并
+    json_path = ctx.merge_json_path()
+    conn = ctx.copy_db("merge")
+    try:
+        start = time.perf_counter()
+        stage_json_file(conn, json_path)
+        apply_merge(conn, OVERWRITE)
+        return time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def case_load(ctx):
+    start = time.perf_counter()
+    load_prompt_type_dict(ctx.conn)
+    return time.perf_counter() - start
+
+
+def case_open_store(ctx):
+    # 启动时只读取类型名称和条数
+    start = time.perf_counter()
+    PromptStore(ctx.conn).reload()
+    return time.perf_counter() - start
+
+
+def case_select_type(ctx):
+    # 第一次选中条数最多的类型
+    ctx.store.invalidate()
+    start = time.perf_counter()
+    list(ctx.store[ctx.largest_type]['prompts'])
+    return time.perf_counter() - start
+
+
+def case_export_json(ctx):
+    path = os.path.join(ctx.directory, f"export_{ctx.size}.json")
+    start = time.perf_counter()
+    json_data = export_json_data(ctx.conn)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(json_data, f, ensure_ascii=False, indent=4)
+    return time.perf_counter() - start
+
+
+def _streamed_export(ctx, export, suffix):
+    path = os.path.join(ctx.directory, f"export_{ctx.size}{suffix}")
+    start = time.perf_counter()
+    export(ctx.conn, path)
+    return time.perf_counter() - start
+
+
+def case_export_plist(ctx):
+    return _streamed_export(ctx, export_plist_file, ".plist")
+
+
+def case_export_csv(ctx):
+    return _streamed_export(ctx, export_csv_file, ".csv")
+
+
+def case_export_tsv(ctx):
+    return _streamed_export(ctx, export_tsv_file, ".tsv")
+
+
+def case_export_styles(ctx):
+    return _streamed_export(ctx, export_styles_csv, "_styles.csv")
+
+
+def case_remote_sync(ctx):
+    conn = ctx.fresh_db("remote_sync")
+    url = ctx.server.url(os.path.basename(ctx.plist_path))
+    try:
+        start = time.perf_counter()
+        sync_remote_plist(conn, url, os.path.join(ctx.directory, "default.plist"))
+        return time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def _compressed_sync(ctx, suffix, encoding=None):
+    path = ctx.compressed_path(suffix)
+    if encoding:
+        url = ctx.server.url(os.path.basename(ctx.plist_path)) + f"?encoding={encoding}"
+    else:
+        url = ctx.server.url(os.path.basename(path))
+    conn = ctx.fresh_db("remote_sync")
+    try:
+        start = time.perf_counter()
+        count = sync_remote_plist(conn, url, os.path.join(ctx.directory, "default.plist"))
+        elapsed = time.perf_counter() - start
+    finally:
+        conn.close()
+    # 压缩的内容没有解压就导入时不会报错，只会导入 0 条
+    if not count:
+        raise RuntimeError(f"{url} 没有导入任何提示词")
+    return elapsed
+
+
+def case_remote_sync_gz(ctx):
+    return _compressed_sync(ctx, ".gz")
+
+
+def case_remote_sync_bz2(ctx):
+    return _compressed_sync(ctx, ".bz2")
+
+
+def case_remote_sync_xz(ctx):
+    return _compressed_sync(ctx, ".xz")
+
+
+def case_remote_sync_gzip_encoding(ctx):
+    # 未压缩的 URL，服务端以 Content-Encoding: gzip 传输，下载时解压并按解压后的内容校验
+    return _compressed_sync(ctx, ".gz", encoding="gzip")
+
+
+def case_download_resume(ctx):
+    # 服务器每发送 1/4 就断开连接，下载需要续传 3 次并通过 SHA-256 校验
+    size = os.path.getsize(ctx.plist_path)
+    url = ctx.server.url(os.path.basename(ctx.plist_path)) + f"?drop={max(int(size * DROP_FRACTION), 1)}"
+    expected = file_sha256(ctx.plist_path)
+    path = os.path.join(ctx.directory, f"download_{ctx.size}.plist")
+    start = time.perf_counter()
+    download(url, path, sha256=expected)
+    elapsed = time.perf_counter() - start
+    os.remove(path)
+    return elapsed
+
+
+def _multi_sync(ctx, max_workers):
+    sources = ctx.source_shards()
+    conn = ctx.fresh_db("remote_multi")
+    try:
+        start = time.perf_counter()
+        sync_sources(conn, sources, max_workers=max_workers)
+        return time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def case_remote_multi(ctx):
+    # 多个带延迟的源同时下载，耗时应接近最慢的单个源
+    return _multi_sync(ctx, SOURCE_COUNT)
+
+
+def case_remote_multi_serial(ctx):
+    # 逐个下载作为对照
+    return _multi_sync(ctx, 1)
+
+
+def case_edits_commit_each(ctx):
+    # 旧做法：界面线程中每次编辑各提交一次
+    conn = ctx.fresh_db("edits")
+    try:
+        type_id = insert_type(conn, "edits")
+        conn.commit()
+        start = time.perf_counter()
+        for i in range(EDIT_COUNT):
+            insert_prompt(conn, type_id, f"edit{i}", "prompt", "")
+            conn.commit()
+        return time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def _edited_delta(ctx):
+    # 复制已导入的库并视为已同步，再修改或删除 EDIT_COUNT 条提示词，返回 (连接, 增量文件路径)
+    conn = ctx.copy_db("delta")
+    cursor = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log")
+    set_state(conn, "last_export_seq", cursor.fetchone()[0])
+    rows = conn.execute("SELECT id FROM prompts ORDER BY random() LIMIT ?", (EDIT_COUNT,)).fetchall()
+    for i, (prompt_id,) in enumerate(rows):
+        if i % 4 == 0:
+            conn.execute("DELETE FROM prompts WHERE id = ?", (prompt_id,))
+        else:
+            conn.execute("UPDATE prompts SET prompt_text = ? WHERE id = ?", (f"edited {i}", prompt_id))
+    conn.commit()
+    return conn, os.path.join(ctx.directory, f"delta_{ctx.size}.jsonl")
+
+
+def case_delta_export(ctx):
+    conn, path = _edited_delta(ctx)
+    try:
+        start = time.perf_counter()
+        export_changes(conn, path)
+        return time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def case_delta_import(ctx):
+    conn, path = _edited_delta(ctx)
+    try:
+        export_changes(conn, path)
+    finally:
+        conn.close()
+    # 应用到另一份未修改的库，复制的库标识相同，改为另一台机器
+    conn = ctx.copy_db("delta_target")
+    set_state(conn, "station_id", "bench-target")
+    conn.commit()
+    try:
+        start = time.perf_counter()
+        import_changes(conn, path)
+        return time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def _synced_station(ctx, folder, station):
+    # 复制已导入的库作为一台已经同步过的机器：日志文件已存在，之前的修改视为已发布
+    conn = ctx.copy_db(f"sync_{station}")
+    set_state(conn, "station_id", station)
+    set_state(conn, "sync_seq", conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0])
+    conn.commit()
+    open(os.path.join(folder, f"{station}.jsonl"), "w").close()
+    return conn
+
+
+def _sync_stations(ctx):
+    folder = os.path.join(ctx.directory, f"sync_{ctx.size}")
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder)
+    return _synced_station(ctx, folder, "bench-a"), _synced_station(ctx, folder, "bench-b"), folder
+
+
+def case_sync_noop(ctx):
+    # 两边都没有修改：只比较序号和文件大小
+    a, b, folder = _sync_stations(ctx)
+    try:
+        start = time.perf_counter()
+        sync_folder(a, folder)
+        return time.perf_counter() - start
+    finally:
+        a.close()
+        b.close()
+
+
+def case_sync_edits(ctx):
+    # 一台机器修改或删除 EDIT_COUNT 条提示词，同步到共享文件夹，另一台机器再同步
+    a, b, folder = _sync_stations(ctx)
+    try:
+        rows = a.execute("SELECT id FROM prompts ORDER BY random() LIMIT ?", (EDIT_COUNT,)).fetchall()
+        for i, (prompt_id,) in enumerate(rows):
+            if i % 4 == 0:
+                a.execute("DELETE FROM prompts WHERE id = ?", (prompt_id,))
+            else:
+                a.execute("UPDATE prompts SET prompt_text = ? WHERE id = ?", (f"edited {i}", prompt_id))
+        a.commit()
+        start = time.perf_counter()
+        sync_folder(a, folder)
+        sync_folder(b, folder)
+        return time.perf_counter() - start
+    finally:
+        a.close()
+        b.close()
+
+
+def case_edits_worker(ctx):
+    # 交给写线程，排队的编辑合并到同一个事务
+    conn = ctx.fresh_db("edits")
+    type_id = insert_type(conn, "edits")
+    conn.commit()
+    conn.close()
+    worker = DBWorker(None, os.path.join(ctx.directory, f"edits_{ctx.size}.db"))
+    try:
+        start = time.perf_counter()
+        futures = [worker.write(insert_prompt, type_id, f"edit{i}", "prompt", "") for i in range(EDIT_COUNT)]
+        futures[-1].result()
+        return time.perf_counter() - start
+    finally:
+        worker.close()
+
+
+def _old_layout_db(ctx, layout):
+    """
+    返回按 OLD_LAYOUTS[layout] 建表、内容与已导入的库相同的旧数据库的连接。
+    旧库第一次调用时生成，之后每次复制一份，迁移会修改它。
+    """
+    template = os.path.join(ctx.directory, f"old_{layout}_{ctx.size}.db")
+    if not os.path.exists(template):
+        conn = sqlite3.connect(template + ".tmp")
+        try:
+            conn.executescript(OLD_LAYOUTS[layout])
+            conn.execute("ATTACH DATABASE ? AS library", (os.path.join(ctx.directory, f"library_{ctx.size}.db"),))
+            conn.execute("INSERT INTO prompt_types SELECT id, type_name FROM library.prompt_types")
+            # 两种结构共有的列，多出的 introduction 按各自的结构复制
+            for table, columns in (("prompts", "id, type_id, prompt_name, prompt_text"),
+                                   ("presets", "id, preset_name, prompt, negative_prompt")):
+                old_columns = [row[1] for row in conn.execute(f"PRAGMA main.table_info({table})")]
+                if "introduction" in old_columns:
+                    columns += ", introduction"
+                conn.execute(f"INSERT INTO main.{table} ({columns}) SELECT {columns} FROM library.{table}")
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(template + ".tmp", template)
+    path = os.path.join(ctx.directory, f"migrate_{ctx.size}.db")
+    shutil.copyfile(template, path)
+    return sqlite3.connect(path)
+
+
+def _migrate_old_layout(ctx, layout):
+    conn = _old_layout_db(ctx, layout)
+    try:
+        start = time.perf_counter()
+        migrate(conn)
+        return time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def case_migrate_main(ctx):
+    # main.py 早期的库：prompts 有 introduction，presets 没有
+    return _migrate_old_layout(ctx, "main")
+
+
+def case_migrate_prompts(ctx):
+    # prompts.py 早期的库：presets 有 introduction，prompts 没有
+    return _migrate_old_layout(ctx, "prompts")
+
+
+def case_migrate_rebuild(ctx):
+    # 列有出入时 ensure_table 整表重建：一条 INSERT ... SELECT 拷贝整个 prompts 表
+    conn = ctx.copy_db("rebuild")
+    try:
+        start = time.perf_counter()
+        cursor = conn.cursor()
+        rebuild_table(cursor, "prompts")
+        conn.commit()
+        return time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def case_gc_collect(ctx):
+    # 提示词库常驻内存时一次完整 GC 的停顿
+    start = time.perf_counter()
+    gc.collect()
+    return time.perf_counter() - start
+
+
+def case_search(ctx):
+    start = time.perf_counter()
+    for query in ctx.queries:
+        search_prompts(ctx.store, query)
+    return time.perf_counter() - start
+
+
+def case_plist_index(ctx):
+    # 只读模式第一次打开 plist，需要建立索引
+    index_path = index_path_for(ctx.plist_path)
+    if os.path.exists(index_path):
+        os.remove(index_path)
+    start = time.perf_counter()
+    PlistLibrary(ctx.plist_path)
+    return time.perf_counter() - start
+
+
+def case_plist_open(ctx):
+    # 索引已存在时打开
+    PlistLibrary(ctx.plist_path)
+    start = time.perf_counter()
+    PlistLibrary(ctx.plist_path)
+    return time.perf_counter() - start
+
+
+def case_plist_search(ctx):
+    library = PlistLibrary(ctx.plist_path)
+    start = time.perf_counter()
+    for query in ctx.queries:
+        search_prompts(library, query)
+    return time.perf_counter() - start
+
+
+# 除耗时外还记录每秒行数的用例，每次处理的行数等于规模
+THROUGHPUT_CASES = {"export_json", "export_plist", "export_csv", "export_tsv", "export_styles"}
+
+# (名称, 计时函数)，计时函数返回本次运行的秒数
+CASES = [
+    ("migrate_main", case_migrate_main),
+    ("migrate_prompts", case_migrate_prompts),
+    ("migrate_rebuild", case_migrate_rebuild),
+    ("import_plist", case_import_plist),
+    ("import_json", case_import_json),
+    ("import_json_stream", case_import_json_stream),
+    ("merge_json", case_merge_json),
+    ("load_prompt_type_dict", case_load),
+    ("open_store", case_open_store),
+    ("select_type", case_select_type),
+    ("export_json", case_export_json),
+    ("export_plist", case_export_plist),
+    ("export_csv", case_export_csv),
+    ("export_tsv", case_export_tsv),
+    ("export_styles", case_export_styles),
+    ("remote_sync", case_remote_sync),
+    ("download_resume", case_download_resume),
+    ("remote_sync_gz", case_remote_sync_gz),
+    ("remote_sync_bz2", case_remote_sync_bz2),
+    ("remote_sync_xz", case_remote_sync_xz),
+    ("remote_sync_gzip_encoding", case_remote_sync_gzip_encoding),
+    ("remote_multi", case_remote_multi),
+    ("remote_multi_serial", case_remote_multi_serial),
+    ("edits_commit_each", case_edits_commit_each),
+    ("edits_worker", case_edits_worker),
+    ("delta_export", case_delta_export),
+    ("delta_import", case_delta_import),
+    ("sync_noop", case_sync_noop),
+    ("sync_edits", case_sync_edits),
+    ("gc_collect", case_gc_collect),
+    ("search", case_search),
+    ("plist_index", case_plist_index),
+    ("plist_open", case_plist_open),
+    ("plist_search", case_plist_search),
+]
+
+
+def load_nested_dict(conn):
+    """
+    按改为按列存放之前的嵌套字典结构加载 prompt_type_dict，用于内存对比。
+    """
+    prompt_type_dict = {}
+    type_id_to_name = {}
+    for type_id, type_name in conn.execute("SELECT id, type_name FROM prompt_types"):
+        prompt_type_dict[type_name] = {'id': type_id, 'prompts': {}}
+        type_id_to_name[type_id] = type_name
+    for prompt_id, type_id, prompt_name, prompt_text, introduction in conn.execute(
+            "SELECT id, type_id, prompt_name, prompt_text, introduction FROM prompts"):
+        type_name = type_id_to_name.get(type_id)
+        if type_name:
+            prompt_type_dict[type_name]['prompts'][prompt_name] = (prompt_id, prompt_text, introduction)
+    return prompt_type_dict
+
+
+def retained_bytes(load, conn):
+    """
+    返回 load(conn) 的结果常驻的字节数（tracemalloc 统计）。
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = load(conn)
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del result
+    return retained
+
+
+def measure_memory(ctx):
+    """
+    比较旧字典结构和按列存放的提示词库常驻内存的字节数。
+    """
+    nested = retained_bytes(load_nested_dict, ctx.conn)
+    store = retained_bytes(load_prompt_type_dict, ctx.conn)
+    return {
+        "prompt_type_dict": nested,
+        "prompt_store": store,
+        "ratio": nested / store if store else float("inf"),
+    }
+
+
+def _peak_rss():
+    # Linux 上 fork 出的子进程会继承父进程的 ru_maxrss，优先读取本进程的 VmHWM
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 上单位为字节，其他系统为 KB
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _json_import_peak_rss(json_path, db_path, streaming):
+    # 在子进程中执行，返回该进程的峰值 RSS（字节）
+    conn = sqlite3.connect(db_path)
+    try:
+        migrate(conn)
+        if streaming:
+            import_json_file(conn, json_path)
+        else:
+            with open(json_path, "r", encoding="utf-8") as f:
+                import_json_data(conn, json.load(f))
+    finally:
+        conn.close()
+    return _peak_rss()
+
+
+def measure_import_rss(ctx):
+    """
+    分别在新的子进程中用 json.load 和流式读取导入 JSON，返回两者的峰值 RSS（字节）。
+    没有 resource 模块的平台（Windows）返回 None。
+    """
+    if resource is None:
+        return None
+    result = {}
+    context = multiprocessing.get_context("spawn")
+    for name, streaming in (("json_load", False), ("stream", True)):
+        db_path = os.path.join(ctx.directory, f"rss_{ctx.size}.db")
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        with context.Pool(1) as pool:
+            result[name] = pool.apply(_json_import_peak_rss, (ctx.json_path, db_path, streaming))
+    return result
+
+
+def _export_peak_rss(db_path, out_path, streaming):
+    # 在子进程中执行，返回该进程的峰值 RSS（字节）
+    conn = sqlite3.connect(db_path)
+    try:
+        if streaming:
+            export_plist_file(conn, out_path)
+        else:
+            with open(out_path, "w", encoding="utf-8") as f:
+                json.dump(export_json_data(conn), f, ensure_ascii=False, indent=4)
+    finally:
+        conn.close()
+    return _peak_rss()
+
+
+def measure_export_rss(ctx):
+    """
+    分别在新的子进程中构建整个字典导出 JSON、流式导出 plist，返回两者的峰值 RSS（字节）。
+    没有 resource 模块的平台（Windows）返回 None。
+    """
+    if resource is None:
+        return None
+    db_path = os.path.join(ctx.directory, f"library_{ctx.size}.db")
+    result = {}
+    context = multiprocessing.get_context("spawn")
+    for name, streaming, suffix in (("json_dump", False, ".json"), ("stream", True, ".plist")):
+        out_path = os.path.join(ctx.directory, f"rss_export_{ctx.size}{suffix}")
+        with context.Pool(1) as pool:
+            result[name] = pool.apply(_export_peak_rss, (db_path, out_path, streaming))
+    return result
+
+
+def measure_transfer(ctx):
+    """
+    返回原始 plist 和本次已生成的各压缩文件的字节数，即远程同步的传输量。
+    """
+    sizes = {"plain": os.path.getsize(ctx.plist_path)}
+    for suffix in CODECS:
+        path = ctx.plist_path + suffix
+        if os.path.exists(path):
+            sizes[suffix.lstrip(".")] = os.path.getsize(path)
+    return sizes
+
+
+def run_benchmarks(sizes, repeat=3, cases=None, log=print):
+    """
+    运行基准。
+
+    返回值:
+    (results, memory, transfer)
+    - results: {规模: {用例: {"best", "mean", "runs"}}}，THROUGHPUT_CASES 中的用例另有 "rows_per_second"
+    - memory: {规模: measure_memory 的结果}
+    - transfer: {规模: measure_transfer 的结果}
+    """
+    model = LibraryModel()
+    selected = [(name, func) for name, func in CASES if cases is None or name in cases]
+    results = {}
+    memory = {}
+    transfer = {}
+    directory = tempfile.mkdtemp(prefix="prompts-bench-")
+    try:
+        with LocalServer(directory) as server:
+            for size in sizes:
+                ctx = BenchContext(model, size, directory, server)
+                try:
+                    size_results = {}
+                    for name, func in selected:
+                        runs = []
+                        for _ in range(repeat):
+                            gc.collect()
+                            runs.append(func(ctx))
+                        size_results[name] = {
+                            "best": min(runs),
+                            "mean": sum(runs) / len(runs),
+                            "runs": runs,
+                        }
+                        line = f"{size:>9} {name:<24} {min(runs) * 1000:10.1f} ms"
+                        if name in THROUGHPUT_CASES:
+                            size_results[name]["rows_per_second"] = size / min(runs)
+                            line += f"  {size / min(runs):,.0f} rows/s"
+                        log(line)
+                    results[str(size)] = size_results
+                    memory[str(size)] = measure_memory(ctx)
+                    log(f"{size:>9} {'memory':<24} {memory[str(size)]['prompt_type_dict'] / 1e6:10.1f} MB -> "
+                        f"{memory[str(size)]['prompt_store'] / 1e6:.1f} MB")
+                    rss = memory[str(size)]["json_import_rss"] = measure_import_rss(ctx)
+                    if rss:
+                        log(f"{size:>9} {'json_import_rss':<24} {rss['json_load'] / 1e6:10.1f} MB -> "
+                            f"{rss['stream'] / 1e6:.1f} MB")
+                    rss = memory[str(size)]["export_rss"] = measure_export_rss(ctx)
+                    if rss:
+                        log(f"{size:>9} {'export_rss':<24} {rss['json_dump'] / 1e6:10.1f} MB -> "
+                            f"{rss['stream'] / 1e6:.1f} MB")
+                    transfer[str(size)] = measure_transfer(ctx)
+                    log(f"{size:>9} {'transfer':<24} " + ", ".join(
+                        f"{codec} {length / 1e6:.2f} MB" for codec, length in transfer[str(size)].items()))
+                finally:
+                    ctx.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results, memory, transfer
+
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD, min_delta=MIN_DELTA):
+    """
+    逐项比较两次结果的最好成绩。
+
+    返回值:
+    [(规模, 用例, 旧秒数, 新秒数, 比值, 是否退化), ...]，只包含两边都有的项。
+    """
+    rows = []
+    for size, cases in current.items():
+        for name, result in cases.items():
+            old = baseline.get(size, {}).get(name)
+            if old is None:
+                continue
+            old_best, new_best = old["best"], result["best"]
+            ratio = new_best / old_best if old_best else float("inf")
+            regressed = ratio > threshold and new_best - old_best > min_delta
+            rows.append((size, name, old_best, new_best, ratio, regressed))
+    return rows
+
+
+def environment():
+    return {
+        "python": sys.version.split()[0],
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="提示词库性能基准")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="逗号分隔的库规模，如 10k,100k,1M")
+    parser.add_argument("--repeat", type=int, default=3, help="每个用例的运行次数，取最好成绩")
+    parser.add_argument("--cases", default=None, help="逗号分隔的用例名，默认全部")
+    parser.add_argument("--output", default=None, help="结果 JSON 的输出路径")
+    parser.add_argument("--baseline", default=None, help="用于比较的旧结果 JSON")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="判定退化的倍数")
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    cases = set(args.cases.split(",")) if args.cases else None
+    results, memory, transfer = run_benchmarks(sizes, repeat=args.repeat, cases=cases)
+    report = {
+        "environment": environment(),
+        "repeat": args.repeat,
+        "results": results,
+        "memory": memory,
+        "transfer": transfer,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+
+    failed = False
+    for size, result in memory.items():
+        if result["ratio"] < MIN_MEMORY_RATIO:
+            print(f"{size:>9} 内存只减少到 1/{result['ratio']:.2f}，应至少为 1/{MIN_MEMORY_RATIO}")
+            failed = True
+
+    if not args.baseline:
+        return 1 if failed else 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    regressions = 0
+    for size, name, old, new, ratio, regressed in compare_results(baseline, results, args.threshold):
+        flag = "退化" if regressed else ""
+        print(f"{size:>9} {name:<24} {old * 1000:10.1f} -> {new * 1000:10.1f} ms  x{ratio:.2f} {flag}")
+        regressions += regressed
+    print(f"共 {regressions} 项退化（阈值 x{args.threshold}）")
+    return 1 if regressions or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,385 @@
+"""
+基于变更日志的增量导出和导入。
+
+change_log 由触发器维护（见 migrations.PROMPT_LOG_TRIGGERS 和 PRESET_LOG_TRIGGERS），每次修改类型、提示词或预设时
+记录一行 (序号, 种类, 类型名称, 名称)，序号单调递增。export_changes 导出某个序号之后被修改过
+的键及其当前内容，同一个键多次修改只导出一次；import_changes 在另一台机器上应用这样的增量。
+
+增量文件为 JSON Lines（可以是 .gz/.bz2/.xz 压缩文件），第一行是文件头，其后每行一条变更:
+    {"format": "prompts-delta", "version": 1, "station": 本机标识, "since": N, "until": M}
+    {"op": "reset"}
+    {"op": "upsert"|"delete", "kind": "type", "type": 类型名称}
+    {"op": "upsert"|"delete", "kind": "prompt", "type": 类型名称, "name": 名称,
+     "prompt_text": ..., "introduction": ..., "updated_at": ...}
+    {"op": "upsert"|"delete", "kind": "preset", "name": 预设名称, "prompt": ..., "negative_prompt": ...}
+reset 表示整库替换导入（见 library.clear_prompts），之后跟着整个库的类型和提示词。导入方不清空
+自己的库，而是逐条比对后删除整库中没有的行，只有真正的差异会记入导入方的日志，
+reset 不会在两台机器之间来回传递。
+
+导入是幂等的：同一个增量导入多次结果相同；内容没有变化的行不会被改写，也就不会再次记入
+本机的变更日志，两台机器互相同步不会来回传递同样的修改。
+"""
+import json
+import uuid
+from collections import namedtuple
+from time import perf_counter_ns
+
+from compressed import open_file
+from library import record_import
+
+FORMAT = "prompts-delta"
+VERSION = 1
+FETCH_SIZE = 1000
+
+# 应用增量的结果
+# - changes: 文件中的变更条数
+# - skipped: 该增量已经导入过（until 不大于已导入的序号），没有做任何修改
+# - gap: 文件的起点晚于上次从同一台机器导入的终点，中间的修改可能缺失
+DeltaResult = namedtuple("DeltaResult", "changes skipped gap")
+
+
+def get_state(conn, name, default=None):
+    row = conn.execute("SELECT value FROM sync_state WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else default
+
+
+def set_state(conn, name, value):
+    conn.execute("INSERT OR REPLACE INTO sync_state (name, value) VALUES (?, ?)", (name, value))
+
+
+def station_id(conn):
+    """
+    返回本机数据库的标识，迁移时随机生成。
+    """
+    return get_state(conn, "station_id")
+
+
+def reset_station(conn):
+    """
+    给数据库分配新的本机标识，并清除所有同步进度（导出和导入的序号、同步文件夹的读取位置和版本向量）。
+
+    复制出来的数据库（例如随程序分发的种子数据库）与原来的库标识相同，需要重置后才能与其他机器同步。
+    调用方负责提交。
+    """
+    conn.execute("DELETE FROM sync_state")
+    conn.execute("INSERT INTO sync_state (name, value) VALUES ('station_id', ?)", (uuid.uuid4().hex,))
+    conn.execute("DELETE FROM row_versions")
+
+
+def current_seq(conn):
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+
+
+def last_export_seq(conn):
+    """
+    返回上次导出增量的终点，下一次默认从这里开始导出。
+    """
+    return get_state(conn, "last_export_seq", 0)
+
+
+def compact_change_log(conn):
+    """
+    删除不再需要的日志行：同一个键只保留最后一次修改；最后一次 reset 之前的类型和提示词修改
+    已被 reset 后的整库导出覆盖。对任何起点导出的结果都不变。
+
+    需要扫描整个日志（100 万行约 3 秒），不在导出时执行，由 main.py 启动时交给写线程在后台执行。
+    """
+    last_reset = conn.execute("SELECT MAX(seq) FROM change_log WHERE kind = 'reset'").fetchone()[0]
+    if last_reset is not None:
+        conn.execute("DELETE FROM change_log WHERE kind IN ('type', 'prompt', 'reset') AND seq < ?", (last_reset,))
+    conn.execute('''
+        DELETE FROM change_log WHERE seq NOT IN (
+            SELECT MAX(seq) FROM change_log GROUP BY kind, type_name, name
+        )
+    ''')
+
+
+def _iter_rows(cursor):
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            return
+        yield from rows
+
+
+def _iter_full_library(cursor):
+    # reset 之后：整个库的类型和提示词
+    cursor.execute("SELECT type_name FROM prompt_types ORDER BY id")
+    for type_name, in cursor.fetchall():
+        yield {"op": "upsert", "kind": "type", "type": type_name}
+    cursor.execute('''
+        SELECT prompt_types.type_name, prompts.prompt_name, prompts.prompt_text, prompts.introduction,
+            prompts.updated_at
+        FROM prompt_types JOIN prompts ON prompts.type_id = prompt_types.id
+        ORDER BY prompt_types.id, prompts.id
+    ''')
+    for type_name, prompt_name, prompt_text, introduction, updated_at in _iter_rows(cursor):
+        yield {
+            "op": "upsert", "kind": "prompt", "type": type_name, "name": prompt_name,
+            "prompt_text": prompt_text, "introduction": introduction, "updated_at": updated_at,
+        }
+
+
+def _iter_changed_prompts(cursor, since):
+    # 每个类型和提示词在 since 之后最后一次修改的当前内容，按序号排列，行已不存在时导出为删除
+    cursor.execute('''
+        SELECT c.kind, c.type_name, c.name, prompt_types.id,
+            prompts.id, prompts.prompt_text, prompts.introduction, prompts.updated_at
+        FROM (
+            SELECT kind, type_name, name, MAX(seq) AS seq FROM change_log
+            WHERE seq > ? AND kind IN ('type', 'prompt')
+            GROUP BY kind, type_name, name
+        ) AS c
+        LEFT JOIN prompt_types ON prompt_types.type_name = c.type_name
+        LEFT JOIN prompts ON c.kind = 'prompt' AND prompts.type_id = prompt_types.id AND prompts.prompt_name = c.name
+        ORDER BY c.seq
+    ''', (since,))
+    for kind, type_name, name, type_id, prompt_id, prompt_text, introduction, updated_at in _iter_rows(cursor):
+        if kind == "type":
+            yield {"op": "upsert" if type_id is not None else "delete", "kind": "type", "type": type_name}
+        elif prompt_id is None:
+            yield {"op": "delete", "kind": "prompt", "type": type_name, "name": name}
+        else:
+            yield {
+                "op": "upsert", "kind": "prompt", "type": type_name, "name": name,
+                "prompt_text": prompt_text, "introduction": introduction, "updated_at": updated_at,
+            }
+
+
+def _iter_changed_presets(cursor, since):
+    # 预设名称没有唯一约束，同名的取最后一个
+    cursor.execute('''
+        SELECT c.name, presets.id, presets.prompt, presets.negative_prompt
+        FROM (
+            SELECT name, MAX(seq) AS seq FROM change_log WHERE seq > ? AND kind = 'preset' GROUP BY name
+        ) AS c
+        LEFT JOIN presets ON presets.id = (SELECT MAX(id) FROM presets WHERE preset_name = c.name)
+        ORDER BY c.seq
+    ''', (since,))
+    for name, preset_id, prompt, negative_prompt in _iter_rows(cursor):
+        if preset_id is None:
+            yield {"op": "delete", "kind": "preset", "name": name}
+        else:
+            yield {"op": "upsert", "kind": "preset", "name": name, "prompt": prompt, "negative_prompt": negative_prompt}
+
+
+def iter_changes(cursor, since, full=False):
+    """
+    生成序号 since 之后的变更（export_changes 写入文件的内容）。起点之后有过整库替换或 full 为真时，
+    先生成 reset 和整个库的类型和提示词，否则只生成被修改过的；之后是被修改过的预设。
+
+    生成器依次执行查询，调用方需要在一个事务中读完，并且不能在读完之前使用同一个游标。
+    """
+    if not full:
+        cursor.execute("SELECT 1 FROM change_log WHERE kind = 'reset' AND seq > ? LIMIT 1", (since,))
+        full = cursor.fetchone() is not None
+    if full:
+        yield {"op": "reset"}
+        yield from _iter_full_library(cursor)
+    else:
+        yield from _iter_changed_prompts(cursor, since)
+    yield from _iter_changed_presets(cursor, since)
+
+
+def export_changes(conn, file_path, since=None):
+    """
+    把序号 since 之后的修改导出为增量文件，并把终点记为下一次导出的起点。
+
+    参数:
+    conn: 数据库连接，通常在 DBWorker 的线程中调用。
+    file_path: 增量文件路径，后缀为 .gz/.bz2/.xz 时边写边压缩。
+    since: 起点序号，None 表示上次导出的终点。
+
+    返回值:
+    (变更条数, 起点, 终点)
+    """
+    if since is None:
+        since = last_export_seq(conn)
+    cursor = conn.cursor()
+    count = 0
+    try:
+        # 在一个事务中读取，导出的内容与终点序号一致
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        until = current_seq(conn)
+        changes = iter_changes(cursor, since)
+        header = {"format": FORMAT, "version": VERSION, "station": station_id(conn), "since": since, "until": until}
+        with open_file(file_path, "wt") as f:
+            f.write(json.dumps(header, ensure_ascii=False) + "\n")
+            for change in changes:
+                f.write(json.dumps(change, ensure_ascii=False) + "\n")
+                count += 1
+        set_state(conn, "last_export_seq", until)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return count, since, until
+
+
+class ChangeApplier:
+    """
+    在一个事务中应用变更，缓存类型名称到 ID 的映射。
+    """
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.type_ids = {}
+        # reset 之后整库中出现过的类型 ID，提示词记在临时表 delta_seen 中；None 表示没有 reset
+        self.seen_types = None
+
+    def type_id(self, type_name, create):
+        type_id = self.type_ids.get(type_name)
+        if type_id is None:
+            if create:
+                self.cursor.execute(
+                    "INSERT INTO prompt_types (type_name) VALUES (?) ON CONFLICT (type_name) DO NOTHING", (type_name,)
+                )
+            row = self.cursor.execute("SELECT id FROM prompt_types WHERE type_name = ?", (type_name,)).fetchone()
+            if row is None:
+                return None
+            type_id = self.type_ids[type_name] = row[0]
+        return type_id
+
+    def begin_reset(self):
+        self.cursor.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS delta_seen (
+                type_id INTEGER,
+                prompt_name TEXT,
+                PRIMARY KEY (type_id, prompt_name)
+            ) WITHOUT ROWID
+        ''')
+        self.cursor.execute("DELETE FROM delta_seen")
+        self.seen_types = set()
+
+    def finish(self):
+        """
+        有 reset 时删除整库中没有出现的提示词和类型。
+        """
+        if self.seen_types is None:
+            return
+        cursor = self.cursor
+        cursor.execute('''
+            DELETE FROM prompts WHERE NOT EXISTS (
+                SELECT 1 FROM delta_seen
+                WHERE delta_seen.type_id = prompts.type_id AND delta_seen.prompt_name = prompts.prompt_name
+            )
+        ''')
+        cursor.execute("SELECT id FROM prompt_types")
+        stale = [(type_id,) for type_id, in cursor.fetchall() if type_id not in self.seen_types]
+        cursor.executemany("DELETE FROM prompt_types WHERE id = ?", stale)
+        cursor.execute("DROP TABLE temp.delta_seen")
+        self.seen_types = None
+
+    def apply(self, change):
+        op, kind = change["op"], change.get("kind")
+        cursor = self.cursor
+        if op == "reset":
+            self.begin_reset()
+        elif kind == "type":
+            if op == "upsert":
+                type_id = self.type_id(change["type"], create=True)
+                if self.seen_types is not None:
+                    self.seen_types.add(type_id)
+            else:
+                type_id = self.type_id(change["type"], create=False)
+                if type_id is not None:
+                    cursor.execute("DELETE FROM prompts WHERE type_id = ?", (type_id,))
+                    cursor.execute("DELETE FROM prompt_types WHERE id = ?", (type_id,))
+                    del self.type_ids[change["type"]]
+        elif kind == "prompt":
+            type_id = self.type_id(change["type"], create=op == "upsert")
+            if type_id is None:
+                return
+            if op == "upsert":
+                # 内容相同时不改写，避免再次记入本机的日志
+                cursor.execute('''
+                    INSERT INTO prompts (type_id, prompt_name, prompt_text, introduction, updated_at)
+                    VALUES (?,?,?,?,?)
+                    ON CONFLICT (type_id, prompt_name) DO UPDATE SET
+                        prompt_text = excluded.prompt_text, introduction = excluded.introduction,
+                        updated_at = excluded.updated_at
+                    WHERE prompts.prompt_text IS NOT excluded.prompt_text
+                        OR prompts.introduction IS NOT excluded.introduction
+                ''', (type_id, change["name"], change.get("prompt_text"), change.get("introduction"),
+                      change.get("updated_at")))
+                if self.seen_types is not None:
+                    self.seen_types.add(type_id)
+                    cursor.execute(
+                        "INSERT OR IGNORE INTO delta_seen (type_id, prompt_name) VALUES (?, ?)", (type_id, change["name"])
+                    )
+            else:
+                cursor.execute(
+                    "DELETE FROM prompts WHERE type_id = ? AND prompt_name = ?", (type_id, change["name"])
+                )
+        elif kind == "preset":
+            if op == "upsert":
+                values = (change.get("prompt"), change.get("negative_prompt"))
+                cursor.execute(
+                    "SELECT prompt, negative_prompt FROM presets WHERE preset_name = ?", (change["name"],)
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    cursor.execute(
+                        "INSERT INTO presets (preset_name, prompt, negative_prompt) VALUES (?,?,?)",
+                        (change["name"], *values)
+                    )
+                elif any(row != values for row in rows):
+                    cursor.execute(
+                        "UPDATE presets SET prompt = ?, negative_prompt = ? WHERE preset_name = ?",
+                        (*values, change["name"])
+                    )
+            else:
+                cursor.execute("DELETE FROM presets WHERE preset_name = ?", (change["name"],))
+        else:
+            raise ValueError(f"无法识别的变更: {change}")
+
+
+def import_changes(conn, file_path):
+    """
+    应用 export_changes 导出的增量文件，在一个事务中完成，失败时回滚。
+
+    已经导入过的增量（终点不大于上次从同一台机器导入的终点）直接跳过；导入本机导出的增量、
+    格式不对时抛出 ValueError。
+
+    返回值:
+    DeltaResult。
+    """
+    start = perf_counter_ns()
+    with open_file(file_path, "rt") as f:
+        try:
+            header = json.loads(f.readline())
+        except ValueError:
+            header = None
+        if not isinstance(header, dict) or header.get("format") != FORMAT:
+            raise ValueError("不是增量文件")
+        if header.get("version") != VERSION:
+            raise ValueError(f"不支持的增量文件版本: {header.get('version')}")
+        source = header["station"]
+        if source == station_id(conn):
+            raise ValueError("该增量文件是本机导出的")
+        applied_key = f"applied:{source}"
+        applied = get_state(conn, applied_key, 0)
+        if header["until"] <= applied:
+            return DeltaResult(0, True, False)
+
+        cursor = conn.cursor()
+        applier = ChangeApplier(cursor)
+        count = 0
+        try:
+            for line in f:
+                if line.strip():
+                    applier.apply(json.loads(line))
+                    count += 1
+            applier.finish()
+            set_state(conn, applied_key, header["until"])
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    record_import(count, start)
+    return DeltaResult(count, False, header["since"] > applied)
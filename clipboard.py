@@ -0,0 +1,115 @@
+"""
+剪贴板和复制历史。
+
+直接使用 Tk 自带的剪贴板（clipboard_clear / clipboard_append），不启动 xclip、xsel 等外部进程。
+最近复制的内容保存在固定长度的环形缓冲区中，可以搜索并重新复制；历史写入 JSON 文件，
+连续多次复制只在最后一次之后延迟写一次盘。
+
+注意：X11 下 Tk 剪贴板的内容由本程序持有，程序退出后如果没有剪贴板管理器，内容会随之消失。
+"""
+import json
+import os
+import time
+from collections import deque
+
+# 最多保留的历史条数
+HISTORY_SIZE = 50
+# 写盘延迟（毫秒），期间的多次复制合并为一次写入
+SAVE_DELAY_MS = 1000
+
+
+class ClipboardHistory:
+    """
+    复制文本到剪贴板并记录历史，最新的一条在最前面。
+
+    参数:
+    root: Tk 根窗口，用于访问剪贴板和安排延迟写盘。
+    path: 历史文件路径，为 None 时不持久化。
+    size: 最多保留的条数，超出时丢弃最旧的一条。
+    """
+
+    def __init__(self, root, path=None, size=HISTORY_SIZE, delay=SAVE_DELAY_MS):
+        self.root = root
+        self.path = path
+        self.delay = delay
+        self.entries = deque(maxlen=size)
+        self._save_job = None
+        self.load()
+
+    def copy(self, text, label=""):
+        """
+        把 text 放入剪贴板并记入历史；与已有条目相同的文本会移到最前面而不是重复记录。
+        """
+        self.root.clipboard_clear()
+        self.root.clipboard_append(text)
+        for entry in self.entries:
+            if entry["text"] == text:
+                self.entries.remove(entry)
+                break
+        self.entries.appendleft({"text": text, "label": label, "time": time.time()})
+        self.schedule_save()
+
+    def recall(self, index):
+        """
+        重新复制第 index 条历史（0 为最新），返回其文本。
+        """
+        entry = self.entries[index]
+        self.copy(entry["text"], entry["label"])
+        return entry["text"]
+
+    def search(self, keyword):
+        """
+        返回文本或标签包含关键字中全部词（不区分大小写）的条目，按从新到旧排列。
+        """
+        words = keyword.lower().split()
+        return [
+            entry for entry in self.entries
+            if all(word in f"{entry['label']}\n{entry['text']}".lower() for word in words)
+        ]
+
+    def clear(self):
+        self.entries.clear()
+        self.schedule_save()
+
+    def schedule_save(self):
+        if self.path is None or self._save_job is not None:
+            return
+        self._save_job = self.root.after(self.delay, self.flush)
+
+    def flush(self):
+        """
+        立即写入历史文件，取消尚未执行的延迟写入。程序退出前应调用一次。
+        """
+        if self._save_job is not None:
+            try:
+                self.root.after_cancel(self._save_job)
+            except Exception:
+                pass
+            self._save_job = None
+        if self.path is None:
+            return
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(list(self.entries), f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"保存剪贴板历史失败: {e}")
+
+    def load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取剪贴板历史失败: {e}")
+            return
+        self.entries.clear()
+        for entry in entries[:self.entries.maxlen]:
+            if isinstance(entry, dict) and isinstance(entry.get("text"), str):
+                self.entries.append({
+                    "text": entry["text"],
+                    "label": str(entry.get("label", "")),
+                    "time": entry.get("time", 0),
+                })
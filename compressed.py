@@ -0,0 +1,90 @@
+"""
+压缩的提示词库文件和传输。
+
+支持 .gz、.bz2、.xz 后缀的文件和 URL，以及 HTTP 响应的 Content-Encoding: gzip。
+读写都通过对应模块的流式文件对象进行，解压和压缩按块完成，不会把整个文件读进内存。
+"""
+import bz2
+import gzip
+import io
+import lzma
+import os
+import urllib.request
+from urllib.parse import urlsplit
+
+# 文件后缀 -> 压缩模块，三个模块的 open 接口相同
+CODECS = {
+    ".gz": gzip,
+    ".bz2": bz2,
+    ".xz": lzma,
+}
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def compression_suffix(path):
+    """
+    返回 path（文件路径或 URL）的压缩后缀，未压缩时返回空字符串。
+    """
+    path = urlsplit(path).path if "://" in path else path
+    suffix = os.path.splitext(path)[1].lower()
+    return suffix if suffix in CODECS else ""
+
+
+def strip_compression_suffix(path):
+    """
+    去掉压缩后缀，例如 "library.json.gz" -> "library.json"，用于判断内容格式。
+    """
+    suffix = compression_suffix(path)
+    return path[:-len(suffix)] if suffix else path
+
+
+def open_file(path, mode="rt", encoding="utf-8", newline=None):
+    """
+    按后缀打开可能压缩的文件，接口与内置 open 相同；文本模式下使用 encoding 和 newline。
+    """
+    codec = CODECS.get(compression_suffix(path))
+    if "b" in mode:
+        return codec.open(path, mode) if codec else open(path, mode)
+    if codec:
+        return codec.open(path, mode, encoding=encoding, newline=newline)
+    return open(path, mode, encoding=encoding, newline=newline)
+
+
+def decode_response(response):
+    """
+    按 Content-Encoding 返回解码后的二进制流，未编码时原样返回。
+    """
+    encoding = (response.headers.get("Content-Encoding") or "").strip().lower()
+    if encoding in ("gzip", "x-gzip"):
+        return gzip.GzipFile(fileobj=response)
+    if encoding not in ("", "identity"):
+        raise ValueError(f"不支持的 Content-Encoding: {encoding}")
+    return response
+
+
+def wrap_reader(stream, path):
+    """
+    按 path 的压缩后缀在二进制流外再套一层解压。
+    """
+    suffix = compression_suffix(path)
+    if suffix == ".gz":
+        return gzip.GzipFile(fileobj=stream)
+    if suffix == ".bz2":
+        return bz2.BZ2File(stream)
+    if suffix == ".xz":
+        return lzma.LZMAFile(stream)
+    return stream
+
+
+def open_url(url, timeout=None):
+    """
+    打开 URL，请求 gzip 传输编码，返回 (response, 解压后的文本流)。
+
+    调用方负责关闭 response。URL 以压缩后缀结尾时，文件内容也会一并解压。
+    """
+    request = urllib.request.Request(url, headers={"Accept-Encoding": "gzip"})
+    kwargs = {} if timeout is None else {"timeout": timeout}
+    response = urllib.request.urlopen(request, **kwargs)
+    stream = wrap_reader(decode_response(response), url)
+    return response, io.TextIOWrapper(stream, encoding="utf-8")
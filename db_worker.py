@@ -0,0 +1,222 @@
+"""
+后台的单写线程数据库工作者。
+
+所有写操作都交给 DBWorker 的线程执行，该线程独占一个写连接，界面线程只用自己的连接读。
+数据库使用 WAL 模式，读不会被正在进行的写阻塞，读到的总是最后一次提交的数据。
+
+提交的操作返回 concurrent.futures.Future；给出 callback/errback 时，结果通过 root.after
+轮询送回界面线程再调用，回调中可以直接操作控件。
+
+write 提交的小操作会合并：线程取到一个写操作时，把队列里紧随其后的写操作一并取出，
+在一个事务中执行，每个操作各有一个 SAVEPOINT，单个操作失败只回滚它自己，
+连续的编辑只需要一次提交。run 提交的操作（导入、同步等）自己管理事务，单独执行。
+"""
+import queue
+import sys
+import threading
+from concurrent.futures import Future
+from time import perf_counter_ns
+
+import metrics
+import sqltrace
+
+# 一个事务最多合并的写操作数
+MAX_BATCH = 64
+# 有未完成的回调时轮询结果队列的间隔（毫秒）
+POLL_MS = 20
+
+_WRITE = "write"
+_RUN = "run"
+
+_batch_size = metrics.histogram("db.worker.batch", unit="ops")
+_commits = metrics.counter("db.worker.commits")
+_queue_wait = metrics.histogram("db.worker.queue_wait")
+_failures = metrics.counter("db.worker.errors")
+
+
+class DBWorker:
+    """
+    参数:
+    root: Tk 主窗口，用于把结果送回界面线程；为 None 时只能通过 Future 取结果。
+    path: 数据库文件路径。
+    max_batch: 一个事务最多合并的写操作数。
+    """
+
+    def __init__(self, root, path, max_batch=MAX_BATCH):
+        self.root = root
+        self.path = path
+        self.max_batch = max_batch
+        self._tasks = queue.Queue()
+        self._results = queue.SimpleQueue()
+        # 只在界面线程中读写
+        self._waiting = 0
+        self._polling = False
+        ready = Future()
+        self._thread = threading.Thread(target=self._run, args=(ready,), name="db-worker", daemon=True)
+        self._thread.start()
+        # 连接打不开时在构造处抛出，而不是在第一次写的时候
+        ready.result()
+
+    def write(self, func, *args, callback=None, errback=None):
+        """
+        提交写操作 func(conn, *args)，可能与其他写操作合并到同一个事务。
+
+        func 不能自己 commit 或 rollback，抛出异常时它做的修改会被撤销。
+        """
+        return self._submit(_WRITE, func, args, callback, errback)
+
+    def run(self, func, *args, callback=None, errback=None):
+        """
+        提交自行管理事务的操作 func(conn, *args)，例如导入，单独执行、不与其他操作合并。
+        """
+        return self._submit(_RUN, func, args, callback, errback)
+
+    def _submit(self, kind, func, args, callback, errback):
+        future = Future()
+        self._tasks.put((kind, func, args, future, metrics.current_action(), perf_counter_ns()))
+        if callback or errback:
+            self._waiting += 1
+            future.add_done_callback(lambda f: self._results.put((f, callback, errback)))
+            if not self._polling:
+                self._polling = True
+                self.root.after(POLL_MS, self._poll)
+        return future
+
+    def _poll(self):
+        # 在界面线程中调用已完成操作的回调
+        try:
+            while True:
+                try:
+                    future, callback, errback = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                self._waiting -= 1
+                # 回调出错（例如对话框已关闭时操作其中的控件）只报告，不影响后面的回调
+                try:
+                    error = future.exception()
+                    if error is None:
+                        if callback:
+                            callback(future.result())
+                    elif errback:
+                        errback(error)
+                    else:
+                        print(f"数据库操作失败: {error}")
+                except Exception:
+                    self.root.report_callback_exception(*sys.exc_info())
+        finally:
+            # 无论如何都要继续轮询，否则之后的回调再也不会被调用
+            if self._waiting:
+                self.root.after(POLL_MS, self._poll)
+            else:
+                self._polling = False
+
+    def close(self, timeout=None):
+        """
+        等待已提交的操作执行完后关闭连接，之后提交的操作不会执行。
+        """
+        self._tasks.put(None)
+        self._thread.join(timeout)
+
+    def _run(self, ready):
+        try:
+            conn = sqltrace.connect(self.path)
+            # 由本线程显式开始和提交事务
+            conn.isolation_level = None
+            conn.execute("PRAGMA journal_mode=WAL")
+            # WAL 模式下 NORMAL 只在检查点时同步，断电最多丢失最后几次提交，数据库不会损坏
+            conn.execute("PRAGMA synchronous=NORMAL")
+        except BaseException as e:
+            ready.set_exception(e)
+            return
+        ready.set_result(None)
+        pending = None
+        try:
+            while True:
+                task = pending or self._tasks.get()
+                pending = None
+                if task is None:
+                    break
+                if task[0] == _RUN:
+                    self._execute(conn, task)
+                    continue
+                batch = [task]
+                while len(batch) < self.max_batch:
+                    try:
+                        task = self._tasks.get_nowait()
+                    except queue.Empty:
+                        break
+                    if task is None or task[0] != _WRITE:
+                        pending = task
+                        break
+                    batch.append(task)
+                self._write_batch(conn, batch)
+        finally:
+            conn.close()
+
+    def _start(self, task):
+        # 返回 False 表示 Future 已被取消
+        future, submitted = task[3], task[5]
+        if not future.set_running_or_notify_cancel():
+            return False
+        _queue_wait.record(perf_counter_ns() - submitted)
+        return True
+
+    def _execute(self, conn, task):
+        _, func, args, future, action, _ = task
+        if not self._start(task):
+            return
+        # 与普通连接一样隐式开始事务，由 func 自己提交
+        conn.isolation_level = ""
+        metrics.push_action(action)
+        try:
+            result = func(conn, *args)
+        except BaseException as e:
+            if conn.in_transaction:
+                conn.rollback()
+            _failures.inc()
+            future.set_exception(e)
+        else:
+            if conn.in_transaction:
+                conn.commit()
+                _commits.inc()
+            future.set_result(result)
+        finally:
+            metrics.pop_action()
+            conn.isolation_level = None
+
+    def _write_batch(self, conn, batch):
+        batch = [task for task in batch if self._start(task)]
+        if not batch:
+            return
+        _batch_size.record(len(batch))
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for _, func, args, future, action, _ in batch:
+                conn.execute("SAVEPOINT op")
+                metrics.push_action(action)
+                try:
+                    result = func(conn, *args)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO op")
+                    _failures.inc()
+                    outcomes.append((future, None, e))
+                else:
+                    outcomes.append((future, result, None))
+                finally:
+                    metrics.pop_action()
+                    conn.execute("RELEASE op")
+            conn.execute("COMMIT")
+            _commits.inc()
+        except BaseException as e:
+            # 提交本身失败，整批都没有写入
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for task in batch:
+                task[3].set_exception(e)
+            return
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
@@ -0,0 +1,208 @@
+"""
+提示词库近似重复检测（MinHash + LSH）与合并。
+
+prompt_text 先按 '/' 拆分变体并切成小写单词集合作为 shingle，因此大小写、词序
+和重复的变体（如 through glass/through glass/against glass）都不影响比较。
+单词集合完全相同的条目先直接归为一组，其余集合再计算 MinHash 签名，
+按 band 分桶找出候选并用真实 Jaccard 相似度确认，整体复杂度接近线性。
+分组只包含同一类型的条目，合并也只允许在同一类型内进行。
+"""
+import random
+import re
+import zlib
+from collections import namedtuple
+
+import metrics
+from library import timestamp
+from matcher import split_variants
+
+NUM_PERM = 32
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+THRESHOLD = 0.6
+# 每个桶最多保留的代表集合数，热门桶不会产生平方级的候选对
+BUCKET_REPRESENTATIVES = 8
+
+# capped: 因桶已满未能放入全部桶的集合数，与它们相似的集合可能漏检
+DuplicateReport = namedtuple("DuplicateReport", "clusters capped")
+
+_capped_sets = metrics.counter("dedupe.capped_sets")
+
+_MERSENNE = (1 << 61) - 1
+_WORD = re.compile(r'[^\s,/]+')
+
+
+def shingles(prompt_text):
+    """
+    把 prompt_text 转为单词集合。
+    """
+    return frozenset(_WORD.findall((prompt_text or "").lower()))
+
+
+class MinHasher:
+    """
+    计算 MinHash 签名，单词的哈希结果会缓存，提示词库中的词汇量远小于行数。
+    """
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = random.Random(seed)
+        self.params = [(rng.randrange(1, _MERSENNE), rng.randrange(0, _MERSENNE)) for _ in range(num_perm)]
+        self._word_cache = {}
+
+    def _word_hashes(self, word):
+        hashes = self._word_cache.get(word)
+        if hashes is None:
+            h = zlib.crc32(word.encode('utf-8'))
+            hashes = tuple((a * h + b) % _MERSENNE for a, b in self.params)
+            self._word_cache[word] = hashes
+        return hashes
+
+    def signature(self, words):
+        if not words:
+            return (0,) * len(self.params)
+        return tuple(map(min, zip(*[self._word_hashes(w) for w in words])))
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def find_duplicate_clusters(rows, threshold=THRESHOLD):
+    """
+    找出近似重复的条目分组。
+
+    参数:
+    rows: 可迭代的 (id, type_name, prompt_name, prompt_text) 元组。
+    threshold: 判定为重复的 Jaccard 相似度下限。
+
+    返回值:
+    DuplicateReport(clusters, capped)
+    - clusters: 分组列表，每组为同一类型、按 id 排序的行列表，组按大小降序排列。
+    - capped: 因桶已满（BUCKET_REPRESENTATIVES）未能放入全部桶的集合数。
+    """
+    # 第一步：同一类型下单词集合完全相同的行直接归为同一组
+    groups = {}
+    for row in rows:
+        words = shingles(row[3])
+        if words:
+            groups.setdefault((row[1], words), []).append(row)
+    keys = list(groups)
+
+    # 第二步：对不同的单词集合做 MinHash + LSH 分桶，桶按类型区分，候选只在同一类型内比较。
+    # 每个集合归入第一个与之足够相似的中心集合，不做传递合并，避免链式聚成巨型分组。
+    hasher = MinHasher()
+    signatures = {}
+    center_of = list(range(len(keys)))
+    buckets = {}
+    capped = 0
+    for index, (type_name, words) in enumerate(keys):
+        # 同样的单词集合出现在多个类型下时只计算一次签名
+        signature = signatures.get(words)
+        if signature is None:
+            signature = signatures[words] = hasher.signature(words)
+        bucket_keys = [(type_name, band) + signature[band * ROWS:(band + 1) * ROWS] for band in range(BANDS)]
+        center = None
+        for bucket_key in bucket_keys:
+            for other in buckets.get(bucket_key, ()):
+                if jaccard(keys[other][1], words) >= threshold:
+                    center = other
+                    break
+            if center is not None:
+                break
+        if center is not None:
+            center_of[index] = center
+            continue
+        full = False
+        for bucket_key in bucket_keys:
+            representatives = buckets.setdefault(bucket_key, [])
+            if len(representatives) < BUCKET_REPRESENTATIVES:
+                representatives.append(index)
+            else:
+                full = True
+        capped += full
+    if capped:
+        _capped_sets.inc(capped)
+
+    clusters = {}
+    for index, key in enumerate(keys):
+        clusters.setdefault(center_of[index], []).extend(groups[key])
+    result = [sorted(c) for c in clusters.values() if len(c) > 1]
+    result.sort(key=lambda c: (-len(c), c[0][0]))
+    return DuplicateReport(result, capped)
+
+
+def find_repeated_variants(rows):
+    """
+    找出 prompt_text 中含有重复变体的行，如 through glass/through glass/against glass。
+    """
+    result = []
+    for row in rows:
+        parts = [p for p in (row[3] or "").split('/') if p.strip()]
+        if len(parts) != len(split_variants(row[3])):
+            result.append(row)
+    return result
+
+
+def load_rows(conn):
+    """
+    读取全部提示词，返回 (id, type_name, prompt_name, prompt_text) 列表。
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''
+            SELECT p.id, t.type_name, p.prompt_name, p.prompt_text
+            FROM prompts p JOIN prompt_types t ON p.type_id = t.id
+        ''')
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def merge_prompts(conn, keep_id, drop_ids):
+    """
+    把 drop_ids 对应的提示词合并到 keep_id，合并变体和介绍后删除其余行。
+    所有提示词必须属于同一类型，否则抛出 ValueError 且不做任何修改。
+
+    参数:
+    conn: 数据库连接。
+    keep_id: 保留的提示词 id。
+    drop_ids: 需要合并删除的提示词 id 列表，可以为空（仅清理重复变体）。
+
+    返回值:
+    合并后的 prompt_text。
+    """
+    ids = [keep_id] + [i for i in drop_ids if i != keep_id]
+    cursor = conn.cursor()
+    placeholders = ",".join("?" * len(ids))
+    cursor.execute(f"SELECT id, type_id, prompt_text, introduction FROM prompts WHERE id IN ({placeholders})", ids)
+    by_id = {row[0]: row for row in cursor.fetchall()}
+    if keep_id not in by_id:
+        raise ValueError(f"提示词 {keep_id} 不存在")
+    if any(row[1] != by_id[keep_id][1] for row in by_id.values()):
+        raise ValueError("不能合并不同类型的提示词")
+
+    variants = []
+    seen = set()
+    introductions = []
+    for prompt_id in ids:
+        if prompt_id not in by_id:
+            continue
+        _, _, prompt_text, introduction = by_id[prompt_id]
+        for part in (prompt_text or "").split('/'):
+            part = " ".join(part.split())
+            if part and part.lower() not in seen:
+                seen.add(part.lower())
+                variants.append(part)
+        if introduction and introduction not in introductions:
+            introductions.append(introduction)
+
+    prompt_text = "/".join(variants)
+    cursor.execute(
+        "UPDATE prompts SET prompt_text = ?, introduction = ?, updated_at = ? WHERE id = ?",
+        (prompt_text, "；".join(introductions), timestamp(), keep_id)
+    )
+    cursor.executemany("DELETE FROM prompts WHERE id = ?", [(i,) for i in ids[1:]])
+    conn.commit()
+    return prompt_text
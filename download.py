@@ -0,0 +1,207 @@
+"""
+可断点续传、可校验的下载。
+
+下载先按块写入 "<目标文件>.part"，连接中断后用 HTTP Range 从已下载的位置继续，
+全部完成并通过校验后才改名为目标文件，所以导入时不会读到只下载了一半的文件。
+内存占用只有一个块的大小，与文件大小无关。
+
+校验值可以直接给出，也可以从服务器上同名的 ".sha256" 文件（sha256sum 格式）读取。
+从头下载时接受 Content-Encoding: gzip 并边下载边解压；续传时请求 identity 编码，
+因为 gzip 传输时字节区间对应的是压缩后的内容。写入 .part 的总是解压后的内容，
+与 identity 编码的字节一一对应，所以 gzip 传输中断后同样可以用 Range 续传。
+"""
+import hashlib
+import http.client
+import os
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlsplit, urlunsplit
+
+import metrics
+from compressed import decode_response
+
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_TIMEOUT = 30
+# 连续多少次没有任何进展的失败后放弃
+MAX_RETRIES = 5
+RETRY_DELAY = 0.5
+CHECKSUM_SUFFIX = ".sha256"
+PART_SUFFIX = ".part"
+
+_bytes = metrics.counter("sync.bytes")
+_retries = metrics.counter("sync.retries")
+_latency = metrics.histogram("sync.download")
+
+
+class DownloadError(Exception):
+    pass
+
+
+class ChecksumError(DownloadError):
+    pass
+
+
+def _hash_file(path, digest):
+    # 续传前把已下载的部分计入摘要
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(block)
+
+
+def _content_range(response):
+    """
+    解析 "Content-Range: bytes start-end/total"，返回 (start, total)，total 未知时为 None。
+    """
+    value = response.headers.get("Content-Range", "")
+    try:
+        unit, spec = value.split(" ", 1)
+        span, total = spec.split("/", 1)
+        start = int(span.split("-", 1)[0])
+    except ValueError:
+        raise DownloadError(f"无法解析 Content-Range: {value!r}")
+    if unit != "bytes":
+        raise DownloadError(f"不支持的 Content-Range: {value!r}")
+    return start, None if total == "*" else int(total)
+
+
+def checksum_url(url):
+    """
+    返回 url 旁边的校验文件地址：在路径后加 ".sha256"，保留查询参数。
+    """
+    parts = urlsplit(url)
+    return urlunsplit(parts._replace(path=parts.path + CHECKSUM_SUFFIX))
+
+
+def fetch_checksum(url, timeout=DEFAULT_TIMEOUT):
+    """
+    读取 url 旁边的 ".sha256" 文件，返回十六进制校验值。
+
+    校验文件是可选的：不存在、无法访问（如 403、5xx 或网络错误）或内容无法解析
+    （如返回了 HTML 错误页）时打印原因并返回 None，即不校验。
+    """
+    sidecar = checksum_url(url)
+    try:
+        with urllib.request.urlopen(sidecar, timeout=timeout) as response:
+            text = response.read(1024).decode("ascii", errors="replace")
+    except urllib.error.HTTPError as e:
+        if e.code != 404:
+            print(f"无法读取校验文件 {sidecar}: HTTP {e.code}，不做校验")
+        return None
+    except (OSError, http.client.HTTPException) as e:
+        print(f"无法读取校验文件 {sidecar}: {e}，不做校验")
+        return None
+    fields = text.split()
+    checksum = fields[0].lower() if fields else ""
+    if len(checksum) != 64 or checksum.strip("0123456789abcdef"):
+        print(f"无法解析校验文件 {sidecar}，不做校验")
+        return None
+    return checksum
+
+
+def download(url, file_path, sha256=None, timeout=DEFAULT_TIMEOUT, retries=MAX_RETRIES, progress=None):
+    """
+    下载 url 到 file_path，中断时自动续传。
+
+    参数:
+    url: 下载地址。
+    file_path: 保存路径，下载过程中写入 file_path + ".part"，上次留下的 .part 会被续传。
+    sha256: 期望的十六进制 SHA-256，为 None 时不校验。
+    timeout: 每次连接的网络超时（秒）。
+    retries: 连续失败且没有下载到任何字节的最多次数，有进展的失败不计入。
+    progress: 可选回调 progress(已下载字节数, 总字节数或 None)。
+
+    返回值:
+    文件的 SHA-256（十六进制）。
+    """
+    started = time.perf_counter_ns()
+    part_path = file_path + PART_SUFFIX
+    digest = hashlib.sha256()
+    offset = 0
+    if os.path.exists(part_path):
+        _hash_file(part_path, digest)
+        offset = os.path.getsize(part_path)
+    validator = None  # ETag 或 Last-Modified，用于 If-Range
+    total = None
+    failures = 0
+
+    while True:
+        # 续传只能用 identity 编码，从头下载时可以 gzip 传输
+        headers = {"Accept-Encoding": "identity" if offset else "gzip"}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            if validator:
+                headers["If-Range"] = validator
+        request = urllib.request.Request(url, headers=headers)
+        received = 0
+        try:
+            try:
+                response = urllib.request.urlopen(request, timeout=timeout)
+            except urllib.error.HTTPError as e:
+                if e.code == 416 and offset:
+                    # 已下载的部分超出了服务器上的文件，可能文件已变化，从头开始
+                    e.close()
+                    os.remove(part_path)
+                    digest, offset, validator = hashlib.sha256(), 0, None
+                    failures += 1
+                    if failures > retries:
+                        raise DownloadError(f"下载失败: {url}: HTTP 416")
+                    continue
+                raise
+            with response:
+                try:
+                    body = decode_response(response)
+                except ValueError as e:
+                    raise DownloadError(f"下载失败: {url}: {e}")
+                if response.status == 206:
+                    if body is not response:
+                        raise DownloadError(f"下载失败: {url}: 续传的响应使用了 Content-Encoding")
+                    start, total = _content_range(response)
+                    if start != offset:
+                        raise DownloadError(f"服务器返回的区间从 {start} 开始，期望 {offset}")
+                    mode = "ab"
+                else:
+                    # 服务器忽略了 Range（或文件已变化），从头开始
+                    digest, offset = hashlib.sha256(), 0
+                    length = response.headers.get("Content-Length")
+                    # gzip 传输时 Content-Length 是压缩后的长度，完整性由 gzip 流的结尾保证
+                    total = int(length) if length and body is response else None
+                    mode = "wb"
+                if body is response:
+                    validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+                else:
+                    # gzip 传输的 ETag 属于压缩后的表示，不能用于续传 identity 内容
+                    validator = None
+                # GzipFile.read 遇到流提前结束时会丢掉本次已解压的数据，用 read1 逐段写入
+                read = body.read if body is response else body.read1
+                with open(part_path, mode) as out_file:
+                    for block in iter(lambda: read(CHUNK_SIZE), b""):
+                        out_file.write(block)
+                        digest.update(block)
+                        offset += len(block)
+                        received += len(block)
+                        _bytes.inc(len(block))
+                        if progress:
+                            progress(offset, total)
+            if total is not None and offset < total:
+                raise http.client.IncompleteRead(b"", total - offset)
+            break
+        except (OSError, EOFError, http.client.HTTPException) as e:
+            # gzip 流提前结束时抛出 EOFError
+            if isinstance(e, urllib.error.HTTPError):
+                raise DownloadError(f"下载失败: {url}: HTTP {e.code}")
+            # 有进展时立即续传，否则按次数退避
+            _retries.inc()
+            failures = 0 if received else failures + 1
+            if failures > retries:
+                raise DownloadError(f"下载失败: {url}: {e}")
+            if failures:
+                time.sleep(RETRY_DELAY * 2 ** (failures - 1))
+
+    actual = digest.hexdigest()
+    if sha256 and actual != sha256.lower():
+        os.remove(part_path)
+        raise ChecksumError(f"校验失败: 期望 sha256={sha256.lower()}，实际为 {actual}")
+    os.replace(part_path, file_path)
+    _latency.record(time.perf_counter_ns() - started)
+    return actual
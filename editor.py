@@ -0,0 +1,286 @@
+"""
+按标签高亮的提示词编辑器。
+
+打开后，Positive/Negative 文本框中按逗号分隔的每个标签都会按库中的情况着色:
+- known: 整个标签（去掉括号和权重后）是库中某条提示词的变体；
+- unknown: 库中没有；
+- duplicate: 与前面的标签重复。
+鼠标悬停在已知标签上时显示对应条目的中文名称和介绍。
+
+文本框的 Tcl 命令被替换为代理，每次 insert/delete/replace 只重新切分编辑位置所在的
+逗号区间，其余标签的位置整体平移，Tk 的标签范围也会随文本自动移动；只有重复状态发生
+变化的同名标签才会被重新着色。撤销/重做等不经过代理的修改在长度不一致时整段重新标注。
+"""
+import bisect
+import re
+import tkinter as tk
+from collections import Counter
+
+from matcher import split_tokens
+
+KNOWN = "tok_known"
+UNKNOWN = "tok_unknown"
+DUPLICATE = "tok_duplicate"
+TAGS = (KNOWN, UNKNOWN, DUPLICATE)
+TAG_STYLES = {
+    KNOWN: {"background": "#d9f2d9"},
+    UNKNOWN: {"foreground": "#c0392b", "underline": True},
+    DUPLICATE: {"background": "#fde2b8"},
+}
+# 悬停多久（毫秒）后显示提示
+TOOLTIP_DELAY_MS = 300
+
+# 标签外层的括号和末尾的权重，例如 "((masterpiece:1.2))"
+_DECORATION = re.compile(r"^[\s(\[{]+|(?::\s*-?[\d.]+)?[\s)\]}]+$")
+
+
+def normalize_token(token):
+    """
+    去掉括号和权重、合并空白并转为小写，得到用于查库和判重的标签。
+    """
+    return " ".join(_DECORATION.sub("", token).split()).lower()
+
+
+class PromptTokens:
+    """
+    文本和其中标签的镜像，按编辑增量更新，与界面无关。
+
+    参数:
+    lookup: 标准化后的标签 -> 库条目列表的映射（dict 或支持 get 的对象），不在库中时为 None。
+    """
+
+    def __init__(self, lookup):
+        self.lookup = lookup
+        self.text = ""
+        # 按位置排列的 [start, end, 标准化标签, 当前的标签名]
+        self.tokens = []
+        self.starts = []
+        self.counts = Counter()
+
+    def _tokenize(self, start, end):
+        tokens = []
+        for s, e in split_tokens(self.text[start:end]):
+            norm = normalize_token(self.text[start + s:start + e])
+            if norm:
+                tokens.append([start + s, start + e, norm, None])
+        return tokens
+
+    def _classify(self, norms):
+        # 按顺序为标准化标签在 norms 中的标签着色，第一次出现之后的为重复；
+        # 只返回标签名有变化的（新切分出的标签的标签名为 None，总会返回）
+        seen = set()
+        spans = []
+        for token in self.tokens:
+            norm = token[2]
+            if norm not in norms:
+                continue
+            if norm in seen:
+                tag = DUPLICATE
+            else:
+                seen.add(norm)
+                tag = KNOWN if self.lookup.get(norm) else UNKNOWN
+            if token[3] != tag:
+                token[3] = tag
+                spans.append((token[0], token[1], tag))
+        return spans
+
+    def reset(self, text):
+        """
+        整段重新切分，返回 [(start, end, 标签名), ...]。
+        """
+        self.text = text
+        self.tokens = self._tokenize(0, len(text))
+        self.starts = [token[0] for token in self.tokens]
+        self.counts = Counter(token[2] for token in self.tokens)
+        return self._classify(set(self.counts))
+
+    def edit(self, start, end, inserted):
+        """
+        把 [start, end) 替换为 inserted。
+
+        返回值:
+        (region_start, region_end, spans)
+        - [region_start, region_end): 新文本中重新切分的区间，调用方应先清除其中的标签；
+        - spans: 需要重新着色的标签 [(start, end, 标签名), ...]，区间外的只有重复状态变化的同名标签。
+        """
+        text = self.text
+        # 扩展到编辑位置两侧的逗号，区间内的标签全部重新切分
+        lo = text.rfind(",", 0, start) + 1
+        hi = text.find(",", end)
+        if hi == -1:
+            hi = len(text)
+        delta = len(inserted) - (end - start)
+        self.text = text[:start] + inserted + text[end:]
+
+        first = bisect.bisect_left(self.starts, lo)
+        last = bisect.bisect_right(self.starts, hi)
+        removed = self.tokens[first:last]
+        added = self._tokenize(lo, hi + delta)
+        for token in self.tokens[last:]:
+            token[0] += delta
+            token[1] += delta
+        self.tokens[first:last] = added
+        self.starts[first:last] = [token[0] for token in added]
+        if delta:
+            for i in range(first + len(added), len(self.starts)):
+                self.starts[i] += delta
+
+        norms = set()
+        for token in removed:
+            self.counts[token[2]] -= 1
+            norms.add(token[2])
+        for token in added:
+            self.counts[token[2]] += 1
+            norms.add(token[2])
+        return lo, hi + delta, self._classify(norms)
+
+    def token_at(self, offset):
+        """
+        返回包含位置 offset 的标签 (start, end, 标准化标签)，不在标签上时返回 None。
+        """
+        index = bisect.bisect_right(self.starts, offset) - 1
+        if index >= 0:
+            start, end, norm, _ = self.tokens[index]
+            if offset < end:
+                return start, end, norm
+        return None
+
+
+class PromptEditor:
+    """
+    为 tk.Text 提供按标签高亮和悬停提示，默认关闭，enable/disable 切换。
+
+    参数:
+    text: 要增强的 tk.Text。
+    get_lookup: 无参函数，返回标准化标签 -> [(类型名称, 名称, 介绍), ...] 的映射，
+        只在打开或刷新时调用。
+    """
+
+    def __init__(self, text, get_lookup):
+        self.text = text
+        self.get_lookup = get_lookup
+        self.model = None
+        self.enabled = False
+        self._orig = text._w + "_orig"
+        self._tooltip = None
+        self._tooltip_job = None
+        self._hover = None
+        for tag, style in TAG_STYLES.items():
+            text.tag_configure(tag, **style)
+        # 代理只安装一次，关闭时直接转发
+        text.tk.call("rename", text._w, self._orig)
+        text.tk.createcommand(text._w, self._proxy)
+        text.bind("<Motion>", self._on_motion, add="+")
+        text.bind("<Leave>", self._hide_tooltip, add="+")
+
+    def enable(self):
+        self.enabled = True
+        self.refresh()
+
+    def disable(self):
+        self.enabled = False
+        self.model = None
+        self._hide_tooltip()
+        for tag in TAGS:
+            self._call("tag", "remove", tag, "1.0", "end")
+
+    def refresh(self):
+        """
+        库发生变化或文本与镜像不一致时整段重新标注。
+        """
+        if not self.enabled:
+            return
+        self.model = PromptTokens(self.get_lookup())
+        for tag in TAGS:
+            self._call("tag", "remove", tag, "1.0", "end")
+        self._apply(self.model.reset(self._call("get", "1.0", "end-1c")))
+
+    def _call(self, *args):
+        return self.text.tk.call((self._orig,) + args)
+
+    def _offset(self, index):
+        count = self._call("count", "-chars", "1.0", index)
+        return int(count) if count != "" else 0
+
+    def _apply(self, spans):
+        for start, end, tag in spans:
+            for other in TAGS:
+                if other != tag:
+                    self._call("tag", "remove", other, f"1.0+{start}c", f"1.0+{end}c")
+            self._call("tag", "add", tag, f"1.0+{start}c", f"1.0+{end}c")
+
+    def _proxy(self, *args):
+        if not self.enabled or self.model is None or args[0] not in ("insert", "delete", "replace"):
+            result = self._call(*args)
+            if self.enabled and args[0] == "edit" and len(args) > 1 and args[1] in ("undo", "redo"):
+                self.refresh()
+            return result
+
+        # 在修改之前把索引换算成字符位置
+        length = len(self.model.text)
+        op = args[0]
+        if op == "insert":
+            start = end = min(self._offset(args[1]), length)
+            inserted = "".join(args[2::2])
+        elif op == "delete":
+            start = min(self._offset(args[1]), length)
+            end = min(self._offset(args[2]), length) if len(args) > 2 else min(start + 1, length)
+            inserted = ""
+        else:
+            start = min(self._offset(args[1]), length)
+            end = min(self._offset(args[2]), length)
+            inserted = "".join(args[3::2])
+        result = self._call(*args)
+        if end < start:
+            return result
+
+        lo, hi, spans = self.model.edit(start, end, inserted)
+        if self._offset("end-1c") != len(self.model.text):
+            # 插入到了换算之外的位置等情况，整段重新标注
+            self.refresh()
+            return result
+        for tag in TAGS:
+            self._call("tag", "remove", tag, f"1.0+{lo}c", f"1.0+{hi}c")
+        self._apply(spans)
+        return result
+
+    def _on_motion(self, event):
+        if not self.enabled or self.model is None:
+            return
+        offset = self._offset(f"@{event.x},{event.y}")
+        token = self.model.token_at(offset)
+        payloads = self.model.lookup.get(token[2]) if token else None
+        if token is None or not payloads:
+            self._hide_tooltip()
+            return
+        if self._hover == token:
+            return
+        self._hide_tooltip()
+        self._hover = token
+        lines = []
+        for type_name, prompt_name, introduction in payloads:
+            line = f"{prompt_name}（{type_name}）"
+            if introduction:
+                line += f"\n{introduction}"
+            lines.append(line)
+        x, y = event.x_root + 12, event.y_root + 16
+        self._tooltip_job = self.text.after(TOOLTIP_DELAY_MS, lambda: self._show_tooltip("\n".join(lines), x, y))
+
+    def _show_tooltip(self, message, x, y):
+        self._tooltip_job = None
+        self._tooltip = tk.Toplevel(self.text)
+        self._tooltip.wm_overrideredirect(True)
+        self._tooltip.wm_geometry(f"+{x}+{y}")
+        tk.Label(
+            self._tooltip, text=message, justify="left", background="#ffffe0",
+            relief="solid", borderwidth=1, wraplength=360
+        ).pack(ipadx=4, ipady=2)
+
+    def _hide_tooltip(self, event=None):
+        self._hover = None
+        if self._tooltip_job is not None:
+            self.text.after_cancel(self._tooltip_job)
+            self._tooltip_job = None
+        if self._tooltip is not None:
+            self._tooltip.destroy()
+            self._tooltip = None
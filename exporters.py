@@ -0,0 +1,142 @@
+"""
+流式导出：plist、CSV/TSV 和 Stable Diffusion WebUI 的 styles.csv。
+
+查询结果按 fetchmany 分批取出、分批写入文件，内存占用只与批大小有关，与库的大小无关。
+文件名带 .gz/.bz2/.xz 后缀时边写边压缩。
+
+- .plist: 每行 "类型^名称^提示词^介绍"，与导入和远程源使用的格式相同，导出的文件可以直接
+  作为远程源发布。该格式没有转义，字段中的 "^" 替换为全角的 "＾"，换行替换为空格。
+- .csv/.tsv: 带表头的 类型、名称、提示词、介绍 四列。
+- styles.csv: WebUI 的样式文件（name, prompt, negative_prompt），由预设表生成。
+"""
+import csv
+import os
+from time import perf_counter_ns
+
+import metrics
+from compressed import open_file, strip_compression_suffix
+from library import export_json_file
+
+# 每次从游标取出的行数
+FETCH_SIZE = 1000
+CSV_HEADER = ["type", "name", "prompt", "introduction"]
+STYLES_HEADER = ["name", "prompt", "negative_prompt"]
+
+_export_rows = metrics.counter("export.rows")
+_export_latency = metrics.histogram("export.duration")
+
+_PLIST_ESCAPES = str.maketrans({"^": "＾", "\r": " ", "\n": " "})
+
+# 按类型、再按写入顺序导出，走 idx_prompts_type_id，不需要额外排序
+_PROMPTS_QUERY = '''
+    SELECT prompt_types.type_name, prompts.prompt_name, prompts.prompt_text, prompts.introduction
+    FROM prompt_types JOIN prompts ON prompts.type_id = prompt_types.id
+    ORDER BY prompt_types.id, prompts.id
+'''
+
+
+def iter_batches(cursor, size=FETCH_SIZE):
+    """
+    按 fetchmany 分批生成游标的结果，每批为行的列表。
+    """
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+def _export(conn, query, file_path, write_batches):
+    # 执行查询并把结果分批交给 write_batches(f, batches)，返回导出的行数
+    start = perf_counter_ns()
+    cursor = conn.cursor()
+    count = 0
+    try:
+        cursor.execute(query)
+
+        def batches():
+            nonlocal count
+            for rows in iter_batches(cursor):
+                count += len(rows)
+                yield rows
+
+        # newline="" 由 csv 模块自己写行尾
+        with open_file(file_path, "wt", newline="") as f:
+            write_batches(f, batches())
+    finally:
+        cursor.close()
+    _export_rows.inc(count)
+    _export_latency.record(perf_counter_ns() - start)
+    return count
+
+
+def _plist_field(value):
+    return (value or "").translate(_PLIST_ESCAPES)
+
+
+def export_plist_file(conn, file_path):
+    """
+    把整个提示词库导出为 plist，返回导出的提示词条数。
+    """
+    def write(f, batches):
+        for rows in batches:
+            text = "".join(f"{t}^{n}^{p or ''}^{i or ''}\n" for t, n, p, i in rows)
+            # 分隔符个数正好时字段中没有需要替换的字符（绝大多数批次），否则整批逐字段替换
+            if text.count("^") != 3 * len(rows) or text.count("\n") != len(rows) or "\r" in text:
+                text = "".join(
+                    f"{_plist_field(t)}^{_plist_field(n)}^{_plist_field(p)}^{_plist_field(i)}\n"
+                    for t, n, p, i in rows
+                )
+            f.write(text)
+
+    return _export(conn, _PROMPTS_QUERY, file_path, write)
+
+
+def export_csv_file(conn, file_path, dialect="excel"):
+    """
+    把整个提示词库导出为带表头的 CSV，dialect 为 "excel-tab" 时导出 TSV。返回导出的提示词条数。
+    """
+    def write(f, batches):
+        writer = csv.writer(f, dialect=dialect)
+        writer.writerow(CSV_HEADER)
+        for rows in batches:
+            writer.writerows(rows)
+
+    return _export(conn, _PROMPTS_QUERY, file_path, write)
+
+
+def export_tsv_file(conn, file_path):
+    return export_csv_file(conn, file_path, dialect="excel-tab")
+
+
+def export_styles_csv(conn, file_path):
+    """
+    把预设导出为 Stable Diffusion WebUI 的 styles.csv，返回导出的预设个数。
+    """
+    def write(f, batches):
+        writer = csv.writer(f)
+        writer.writerow(STYLES_HEADER)
+        for rows in batches:
+            writer.writerows(rows)
+
+    query = '''
+        SELECT preset_name, COALESCE(prompt, ''), COALESCE(negative_prompt, '')
+        FROM presets ORDER BY id
+    '''
+    return _export(conn, query, file_path, write)
+
+
+# 扩展名（去掉压缩后缀后）-> 导出函数
+EXPORTERS = {
+    ".json": export_json_file,
+    ".plist": export_plist_file,
+    ".csv": export_csv_file,
+    ".tsv": export_tsv_file,
+}
+
+
+def exporter_for(file_path):
+    """
+    按文件扩展名返回导出函数，不支持的扩展名返回 None。
+    """
+    return EXPORTERS.get(os.path.splitext(strip_compression_suffix(file_path))[1].lower())
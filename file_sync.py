@@ -0,0 +1,353 @@
+"""
+通过共享文件夹（网盘的同步目录、U 盘等）在多台机器之间双向同步提示词库，不需要在线服务。
+
+每台机器（以 sync_state 中的 station_id 区分）只追加写自己的日志文件 <station_id>.jsonl，
+只读其他机器的日志文件。每次同步先把上次同步之后本机的修改（来自 change_log，见 changelog.py）
+作为一批追加到自己的文件，再从每个其他文件上次读到的字节位置（sync_state 中的 cursor:<station_id>）
+继续读取并应用新的批次。从其他机器收到的修改不会再写进本机的文件。
+
+一批的格式（JSON Lines）:
+    {"format": "prompts-sync", "version": 1, "station": 本机标识, "seq": 本机的日志序号}
+    {"op": ..., "kind": ..., ..., "vv": {机器标识: 序号, ...}, "ts": 修改时间}
+    ...
+    {"commit": 本机的日志序号}
+变更记录与 changelog 增量文件中的相同，另外带上版本向量 vv 和修改时间 ts（Unix 秒）。没有 commit 行的
+批次（写入时进程退出，或者文件还没有同步完整）不会被应用，读取位置停在它之前。无法解析或字段不对的行
+会被跳过并计数，读取位置照常前进，一行坏数据不会让之后的每次同步都失败。
+
+冲突处理：row_versions 记录每个键（类型、提示词、预设）的版本向量，本机修改时把自己的分量设为
+当前的日志序号。收到的版本向量已被本地的包含时说明这个修改已经见过，忽略；包含本地的时直接应用；
+两者并发时 (ts, 机器标识) 较大的一方获胜。每台机器对同一对修改的判断相同，互相同步后各机器的库一致。
+
+没有修改时同步只查一次日志序号，列一次文件夹并比较各日志文件的大小，不打开任何日志文件。
+
+同一个数据库文件复制到另一台机器后两边的 station_id 相同，会写同一个日志文件，不能用来同步。
+"""
+import json
+import os
+from collections import namedtuple
+from time import perf_counter_ns
+
+import metrics
+from changelog import ChangeApplier, current_seq, get_state, iter_changes, set_state, station_id
+from library import timestamp
+
+FORMAT = "prompts-sync"
+VERSION = 1
+LOG_SUFFIX = ".jsonl"
+
+# 一次同步的结果
+# - pushed: 追加到本机日志文件的变更条数
+# - pulled: 从其他机器的日志文件读到的变更条数
+# - applied: 其中改变了本机数据的条数（不包括已经见过和冲突中落败的）
+# - skipped: 无法解析或字段不对而跳过的行数
+SyncResult = namedtuple("SyncResult", "pushed pulled applied skipped")
+
+_sync_latency = metrics.histogram("sync.duration")
+_skipped_records = metrics.counter("sync.skipped_records")
+
+# 各种类的变更必须带的字符串字段
+_KEY_FIELDS = {"type": ("type",), "prompt": ("type", "name"), "preset": ("name",)}
+# 可以为空的内容字段
+_CONTENT_FIELDS = ("prompt_text", "introduction", "prompt", "negative_prompt")
+
+# 把本机修改的键的版本向量中本机的分量设为当前序号，返回修改后的向量
+_BUMP_VERSION = '''
+    INSERT INTO row_versions (kind, type_name, name, vector, updated_at, writer, deleted)
+    VALUES (?, ?, ?, json_object(?, ?), ?, ?, ?)
+    ON CONFLICT (kind, type_name, name) DO UPDATE SET
+        vector = json_set(vector, '$."' || excluded.writer || '"', ?),
+        updated_at = excluded.updated_at, writer = excluded.writer, deleted = excluded.deleted
+    RETURNING vector
+'''
+
+
+def _key(change):
+    # row_versions 的主键，类型没有名称，预设没有类型名称
+    return change["kind"], change.get("type", ""), change.get("name", "")
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _valid_change(record):
+    # 检查一行变更记录的字段，_apply 只处理通过检查的记录
+    fields = _KEY_FIELDS.get(record.get("kind"))
+    if fields is None or record.get("op") not in ("upsert", "delete"):
+        return False
+    if not all(isinstance(record.get(field), str) for field in fields):
+        return False
+    vector = record.get("vv")
+    if not isinstance(vector, dict) or not all(
+        isinstance(station, str) and _is_number(seq) for station, seq in vector.items()
+    ):
+        return False
+    if not _is_number(record.get("ts")) or not _is_number(record.get("updated_at", 0) or 0):
+        return False
+    return all(isinstance(record.get(field), (str, type(None))) for field in _CONTENT_FIELDS)
+
+
+def _descends(a, b):
+    # 版本向量 a 是否包含 b（b 的每个分量都不大于 a 的）
+    return all(a.get(station, 0) >= seq for station, seq in b.items())
+
+
+def _deleted_keys(conn):
+    # 有版本记录、但已经不在库中的类型和提示词（整库替换时删除的），先删提示词再删类型
+    return conn.execute('''
+        SELECT v.kind, v.type_name, v.name FROM row_versions AS v
+        LEFT JOIN prompt_types ON prompt_types.type_name = v.type_name
+        LEFT JOIN prompts ON v.kind = 'prompt' AND prompts.type_id = prompt_types.id AND prompts.prompt_name = v.name
+        WHERE v.kind IN ('type', 'prompt') AND NOT v.deleted
+            AND (prompt_types.id IS NULL OR (v.kind = 'prompt' AND prompts.id IS NULL))
+        ORDER BY v.kind = 'type'
+    ''').fetchall()
+
+
+def _local_changes(conn, cursor, since, full):
+    # iter_changes 的 reset 换成逐条删除整库中已经没有的键，其他机器按版本向量逐条判断
+    for change in iter_changes(cursor, since, full):
+        if change["op"] != "reset":
+            yield change
+            continue
+        for kind, type_name, name in _deleted_keys(conn):
+            if kind == "type":
+                yield {"op": "delete", "kind": "type", "type": type_name}
+            else:
+                yield {"op": "delete", "kind": "prompt", "type": type_name, "name": name}
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def _push(conn, folder, station):
+    # 把上次同步之后本机的修改追加到本机的日志文件，返回追加的条数
+    path = os.path.join(folder, station + LOG_SUFFIX)
+    exists = os.path.exists(path)
+    since = get_state(conn, "sync_seq")
+    until = current_seq(conn)
+    if exists and since == until:
+        return 0
+    # 第一次同步或换了文件夹：发布整个库，其他文件从头读
+    first = since is None or not exists
+    if first:
+        since = 0
+        conn.execute("DELETE FROM sync_state WHERE name LIKE 'cursor:%'")
+    cursor = conn.cursor()
+    count = 0
+    try:
+        # 在一个事务中读取，写入的内容与序号一致
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        changes = _local_changes(conn, cursor, since, first)
+        change = next(changes, None)
+        if change is None and not exists:
+            # 没有修改也创建本机的文件，下次同步时据此判断不是新的文件夹
+            open(path, "a").close()
+        elif change is not None:
+            now = timestamp()
+            with open(path, "a", encoding="utf-8", newline="\n") as f:
+                # 上一次写入中断时文件停在半行，另起一行，半行和没有 commit 的批次会被读取方丢弃
+                if exists and not _ends_with_newline(path):
+                    f.write("\n")
+                header = {"format": FORMAT, "version": VERSION, "station": station, "seq": until}
+                f.write(json.dumps(header, ensure_ascii=False) + "\n")
+                while change is not None:
+                    ts = change.get("updated_at") or now
+                    vector = conn.execute(_BUMP_VERSION, (
+                        *_key(change), station, until, ts, station, change["op"] == "delete", until
+                    )).fetchone()[0]
+                    # vector 已经是 JSON 文本，直接拼进记录，不再解析后重新编码
+                    f.write(f'{json.dumps(change, ensure_ascii=False)[:-1]}, "vv": {vector}, "ts": {int(ts)}}}\n')
+                    count += 1
+                    change = next(changes, None)
+                f.write(json.dumps({"commit": until}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        set_state(conn, "sync_seq", until)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return count
+
+
+def _apply(cursor, applier, change, source):
+    # 按版本向量决定是否应用一条其他机器的修改，返回是否应用
+    remote = change.pop("vv")
+    ts = change.pop("ts")
+    key = _key(change)
+    cursor.execute(
+        "SELECT vector, updated_at, writer FROM row_versions WHERE kind = ? AND type_name = ? AND name = ?", key
+    )
+    row = cursor.fetchone()
+    if row is None:
+        wins, vector = True, remote
+    else:
+        local = json.loads(row[0])
+        if _descends(local, remote):
+            return False
+        wins = _descends(remote, local) or (ts, source) > (row[1] or 0, row[2] or "")
+        vector = {station: max(local.get(station, 0), remote.get(station, 0)) for station in local.keys() | remote.keys()}
+    deleted = change["op"] == "delete"
+    if wins:
+        if change["kind"] == "type" and deleted:
+            # 类型下还有提示词时保留（另一台机器可能同时在这个类型下添加了提示词）
+            cursor.execute('''
+                DELETE FROM prompt_types WHERE type_name = ?
+                    AND NOT EXISTS (SELECT 1 FROM prompts WHERE prompts.type_id = prompt_types.id)
+            ''', (change["type"],))
+            applier.type_ids.pop(change["type"], None)
+        else:
+            applier.apply(change)
+    else:
+        ts, source = row[1], row[2]
+        deleted = None
+    cursor.execute('''
+        INSERT INTO row_versions (kind, type_name, name, vector, updated_at, writer, deleted)
+        VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, 0))
+        ON CONFLICT (kind, type_name, name) DO UPDATE SET
+            vector = excluded.vector, updated_at = excluded.updated_at, writer = excluded.writer,
+            deleted = COALESCE(?, deleted)
+    ''', (*key, json.dumps(vector, sort_keys=True), ts, source, deleted, deleted))
+    return wins
+
+
+def _pull_file(cursor, applier, path, offset):
+    # 从 offset 读取一个日志文件中完整的批次并应用，返回 (新的读取位置, 读到的条数, 应用的条数, 跳过的行数)
+    position = committed = offset
+    pulled = applied = skipped = 0
+    batch = None
+
+    def skip(line):
+        nonlocal skipped
+        skipped += 1
+        # 每个文件只打印第一行，其余的只计数
+        if skipped == 1:
+            print(f"同步日志 {path} 中无法识别的行已跳过（位置 {position - len(line)}）: {line[:80]!r}")
+
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in iter(f.readline, b""):
+            if not line.endswith(b"\n"):
+                # 还没写完（或还没同步完）的行
+                break
+            position += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if not isinstance(record, dict):
+                # 空行和写入中断留下的半行
+                if line.strip():
+                    skip(line)
+            elif record.get("format") == FORMAT:
+                if record.get("version") != VERSION:
+                    # 新版本写的日志，停在这一批之前，升级后再读
+                    print(f"同步日志 {path} 的版本 {record.get('version')} 不受支持，已停止读取该文件")
+                    break
+                if batch is not None:
+                    # 上一批没有 commit，写入时中断了
+                    cursor.execute("ROLLBACK TO sync_batch")
+                    cursor.execute("RELEASE sync_batch")
+                    applier.type_ids.clear()
+                    batch = None
+                if not isinstance(record.get("station"), str):
+                    skip(line)
+                else:
+                    batch = [record["station"], 0, 0]
+                    cursor.execute("SAVEPOINT sync_batch")
+            elif batch is None:
+                # 不属于任何批次的行（包括文件头损坏的批次的内容）
+                if "commit" not in record:
+                    skip(line)
+            elif "commit" in record:
+                cursor.execute("RELEASE sync_batch")
+                pulled += batch[1]
+                applied += batch[2]
+                batch = None
+            elif not _valid_change(record):
+                skip(line)
+            else:
+                batch[1] += 1
+                batch[2] += _apply(cursor, applier, record, batch[0])
+            if batch is None:
+                committed = position
+    if batch is not None:
+        cursor.execute("ROLLBACK TO sync_batch")
+        cursor.execute("RELEASE sync_batch")
+        applier.type_ids.clear()
+    if skipped:
+        _skipped_records.inc(skipped)
+        print(f"同步日志 {path} 共跳过 {skipped} 行")
+    return committed, pulled, applied, skipped
+
+
+def _pull(conn, folder, station):
+    # 应用其他机器日志文件中的新批次，返回 (读到的条数, 应用的条数, 跳过的行数)
+    with os.scandir(folder) as entries:
+        logs = [
+            (entry.name[:-len(LOG_SUFFIX)], entry.path, entry.stat().st_size)
+            for entry in entries if entry.name.endswith(LOG_SUFFIX) and entry.is_file()
+        ]
+    pulled = applied = skipped = 0
+    cursor = conn.cursor()
+    applier = ChangeApplier(cursor)
+    try:
+        for source, path, size in logs:
+            if source == station:
+                continue
+            cursor_key = f"cursor:{source}"
+            offset = get_state(conn, cursor_key, 0)
+            # 文件大小没变就没有新的批次，不需要打开
+            if size == offset:
+                continue
+            if size < offset:
+                # 文件被替换过，从头读，见过的修改会按版本向量忽略
+                offset = 0
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+            position, file_pulled, file_applied, file_skipped = _pull_file(cursor, applier, path, offset)
+            set_state(conn, cursor_key, position)
+            pulled += file_pulled
+            applied += file_applied
+            skipped += file_skipped
+        # 应用其他机器的修改时触发器记下的日志不再发布
+        if applied:
+            set_state(conn, "sync_seq", current_seq(conn))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return pulled, applied, skipped
+
+
+def sync_folder(conn, folder):
+    """
+    与共享文件夹双向同步：先追加本机的修改，再应用其他机器的修改。推送和拉取各在一个事务中完成，
+    拉取失败时回滚，下次同步从原来的位置重新读取。
+
+    参数:
+    conn: 数据库连接，通常在 DBWorker 的线程中调用；同步期间不能有其他写入。
+    folder: 共享文件夹路径。
+
+    返回值:
+    SyncResult。
+    """
+    start = perf_counter_ns()
+    station = station_id(conn)
+    pushed = _push(conn, folder, station)
+    pulled, applied, skipped = _pull(conn, folder, station)
+    _sync_latency.record(perf_counter_ns() - start)
+    return SyncResult(pushed, pulled, applied, skipped)
@@ -0,0 +1,157 @@
+"""
+导出格式 JSON 的增量读取。
+
+导出文件的结构固定为 {类型: {名称: {"prompt_text", "introduction"}}}。iter_json_prompts
+按块读取文本流，手工解析外面两层对象，只把每条提示词的记录交给 json 模块解码，
+内存占用与块大小和单条记录的大小有关，与文件大小无关，1 GB 的导出文件也可以导入。
+"""
+import json
+import re
+
+CHUNK_SIZE = 64 * 1024
+# 单个值最多缓冲的字符数，超过时视为文件损坏，而不是继续读入整个文件
+MAX_VALUE_SIZE = 64 * 1024 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# 不含转义的键和冒号，以及记录之后的分隔符，用于整条记录都在缓冲区中时的快速路径
+_SIMPLE_KEY = re.compile(r'[ \t\n\r]*"([^"\\\x00-\x1f]*)"[ \t\n\r]*:[ \t\n\r]*')
+_SEPARATOR = re.compile(r"[ \t\n\r]*([,}])")
+
+
+class _Reader:
+    def __init__(self, stream, chunk_size):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        # 已丢弃的字符数，用于报告错误位置
+        self.offset = 0
+        self.eof = False
+
+    def fill(self):
+        """
+        读入下一块并丢弃已解析的部分，文件结束时返回 False。
+        """
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.offset += self.pos
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def error(self, message):
+        return json.JSONDecodeError(f"{message}（第 {self.offset + self.pos} 个字符）", self.buf, self.pos)
+
+    def peek(self):
+        # 跳过空白，返回下一个字符，文件结束时返回空字符串
+        while True:
+            buf = self.buf
+            pos = self.pos = _WHITESPACE.match(buf, self.pos).end()
+            if pos < len(buf):
+                return buf[pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise self.error(f"应为 {char!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.scan_once(self.buf, self.pos)
+            except (json.JSONDecodeError, StopIteration):
+                # 可能只是这一块没有读完
+                if len(self.buf) - self.pos < MAX_VALUE_SIZE and self.fill():
+                    continue
+                raise self.error("无法解析的值")
+            # 数字可能被块的边界截断
+            if end == len(self.buf) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def key(self):
+        if self.peek() != '"':
+            raise self.error("应为字符串键")
+        key = self.value()
+        self.expect(":")
+        return key
+
+    def entry(self):
+        """
+        读取一条 "名称": 记录 及其后的分隔符，返回 (名称, 记录, 是否已到类型的末尾)。
+        """
+        buf = self.buf
+        match = _SIMPLE_KEY.match(buf, self.pos)
+        if match:
+            try:
+                record, end = _decoder.scan_once(buf, match.end())
+            except (json.JSONDecodeError, StopIteration):
+                record = None
+            if isinstance(record, dict):
+                separator = _SEPARATOR.match(buf, end)
+                if separator:
+                    self.pos = separator.end()
+                    return match.group(1), record, separator.group(1) == "}"
+        # 跨越块边界、含转义或格式不对时逐步解析
+        prompt_name = self.key()
+        record = self.value()
+        return prompt_name, record, None
+
+    def closes(self, closer):
+        # 读取 "," 或 closer，遇到 closer 时返回 True
+        char = self.peek()
+        if char == ",":
+            self.pos += 1
+            return False
+        if char == closer:
+            self.pos += 1
+            return True
+        raise self.error(f"应为 ',' 或 {closer!r}")
+
+
+def iter_json_prompts(stream, chunk_size=CHUNK_SIZE):
+    """
+    增量解析导出格式的 JSON。
+
+    参数:
+    stream: 文本流，例如 compressed.open_file 打开的文件。
+    chunk_size: 每次读取的字符数。
+
+    返回值:
+    生成 (类型名称, 名称, 记录) 事件，记录为 {"prompt_text", "introduction"} 字典；
+    没有提示词的类型生成一次 (类型名称, None, None)。
+    """
+    reader = _Reader(stream, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        reader.pos += 1
+    else:
+        while True:
+            type_name = reader.key()
+            reader.expect("{")
+            if reader.peek() == "}":
+                reader.pos += 1
+                yield type_name, None, None
+            else:
+                while True:
+                    prompt_name, record, closed = reader.entry()
+                    if not isinstance(record, dict):
+                        raise reader.error(f"提示词 {type_name}/{prompt_name} 的记录应为对象")
+                    yield type_name, prompt_name, record
+                    if closed is None:
+                        closed = reader.closes("}")
+                    if closed:
+                        break
+            if reader.closes("}"):
+                break
+    if reader.peek() != "":
+        raise reader.error("JSON 结束后还有多余的内容")
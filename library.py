@@ -0,0 +1,393 @@
+"""
+提示词库的数据层：导入、导出、加载和搜索。
+
+这些函数只依赖 sqlite3 连接，不涉及界面，main.py 和 bench.py 共用。
+"""
+import json
+import time
+from time import perf_counter_ns
+
+import metrics
+from compressed import compression_suffix, open_file, strip_compression_suffix
+from download import download, fetch_checksum
+from json_stream import iter_json_prompts
+from migrations import PROMPT_LOG_TRIGGERS
+from store import build_prompt_store
+
+FIELD_COUNT = 4
+# 流式导入时每批插入的条数
+BATCH_SIZE = 1000
+# 同一类型下名称唯一，写入已有的名称时更新那一行
+UPSERT_PROMPT = (
+    "INSERT INTO prompts (type_id, prompt_name, prompt_text, introduction, updated_at) VALUES (?,?,?,?,?) "
+    "ON CONFLICT (type_id, prompt_name) DO UPDATE SET prompt_text = excluded.prompt_text, "
+    "introduction = excluded.introduction, updated_at = excluded.updated_at"
+)
+
+_import_rows = metrics.counter("import.rows")
+_import_latency = metrics.histogram("import.duration")
+_import_rate = metrics.gauge("import.rows_per_second")
+_export_latency = metrics.histogram("export.duration")
+
+
+def record_import(count, start):
+    """
+    记录一次导入的条数、耗时和速度，start 为开始时的 perf_counter_ns()。
+    """
+    elapsed = perf_counter_ns() - start
+    _import_rows.inc(count)
+    _import_latency.record(elapsed)
+    _import_rate.set(round(count * 1e9 / elapsed) if elapsed else 0)
+
+
+def timestamp():
+    """
+    返回写入 updated_at 的当前时间（Unix 秒）。
+    """
+    return int(time.time())
+
+
+def clear_prompts(cursor):
+    """
+    清空提示词和类型表，用于整库替换的导入。
+
+    变更日志只记一条 reset（增量导出时 reset 之后导出整个库），类型和提示词的日志触发器在
+    本事务中暂时删除，直到 resume_change_log 重新创建：有逐行触发器时 DELETE 不能直接清空表，
+    100 万条要多花约 8 秒，导入的每一行也不必再记日志。调用方须在提交前调用 resume_change_log；
+    回滚时触发器随之恢复。
+    """
+    cursor.execute("INSERT INTO change_log (kind) VALUES ('reset')")
+    for name in PROMPT_LOG_TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    cursor.execute("DELETE FROM prompts")
+    cursor.execute("DELETE FROM prompt_types")
+
+
+def resume_change_log(cursor):
+    for trigger in PROMPT_LOG_TRIGGERS.values():
+        cursor.execute(trigger)
+
+
+# 以下单条修改的函数都不提交事务，由调用方（通常是 DBWorker）合并提交
+
+def insert_prompt(conn, type_id, prompt_name, prompt_text, introduction):
+    """
+    新增提示词。
+
+    返回值:
+    同一类型下已有同名提示词时返回 False，否则插入并返回 True。
+    """
+    cursor = conn.execute(
+        "INSERT INTO prompts (type_id, prompt_name, prompt_text, introduction, updated_at) VALUES (?,?,?,?,?) "
+        "ON CONFLICT (type_id, prompt_name) DO NOTHING",
+        (type_id, prompt_name, prompt_text, introduction, timestamp())
+    )
+    return cursor.rowcount > 0
+
+
+def update_prompt(conn, type_id, old_prompt_name, new_prompt_name, prompt_text, introduction):
+    """
+    修改提示词，名称发生变化时先删除旧名称的记录；新名称已存在时覆盖那一条。
+    """
+    cursor = conn.cursor()
+    if old_prompt_name and old_prompt_name != new_prompt_name:
+        cursor.execute("DELETE FROM prompts WHERE type_id = ? AND prompt_name = ?", (type_id, old_prompt_name))
+    cursor.execute(UPSERT_PROMPT, (type_id, new_prompt_name, prompt_text, introduction, timestamp()))
+
+
+def delete_prompt(conn, type_id, prompt_name):
+    conn.execute("DELETE FROM prompts WHERE type_id = ? AND prompt_name = ?", (type_id, prompt_name))
+
+
+def insert_type(conn, type_name):
+    """
+    新增类型，返回类型 ID；名称已存在时抛出 sqlite3.IntegrityError。
+    """
+    return conn.execute("INSERT INTO prompt_types (type_name) VALUES (?)", (type_name,)).lastrowid
+
+
+def rename_type(conn, type_id, new_type_name):
+    conn.execute("UPDATE prompt_types SET type_name = ? WHERE id = ?", (new_type_name, type_id))
+
+
+def delete_type(conn, type_id):
+    """
+    删除类型及其下的所有提示词。
+    """
+    conn.execute("DELETE FROM prompts WHERE type_id = ?", (type_id,))
+    conn.execute("DELETE FROM prompt_types WHERE id = ?", (type_id,))
+
+
+def save_preset(conn, preset_name, prompt, negative_prompt):
+    """
+    保存预设，同名预设已存在时覆盖其内容。
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM presets WHERE preset_name = ?", (preset_name,))
+    if cursor.fetchone():
+        cursor.execute(
+            "UPDATE presets SET prompt = ?, negative_prompt = ? WHERE preset_name = ?",
+            (prompt, negative_prompt, preset_name)
+        )
+    else:
+        cursor.execute(
+            "INSERT INTO presets (preset_name, prompt, negative_prompt) VALUES (?,?,?)",
+            (preset_name, prompt, negative_prompt)
+        )
+
+
+def update_presets(conn, changed):
+    """
+    批量更新预设内容，changed 为 [(prompt, negative_prompt, id), ...]。
+    """
+    conn.executemany("UPDATE presets SET prompt = ?, negative_prompt = ? WHERE id = ?", changed)
+
+
+def import_plist_lines(conn, lines):
+    """
+    用 plist 行（"类型^名称^提示词^介绍"）替换整个提示词库，字段数不对的行会被跳过。
+
+    参数:
+    conn: 数据库连接。
+    lines: 可迭代的行字符串，例如打开的文件对象。
+
+    返回值:
+    导入的提示词条数。
+    """
+    start = perf_counter_ns()
+    updated_at = timestamp()
+    cursor = conn.cursor()
+    clear_prompts(cursor)
+    type_map = {}  # 用于映射类型名称到ID
+    count = 0
+    for line in lines:
+        fields = line.strip().split('^')
+        if len(fields) != FIELD_COUNT:
+            continue
+        prompt_type, prompt_name, prompt_text, introduction = fields
+
+        # 如果类型不存在，创建新类型
+        type_id = type_map.get(prompt_type)
+        if type_id is None:
+            cursor.execute("INSERT INTO prompt_types (type_name) VALUES (?)", (prompt_type,))
+            type_id = cursor.lastrowid
+            type_map[prompt_type] = type_id
+
+        # 同名的行以最后一行为准
+        cursor.execute(UPSERT_PROMPT, (type_id, prompt_name, prompt_text, introduction, updated_at))
+        count += 1
+    resume_change_log(cursor)
+    conn.commit()
+    record_import(count, start)
+    return count
+
+
+def import_plist_file(conn, file_path):
+    # .gz/.bz2/.xz 文件边解压边导入
+    with open_file(file_path, "rt") as f:
+        return import_plist_lines(conn, f)
+
+
+def import_json_data(conn, json_data):
+    """
+    用导出格式 {类型: {名称: {"prompt_text", "introduction"}}} 的数据替换整个提示词库。
+
+    返回值:
+    导入的提示词条数。
+    """
+    start = perf_counter_ns()
+    updated_at = timestamp()
+    cursor = conn.cursor()
+    clear_prompts(cursor)
+    count = 0
+    for type_name, prompts in json_data.items():
+        cursor.execute("INSERT INTO prompt_types (type_name) VALUES (?)", (type_name,))
+        type_id = cursor.lastrowid
+        for prompt_name, prompt_data in prompts.items():
+            prompt_text = prompt_data.get("prompt_text", "")
+            introduction = prompt_data.get("introduction", "")
+            cursor.execute(
+                UPSERT_PROMPT,
+                (type_id, prompt_name, prompt_text, introduction, prompt_data.get("updated_at") or updated_at)
+            )
+            count += 1
+    resume_change_log(cursor)
+    conn.commit()
+    record_import(count, start)
+    return count
+
+
+def import_json_events(conn, events, batch_size=BATCH_SIZE):
+    """
+    用 json_stream.iter_json_prompts 生成的事件替换整个提示词库，按批插入。
+
+    在一个事务中完成，文件中途出错时回滚，原有数据不受影响。
+    同名类型出现多次时合并到同一个类型下。
+
+    返回值:
+    导入的提示词条数。
+    """
+    start = perf_counter_ns()
+    updated_at = timestamp()
+    cursor = conn.cursor()
+    try:
+        clear_prompts(cursor)
+        type_ids = {}
+        batch = []
+        count = 0
+        for type_name, prompt_name, record in events:
+            type_id = type_ids.get(type_name)
+            if type_id is None:
+                cursor.execute("INSERT INTO prompt_types (type_name) VALUES (?)", (type_name,))
+                type_id = type_ids[type_name] = cursor.lastrowid
+            if prompt_name is None:
+                continue
+            batch.append((
+                type_id, prompt_name, record.get("prompt_text", ""), record.get("introduction", ""),
+                record.get("updated_at") or updated_at
+            ))
+            if len(batch) >= batch_size:
+                cursor.executemany(UPSERT_PROMPT, batch)
+                count += len(batch)
+                batch.clear()
+        cursor.executemany(UPSERT_PROMPT, batch)
+        count += len(batch)
+        resume_change_log(cursor)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    record_import(count, start)
+    return count
+
+
+def import_json_file(conn, file_path):
+    """
+    导入 JSON 文件（可以是 .json.gz/.json.bz2/.json.xz），边读边解析边插入，
+    不会把整个文件读进内存。返回导入的提示词条数。
+    """
+    with open_file(file_path, "rt") as f:
+        return import_json_events(conn, iter_json_prompts(f))
+
+
+def load_prompt_type_dict(conn):
+    """
+    读取整个提示词库。
+
+    返回值:
+    {类型名称: {'id': 类型ID, 'prompts': {名称: (ID, 提示词, 介绍)}}}，
+    其中 'prompts' 为按列存放的 store.PromptColumns。
+    """
+    cursor = conn.cursor()
+    try:
+        types = conn.execute("SELECT id, type_name FROM prompt_types").fetchall()
+        cursor.execute("SELECT id, type_id, prompt_name, prompt_text, introduction FROM prompts")
+        return build_prompt_store(types, cursor)
+    finally:
+        cursor.close()
+
+
+def export_json_data(conn):
+    """
+    把整个提示词库转换为导出格式的字典，没有提示词的类型导出为空对象。
+    """
+    start = perf_counter_ns()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT id, type_name FROM prompt_types")
+        json_data = {}
+        by_type_id = {}
+        for type_id, type_name in cursor.fetchall():
+            type_prompts = {}
+            json_data[type_name] = type_prompts
+            by_type_id[type_id] = type_prompts
+
+        # 按 type_id 一次分组，不再对每个类型扫描全部提示词
+        cursor.execute("SELECT type_id, prompt_name, prompt_text, introduction, updated_at FROM prompts")
+        for type_id, prompt_name, prompt_text, introduction, updated_at in cursor.fetchall():
+            type_prompts = by_type_id.get(type_id)
+            if type_prompts is not None:
+                type_prompts[prompt_name] = {
+                    "prompt_text": prompt_text,
+                    "introduction": introduction,
+                    "updated_at": updated_at
+                }
+    finally:
+        cursor.close()
+    _export_latency.record(perf_counter_ns() - start)
+    return json_data
+
+
+def export_json_file(conn, file_path):
+    """
+    把整个提示词库导出为 JSON 文件，后缀为 .gz/.bz2/.xz 时边写边压缩。
+    """
+    json_data = export_json_data(conn)
+    with open_file(file_path, "wt") as f:
+        json.dump(json_data, f, ensure_ascii=False, indent=4)
+
+
+def download_file(url, file_path, sha256=None, **kwargs):
+    """
+    按块下载 url 指向的文件并保存到 file_path，中断时续传，给出 sha256 时校验。
+
+    文件本身的压缩（如 .plist.gz）原样保存，导入时再解压；以 Content-Encoding: gzip 传输的内容
+    下载时即解压。其余参数见 download.download。
+    """
+    return download(url, file_path, sha256=sha256, **kwargs)
+
+
+def sync_remote_plist(conn, url, file_path, sha256=None):
+    """
+    下载远程 plist 到 file_path，并用它替换整个提示词库。
+
+    url 以 .gz/.bz2/.xz 结尾时保存为 file_path 加同样的后缀，导入时再解压。
+    未给出 sha256 时读取服务器上 url 路径加 ".sha256" 的校验文件（保留查询参数），
+    该文件不存在、无法访问或无法解析时不校验。
+    下载不完整或校验失败时抛出 download.DownloadError，提示词库保持不变。
+
+    返回值:
+    导入的提示词条数。
+    """
+    file_path = strip_compression_suffix(file_path) + compression_suffix(url)
+    if not sha256:
+        sha256 = fetch_checksum(url)
+    download_file(url, file_path, sha256=sha256)
+    return import_plist_file(conn, file_path)
+
+
+def search_prompts(prompt_type_dict, keyword, limit=None):
+    """
+    在已加载的提示词库中按关键字搜索，不区分大小写，匹配名称、提示词和介绍。
+
+    参数:
+    prompt_type_dict: load_prompt_type_dict 返回的字典或 store.PromptStore。
+    keyword: 搜索关键字，按空白拆分后每个词都必须出现。
+    limit: 最多返回的条数，None 表示不限制。
+
+    返回值:
+    [(类型名称, 名称, 提示词, 介绍), ...]，按库中顺序排列。
+    """
+    words = keyword.lower().split()
+    results = []
+    if not words:
+        return results
+    if hasattr(prompt_type_dict, 'search'):
+        # 按需加载的 PromptStore 直接在数据库中搜索
+        return prompt_type_dict.search(words, limit)
+    for type_name, type_data in prompt_type_dict.items():
+        prompts = type_data['prompts']
+        if hasattr(prompts, 'find'):
+            matches = ((prompts.name_at(i), prompts.row_at(i)) for i in prompts.find(words))
+        else:
+            matches = (
+                (prompt_name, prompt) for prompt_name, prompt in prompts.items()
+                if all(word in f"{prompt_name}\n{prompt[1]}\n{prompt[2] or ''}".lower() for word in words)
+            )
+        for prompt_name, prompt in matches:
+            results.append((type_name, prompt_name, prompt[1], prompt[2] or ""))
+            if limit is not None and len(results) >= limit:
+                return results
+    return results
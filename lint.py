@@ -0,0 +1,310 @@
+"""
+提示词库文件校验（.plist / .json）。
+
+.plist 为每行 "类型^名称^提示词^介绍" 的文本文件。大文件按换行对齐切成若干块，
+交给进程池并行校验，再在主进程里换算行号并检查跨块的重复 (类型, 名称)。
+.gz/.bz2/.xz 压缩的文件无法按字节区间切分，在本进程中边解压边按块校验。
+
+命令行用法:
+    python lint.py FILE [--workers N] [--strict]
+存在错误时退出码为 1（--strict 时警告也算），可用于上传前的检查。
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from json.decoder import scanstring
+
+from compressed import compression_suffix, open_file, strip_compression_suffix
+
+ERROR = "错误"
+WARNING = "警告"
+
+FIELD_COUNT = 4
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# 控制字符、零宽字符、BOM 以及解码失败产生的替换字符
+_SUSPICIOUS = re.compile('[\x00-\x08\x0b-\x1f\x7f\u200b-\u200f\u2028\u2029\u2060\ufeff\ufffd]')
+_WHITESPACE = re.compile(r'\s*')
+
+
+def _describe_suspicious(text):
+    chars = sorted(set(_SUSPICIOUS.findall(text)))
+    return "、".join(f"U+{ord(c):04X}" for c in chars)
+
+
+def _check_fields(type_name, prompt_name, prompt_text, introduction):
+    """
+    检查单条记录的字段，返回 [(级别, 信息), ...]。
+    """
+    problems = []
+    if not type_name.strip():
+        problems.append((ERROR, "类型为空"))
+    if not prompt_name.strip():
+        problems.append((ERROR, "名称为空"))
+    if not prompt_text.strip():
+        problems.append((ERROR, "提示词文本为空"))
+    for label, value in (("类型", type_name), ("名称", prompt_name), ("提示词", prompt_text), ("介绍", introduction)):
+        if _SUSPICIOUS.search(value):
+            problems.append((WARNING, f"{label}包含可疑字符 {_describe_suspicious(value)}"))
+        elif value != value.strip() and label != "介绍":
+            problems.append((WARNING, f"{label}首尾有空白"))
+    return problems
+
+
+def lint_plist_lines(lines):
+    """
+    校验一组 plist 行。
+
+    参数:
+    lines: 行字符串列表（不含换行符），行号从 1 开始计算。
+
+    返回值:
+    (problems, keys)
+    - problems: [(行号, 级别, 信息), ...]
+    - keys: [(类型, 名称, 行号), ...]，用于检查重复。
+    """
+    problems = []
+    keys = []
+    for line_no, line in enumerate(lines, 1):
+        line = line.rstrip('\r')
+        if not line.strip():
+            continue
+        fields = line.split('^')
+        if len(fields) != FIELD_COUNT:
+            problems.append((line_no, ERROR, f"字段数为 {len(fields)}，应为 {FIELD_COUNT}"))
+            continue
+        for level, message in _check_fields(*fields):
+            problems.append((line_no, level, message))
+        keys.append((fields[0].strip(), fields[1].strip(), line_no))
+    return problems, keys
+
+
+def _lint_plist_chunk(path, start, end):
+    # 在子进程中读取并校验 [start, end) 字节区间
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    lines = _split_lines(data)
+    problems, keys = lint_plist_lines(lines)
+    return len(lines), problems, keys
+
+
+def _chunk_ranges(path, chunk_size):
+    """
+    把文件切成按换行对齐的字节区间。
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as f:
+        start = 0
+        while start < size:
+            end = min(start + chunk_size, size)
+            if end < size:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _split_lines(data):
+    lines = data.decode('utf-8', errors='replace').split('\n')
+    if lines and lines[-1] == '':
+        lines.pop()
+    return lines
+
+
+def _lint_compressed_chunks(path, chunk_size):
+    """
+    边解压边按换行对齐的块校验压缩的 plist，产出与 _lint_plist_chunk 相同的结果。
+    """
+    with open_file(path, 'rb') as f:
+        for data in iter(lambda: f.read(chunk_size), b''):
+            lines = _split_lines(data + f.readline())
+            problems, keys = lint_plist_lines(lines)
+            yield len(lines), problems, keys
+
+
+def lint_plist(path, workers=None, chunk_size=CHUNK_SIZE):
+    """
+    校验 plist 文件，文件大于一个块时使用进程池并行处理；压缩的文件在本进程中处理。
+
+    返回值:
+    按行号排序的 [(行号, 级别, 信息), ...]。
+    """
+    if compression_suffix(path):
+        results = _lint_compressed_chunks(path, chunk_size)
+    else:
+        ranges = _chunk_ranges(path, chunk_size)
+        if len(ranges) <= 1 or workers == 1:
+            results = [_lint_plist_chunk(path, start, end) for start, end in ranges]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(
+                    _lint_plist_chunk,
+                    [path] * len(ranges),
+                    [r[0] for r in ranges],
+                    [r[1] for r in ranges],
+                ))
+
+    problems = []
+    first_seen = {}
+    offset = 0
+    for line_count, chunk_problems, keys in results:
+        problems.extend((line_no + offset, level, message) for line_no, level, message in chunk_problems)
+        for type_name, prompt_name, line_no in keys:
+            line_no += offset
+            first = first_seen.setdefault((type_name, prompt_name), line_no)
+            if first != line_no:
+                problems.append((line_no, WARNING, f"重复的类型和名称 ({type_name}, {prompt_name})，首次出现在第 {first} 行"))
+        offset += line_count
+    problems.sort(key=lambda p: p[0])
+    return problems
+
+
+class _LineCounter:
+    """
+    根据字符位置递增地计算行号，避免每次从头统计换行。
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+        self.line = 1
+
+    def line_at(self, pos):
+        if pos < self.pos:
+            self.pos, self.line = 0, 1
+        self.line += self.text.count('\n', self.pos, pos)
+        self.pos = pos
+        return self.line
+
+
+def _iter_json_entries(text):
+    """
+    逐条遍历导出格式 {类型: {名称: {...}}} 的 JSON，产出 (类型, 名称, 记录, 位置)。
+
+    与 json.load 不同，这里保留重复的键并记录每个名称在文本中的位置。
+    """
+    decoder = json.JSONDecoder()
+    ws = _WHITESPACE.match
+
+    def expect(pos, ch):
+        pos = ws(text, pos).end()
+        if text[pos:pos + 1] != ch:
+            raise json.JSONDecodeError(f"应为 '{ch}'", text, pos)
+        return pos + 1
+
+    def peek(pos):
+        pos = ws(text, pos).end()
+        return pos, text[pos:pos + 1]
+
+    pos = expect(0, '{')
+    pos, ch = peek(pos)
+    while ch != '}':
+        pos = expect(pos, '"')
+        type_pos = pos
+        type_name, pos = scanstring(text, pos)
+        pos = expect(pos, ':')
+        pos, ch = peek(pos)
+        if ch != '{':
+            value, pos = decoder.raw_decode(text, pos)
+            yield type_name, None, value, type_pos
+        else:
+            pos, ch = peek(pos + 1)
+            while ch != '}':
+                pos = expect(pos, '"')
+                name_pos = pos
+                prompt_name, pos = scanstring(text, pos)
+                pos = expect(pos, ':')
+                pos = ws(text, pos).end()
+                record, pos = decoder.raw_decode(text, pos)
+                yield type_name, prompt_name, record, name_pos
+                pos, ch = peek(pos)
+                if ch == ',':
+                    pos, ch = peek(pos + 1)
+                    if ch == '}':
+                        raise json.JSONDecodeError("多余的 ','", text, pos)
+                elif ch != '}':
+                    raise json.JSONDecodeError("应为 ',' 或 '}'", text, pos)
+            pos += 1
+        pos, ch = peek(pos)
+        if ch == ',':
+            pos, ch = peek(pos + 1)
+            if ch == '}':
+                raise json.JSONDecodeError("多余的 ','", text, pos)
+        elif ch != '}':
+            raise json.JSONDecodeError("应为 ',' 或 '}'", text, pos)
+    if ws(text, pos + 1).end() != len(text):
+        raise json.JSONDecodeError("多余的数据", text, pos + 1)
+
+
+def lint_json(path):
+    """
+    校验导出格式的 JSON 文件，可以是 .gz/.bz2/.xz 压缩的文件。
+
+    返回值:
+    按行号排序的 [(行号, 级别, 信息), ...]。
+    """
+    with open_file(path, 'rb') as f:
+        text = f.read().decode('utf-8', errors='replace')
+    counter = _LineCounter(text)
+    problems = []
+    first_seen = {}
+    try:
+        for type_name, prompt_name, record, pos in _iter_json_entries(text):
+            line_no = counter.line_at(pos)
+            if prompt_name is None:
+                problems.append((line_no, ERROR, f"类型 {type_name} 的值应为对象"))
+                continue
+            if not isinstance(record, dict):
+                problems.append((line_no, ERROR, f"{prompt_name} 的值应为对象"))
+                continue
+            prompt_text = record.get("prompt_text", "")
+            introduction = record.get("introduction") or ""
+            if not isinstance(prompt_text, str) or not isinstance(introduction, str):
+                problems.append((line_no, ERROR, "prompt_text 和 introduction 应为字符串"))
+                continue
+            for level, message in _check_fields(type_name, prompt_name, prompt_text, introduction or ""):
+                problems.append((line_no, level, message))
+            first = first_seen.setdefault((type_name, prompt_name), line_no)
+            if first != line_no:
+                problems.append((line_no, WARNING, f"重复的类型和名称 ({type_name}, {prompt_name})，首次出现在第 {first} 行"))
+    except json.JSONDecodeError as e:
+        problems.append((e.lineno, ERROR, f"JSON 格式错误: {e.msg}"))
+    problems.sort(key=lambda p: p[0])
+    return problems
+
+
+def lint_file(path, workers=None):
+    """
+    根据扩展名校验 .json 或 .plist 文件，压缩文件按去掉压缩后缀后的扩展名判断。
+    """
+    if os.path.splitext(strip_compression_suffix(path))[1].lower() == '.json':
+        return lint_json(path)
+    return lint_plist(path, workers=workers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="校验提示词库文件")
+    parser.add_argument("path", help=".plist 或 .json 文件")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认为 CPU 核数")
+    parser.add_argument("--strict", action="store_true", help="警告也视为失败")
+    args = parser.parse_args(argv)
+
+    problems = lint_file(args.path, workers=args.workers)
+    for line_no, level, message in problems:
+        print(f"{args.path}:{line_no}: {level}: {message}")
+    errors = sum(1 for p in problems if p[1] == ERROR)
+    warnings = len(problems) - errors
+    print(f"共 {errors} 个错误，{warnings} 个警告")
+    failed = errors or (args.strict and warnings)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
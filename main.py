@@ -1,11 +1,48 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import sqlite3
-import json
 import os
-import urllib.request
 import sys
 import platform
+import argparse
+import time
+import threading
+import multiprocessing
+
+from matcher import PromptMatcher, build_matcher
+from prompt_syntax import normalize_prompt, normalize_many
+from dedupe import find_duplicate_clusters, find_repeated_variants, load_rows, merge_prompts
+from lint import lint_file, ERROR
+from migrations import migrate
+from store import PromptStore
+from plist_index import PlistChangedError, PlistLibrary
+from seed import install_seed
+from clipboard import ClipboardHistory
+from remote_sync import (
+    fetch_sources, merge_sources, write_library, load_sources, list_sources,
+    save_source, delete_source,
+)
+from library import sync_remote_plist, search_prompts
+from exporters import export_styles_csv, exporter_for
+from changelog import compact_change_log, export_changes, import_changes, get_state, set_state
+from file_sync import sync_folder
+from merge import MERGE_MODES, apply_merge, describe_diff, discard_staging, stage_json_file, stage_plist_file
+from compressed import strip_compression_suffix
+from db_worker import DBWorker
+from refresh import RefreshScheduler
+from editor import PromptEditor
+import library
+import metrics
+from metrics import ui_action
+import sqltrace
+from ui_watchdog import start_watchdog
+
+# 搜索窗口最多显示的结果数
+SEARCH_LIMIT = 500
+# 自动同步文件夹的间隔（毫秒），没有修改时一次同步只需几毫秒
+SYNC_INTERVAL_MS = 60 * 1000
+# 规范化预设前在确认框中预览的预设个数
+NORMALIZE_PREVIEW = 5
 
 
 def resource_path(relative_path):
@@ -23,12 +60,13 @@ def resource_path(relative_path):
     return os.path.join(prompts_folder, relative_path)
 
 class PromptCombinerApp:
-    def __init__(self, root):
+    def __init__(self, root, plist_path=None):
         """
         初始化AI Prompt生成器的图形用户界面和相关数据结构。
     
         参数:
         root: Tkinter的主窗口对象。
+        plist_path: 指定时以只读模式直接浏览该 .plist 文件，不使用数据库中的提示词。
     
         返回值:
         无
@@ -60,14 +98,39 @@ class PromptCombinerApp:
         self.root.option_add("*Font", default_font)
     
         # 初始化数据结构
-        self.prompt_type_dict = {}  # 类型字典
         self.current_selected_type_dict = {}  # 当前选中类型的提示词
         self.preset_dict = {}  # 预设字典
+        self.prompt_matcher = None  # 反查自动机缓存，数据变更后置空
+        self.read_only = False  # 只读浏览 plist 文件时为真
+        self.read_only_buttons = ()  # 只读模式下禁用的按钮，后台操作完成后也不再启用
     
         # 创建数据库连接
         db_path = resource_path('prompts.db')
-        self.conn = sqlite3.connect(db_path)
+        # 首次运行时复制随程序分发的种子数据库，代替逐行导入 default.plist
+        try:
+            install_seed(db_path)
+        except (OSError, sqlite3.Error) as e:
+            print(f"复制种子数据库失败: {e}")
+        # 设置 PROMPTS_SQL_TRACE 时记录每条 SQL 的耗时，退出时按操作汇总
+        self.conn = sqltrace.connect(db_path)
         self.create_tables()
+        # 写操作都交给后台的写线程，界面线程的连接只用来读
+        self.db = DBWorker(self.root, db_path)
+        # 整理变更日志要扫描整个日志，在写线程中进行，不阻塞启动
+        self.db.write(compact_change_log)
+
+        # 类型字典，各类型的提示词在第一次选中时才从数据库读取
+        self.prompt_type_dict = PromptStore(self.conn)
+
+        # 剪贴板及复制历史，关闭窗口时写入尚未保存的历史
+        self.clipboard = ClipboardHistory(self.root, resource_path('clipboard_history.json'))
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # 设置 PROMPTS_WATCHDOG 时检测界面卡顿，报告写入 stalls 目录
+        self.watchdog = start_watchdog(self.root, resource_path('stalls'))
+
+        # 组合框候选项、状态栏等在空闲时合并刷新，只写入有变化的值
+        self.refresh = RefreshScheduler(self.root)
     
         # 创建TabControl
         self.tab_control = ttk.Notebook(root)
@@ -88,58 +151,32 @@ class PromptCombinerApp:
         self.create_import_export_tab()
     
         self.tab_control.pack(expand=1, fill="both")
+
+        if plist_path:
+            self.enter_read_only_mode(plist_path)
     
         # 初始化数据
         self.initialize_prompt_type_dict()
         self.initialize_prompt_type_combobox()
         self.initialize_presets()
 
+        # 设置了同步文件夹时启动后同步一次，之后定时同步，只读模式下不同步
+        self.folder_sync_running = False
+        self.auto_sync_folder()
+
     def create_tables(self):
         """
-        创建所需的数据库表结构。
+        创建或升级所需的数据库表结构。
         
-        本函数负责根据数据库连接属性self.conn，创建三个主要的数据库表：
+        表结构定义在 migrations.TABLES 中，包括三个主要的数据库表：
         1. prompt_types：存储提示类型信息。
         2. prompts：存储提示信息，包括提示的类型、名称、文本内容和介绍。
-        3. presets：存储预设信息，包括预设名称、提示和负提示。
+        3. presets：存储预设信息，包括预设名称、提示、负提示和介绍。
         
-        每个表的创建都使用了SQL的CREATE TABLE IF NOT EXISTS语句，确保只有在表尚不存在的情况下才会创建，避免了重复创建表导致的错误。
+        迁移按 PRAGMA user_version 记录的版本在一个事务中执行，
+        prompts.py 创建的旧数据库也会被升级到同一结构。
         """
-        # 初始化数据库游标
-        cursor = self.conn.cursor()
-        
-        # 创建类型表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS prompt_types (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                type_name TEXT UNIQUE
-            )
-        ''')
-        
-        # 创建提示词表，使用外键关联类型表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS prompts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                type_id INTEGER,
-                prompt_name TEXT,
-                prompt_text TEXT,
-                introduction TEXT,
-                FOREIGN KEY (type_id) REFERENCES prompt_types (id)
-            )
-        ''')
-        
-        # 预设表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS presets (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                preset_name TEXT,
-                prompt TEXT,
-                negative_prompt TEXT
-            )
-        ''')
-        
-        # 提交事务，确保表创建成功
-        self.conn.commit()
+        migrate(self.conn)
 
     def create_prompt_tab(self):
         """
@@ -184,6 +221,37 @@ class PromptCombinerApp:
             style="Accent.TButton"
         )
         self.add_to_negative_button.grid(row=0, column=5, padx=5, pady=5, sticky="w")
+
+        # 分析按钮：反查文本框中包含的库条目
+        self.analyze_button = ttk.Button(
+            control_frame, 
+            text="分析", 
+            command=self.analyze_prompt_button_click,
+            style="Accent.TButton"
+        )
+        self.analyze_button.grid(row=0, column=6, padx=5, pady=5, sticky="w")
+
+        # 规范化按钮：去重并整理空白、逗号和权重
+        self.normalize_button = ttk.Button(
+            control_frame, 
+            text="规范化", 
+            command=self.normalize_prompt_button_click,
+            style="Accent.TButton"
+        )
+        self.normalize_button.grid(row=0, column=7, padx=5, pady=5, sticky="w")
+
+        # 搜索框：按名称、提示词和介绍搜索整个库
+        ttk.Label(control_frame, text="搜索:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
+        self.search_entry = ttk.Entry(control_frame)
+        self.search_entry.bind("<Return>", lambda event: self.search_button_click())
+        self.search_entry.grid(row=1, column=1, columnspan=3, padx=5, pady=5, sticky="we")
+        self.search_button = ttk.Button(
+            control_frame,
+            text="搜索",
+            command=self.search_button_click,
+            style="Accent.TButton"
+        )
+        self.search_button.grid(row=1, column=4, padx=5, pady=5, sticky="w")
     
         # Prompt文本框
         ttk.Label(main_frame, text="Positive Prompt:").pack(anchor="w", padx=5, pady=5)
@@ -194,6 +262,48 @@ class PromptCombinerApp:
         ttk.Label(main_frame, text="Negative Prompt:").pack(anchor="w", padx=5, pady=5)
         self.negative_prompt_textbox = tk.Text(main_frame, height=3, width=60)
         self.negative_prompt_textbox.pack(fill="x", padx=5, pady=5)
+
+        # 复制按钮
+        copy_frame = ttk.Frame(main_frame)
+        copy_frame.pack(fill="x", padx=5)
+        self.copy_positive_button = ttk.Button(
+            copy_frame,
+            text="复制 Positive",
+            command=self.copy_positive_prompt,
+            style="Accent.TButton"
+        )
+        self.copy_positive_button.grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        self.copy_negative_button = ttk.Button(
+            copy_frame,
+            text="复制 Negative",
+            command=self.copy_negative_prompt,
+            style="Accent.TButton"
+        )
+        self.copy_negative_button.grid(row=0, column=1, padx=5, pady=5, sticky="w")
+        self.clipboard_history_button = ttk.Button(
+            copy_frame,
+            text="复制历史",
+            command=self.open_clipboard_history_dialog,
+            style="Accent.TButton"
+        )
+        self.clipboard_history_button.grid(row=0, column=2, padx=5, pady=5, sticky="w")
+        # 输入时按标签高亮已知、未知和重复的提示词
+        self.highlight_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            copy_frame,
+            text="标签高亮",
+            variable=self.highlight_var,
+            command=self.toggle_highlight
+        ).grid(row=0, column=3, padx=5, pady=5, sticky="w")
+
+        # 分析结果的高亮样式
+        for textbox in (self.prompt_textbox, self.negative_prompt_textbox):
+            textbox.tag_configure("known", background="#d9f2d9")
+            textbox.tag_configure("unknown", foreground="#c0392b", underline=True)
+        self.prompt_editors = [
+            PromptEditor(textbox, lambda: self.get_prompt_matcher().payloads)
+            for textbox in (self.prompt_textbox, self.negative_prompt_textbox)
+        ]
     
         # 预设区域
         preset_frame = ttk.LabelFrame(main_frame, text="预设")
@@ -376,6 +486,20 @@ class PromptCombinerApp:
         )
         self.apply_remote_prompt_button.grid(row=0, column=2, padx=5, pady=5, sticky="w")
 
+        # 多源同步按钮：管理多个远程源并同时同步
+        self.remote_sources_button = ttk.Button(
+            remote_frame, 
+            text="多源同步", 
+            command=self.open_remote_sources_dialog,
+            style="Accent.TButton"
+        )
+        self.remote_sources_button.grid(row=0, column=3, padx=5, pady=5, sticky="w")
+
+        # 可选的 SHA-256 校验值，留空时使用服务器上的 .sha256 文件（如果有）
+        ttk.Label(remote_frame, text="SHA-256(可选):").grid(row=1, column=0, padx=5, pady=5, sticky="w")
+        self.remote_sha256_textbox = ttk.Entry(remote_frame, width=40)
+        self.remote_sha256_textbox.grid(row=1, column=1, padx=5, pady=5, sticky="w")
+
         # 导入导出区域
         io_frame = ttk.LabelFrame(main_frame, text="导入导出")
         io_frame.pack(fill="x", padx=5, pady=5)
@@ -383,7 +507,7 @@ class PromptCombinerApp:
         # 导出按钮
         self.export_button = ttk.Button(
             io_frame, 
-            text="导出为JSON", 
+            text="导出为JSON/PLIST/CSV", 
             command=self.export_to_json,
             style="Accent.TButton"
         )
@@ -398,43 +522,125 @@ class PromptCombinerApp:
         )
         self.import_button.grid(row=0, column=1, padx=5, pady=5)
 
+        # 导入时与库中同名提示词的冲突策略
+        ttk.Label(io_frame, text="导入方式:").grid(row=1, column=0, padx=5, pady=5, sticky="e")
+        self.import_mode_combobox = ttk.Combobox(
+            io_frame, values=[label for _, label in MERGE_MODES], state="readonly", width=14
+        )
+        self.import_mode_combobox.current(0)
+        self.import_mode_combobox.grid(row=1, column=1, padx=5, pady=5, sticky="w")
+
+        # 把预设导出为 SD WebUI 的样式文件
+        self.export_styles_button = ttk.Button(
+            io_frame, 
+            text="导出预设为styles.csv", 
+            command=self.export_presets_to_styles,
+            style="Accent.TButton"
+        )
+        self.export_styles_button.grid(row=1, column=2, padx=5, pady=5)
+
+        # 增量同步：导出上次导出之后的修改，导入其他机器导出的增量
+        self.export_changes_button = ttk.Button(
+            io_frame, 
+            text="导出增量", 
+            command=self.export_changes_click,
+            style="Accent.TButton"
+        )
+        self.export_changes_button.grid(row=1, column=3, padx=5, pady=5)
+
+        self.import_changes_button = ttk.Button(
+            io_frame, 
+            text="导入增量", 
+            command=self.import_changes_click,
+            style="Accent.TButton"
+        )
+        self.import_changes_button.grid(row=1, column=4, padx=5, pady=5)
+
+        # 规范化预设按钮
+        self.normalize_presets_button = ttk.Button(
+            io_frame, 
+            text="规范化预设", 
+            command=self.normalize_presets,
+            style="Accent.TButton"
+        )
+        self.normalize_presets_button.grid(row=0, column=2, padx=5, pady=5)
+
+        # 查重按钮
+        self.dedupe_button = ttk.Button(
+            io_frame, 
+            text="查重", 
+            command=self.open_dedupe_dialog,
+            style="Accent.TButton"
+        )
+        self.dedupe_button.grid(row=0, column=3, padx=5, pady=5)
+
+        # 校验文件按钮
+        self.lint_button = ttk.Button(
+            io_frame, 
+            text="校验文件", 
+            command=self.open_lint_dialog,
+            style="Accent.TButton"
+        )
+        self.lint_button.grid(row=0, column=4, padx=5, pady=5)
+
+        # 只读浏览按钮：不导入数据库，直接浏览 plist 文件
+        self.read_only_button = ttk.Button(
+            io_frame, 
+            text="只读浏览PLIST", 
+            command=self.open_plist_read_only_click,
+            style="Accent.TButton"
+        )
+        self.read_only_button.grid(row=0, column=5, padx=5, pady=5)
+
+        # 诊断按钮：查看性能指标
+        self.diagnostics_button = ttk.Button(
+            io_frame, 
+            text="诊断", 
+            command=self.open_diagnostics_dialog,
+            style="Accent.TButton"
+        )
+        self.diagnostics_button.grid(row=0, column=6, padx=5, pady=5)
+
+        # 文件夹同步区域：通过共享文件夹或 U 盘与其他机器双向同步
+        sync_frame = ttk.LabelFrame(main_frame, text="文件夹同步")
+        sync_frame.pack(fill="x", padx=5, pady=5)
+
+        ttk.Label(sync_frame, text="同步文件夹:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        self.sync_folder_textbox = ttk.Entry(sync_frame, width=40)
+        self.sync_folder_textbox.insert(0, get_state(self.conn, "sync_folder") or "")
+        self.sync_folder_textbox.grid(row=0, column=1, padx=5, pady=5, sticky="w")
+
+        self.choose_sync_folder_button = ttk.Button(
+            sync_frame, 
+            text="选择文件夹", 
+            command=self.choose_sync_folder_click,
+            style="Accent.TButton"
+        )
+        self.choose_sync_folder_button.grid(row=0, column=2, padx=5, pady=5, sticky="w")
+
+        self.sync_folder_button = ttk.Button(
+            sync_frame, 
+            text="立即同步", 
+            command=self.sync_folder_click,
+            style="Accent.TButton"
+        )
+        self.sync_folder_button.grid(row=0, column=3, padx=5, pady=5, sticky="w")
+
         # 状态标签
         self.status_label = ttk.Label(main_frame, text="准备就绪", width=40)
         self.status_label.pack(padx=5, pady=5)
 
     def initialize_prompt_type_dict(self):
-        self.prompt_type_dict.clear()
-        cursor = self.conn.cursor()
-    
+        self.prompt_matcher = None
         try:
-            # 获取所有类型
-            cursor.execute("SELECT id, type_name FROM prompt_types")
-            types = cursor.fetchall()
-    
-            # 获取所有提示词
-            cursor.execute("SELECT id, type_id, prompt_name, prompt_text, introduction FROM prompts")
-            prompts = cursor.fetchall()
-    
-            # 构建类型字典及 type_id 到 type_name 的映射
-            type_id_to_name = {}
-            for type_id, type_name in types:
-                self.prompt_type_dict[type_name] = {
-                    'id': type_id,
-                    'prompts': {}
-                }
-                type_id_to_name[type_id] = type_name
-    
-            # 将提示词添加到对应类型
-            for prompt_id, type_id, prompt_name, prompt_text, introduction in prompts:
-                type_name = type_id_to_name.get(type_id)
-                if type_name:
-                    self.prompt_type_dict[type_name]['prompts'][prompt_name] = (prompt_id, prompt_text, introduction)
-    
+            # 只重新读取类型名称和条数，提示词按需加载
+            self.prompt_type_dict.reload()
         except Exception as e:
             # 可根据实际项目替换为 logging.error(e)
             print(f"Error initializing prompt type dict: {e}")
-        finally:
-            cursor.close()
+        # 库已变化，打开了标签高亮时重新标注
+        for editor in self.prompt_editors:
+            editor.refresh()
 
     def initialize_presets(self):
         """
@@ -446,9 +652,6 @@ class PromptCombinerApp:
         # 清空现有的预设参数字典，准备加载新的预设参数。
         self.preset_dict.clear()
         
-        # 设置预设参数组合框的值为空列表，准备后续填充从数据库中获取的预设参数名称。
-        self.presets_combobox['values'] = []
-        
         # 创建数据库连接的游标对象，用于执行SQL查询。
         cursor = self.conn.cursor()
         
@@ -463,8 +666,8 @@ class PromptCombinerApp:
             preset_name, prompt, negative_prompt = row
             self.preset_dict[preset_name] = (prompt, negative_prompt)
         
-        # 更新预设参数组合框的值为预设参数字典中的所有键（即预设参数名称）。
-        self.presets_combobox['values'] = list(self.preset_dict.keys())
+        # 更新预设参数组合框的值为预设参数字典中的所有键（即预设参数名称），空闲时刷新。
+        self.refresh.configure(self.presets_combobox, "values", list(self.preset_dict.keys()))
 
     def initialize_prompt_type_combobox(self):
         """
@@ -472,12 +675,15 @@ class PromptCombinerApp:
         
         该方法将提示类型组合框和CRUD类型组合框的值设置为提示类型字典的键。
         这样做是为了确保用户界面组件可以正确地显示所有可用的提示和CRUD类型。
+        两个组合框在空闲时合并刷新，类型没有变化时不会重写候选项。
         """
+        type_names = list(self.prompt_type_dict.keys())
         # 设置提示类型组合框的值为提示类型字典的键
-        self.prompt_type_combobox['values'] = list(self.prompt_type_dict.keys())
+        self.refresh.configure(self.prompt_type_combobox, "values", type_names)
         # 设置CRUD类型组合框的值为提示类型字典的键
-        self.crud_type_combobox['values'] = list(self.prompt_type_dict.keys())
+        self.refresh.configure(self.crud_type_combobox, "values", type_names)
 
+    @ui_action
     def prompt_type_combobox_selection_changed(self, event):
         """
         当prompt类型组合框的选中项发生变化时调用此函数。
@@ -505,6 +711,25 @@ class PromptCombinerApp:
         # 清除介绍标签的文本
         self.introduction_label.config(text="")
 
+    def selected_prompt(self):
+        """
+        返回提示词选择框中选中条目的 (id 或行偏移, 提示词, 介绍)，没有选中或不存在时返回 None。
+        只读浏览的 plist 文件被修改后，按新的内容重新读取当前类型。
+        """
+        selected_prompt = self.prompt_combobox.get()
+        if not selected_prompt:
+            return None
+        try:
+            return self.current_selected_type_dict.get(selected_prompt)
+        except PlistChangedError:
+            selected_type = self.prompt_type_combobox.get()
+            if selected_type not in self.prompt_type_dict:
+                self.current_selected_type_dict = {}
+                return None
+            self.current_selected_type_dict = self.prompt_type_dict[selected_type]['prompts']
+            return self.current_selected_type_dict.get(selected_prompt)
+
+    @ui_action
     def prompt_combobox_selection_changed(self, event):
         """
         当提示词组合框的选中项发生变化时调用此函数。
@@ -518,16 +743,56 @@ class PromptCombinerApp:
         - 如果存在，获取对应的介绍信息，并更新介绍标签的文本。
         """
         # 获取当前选中的提示词
-        selected_prompt = self.prompt_combobox.get()
+        prompt = self.selected_prompt()
         
         # 检查该提示词是否存在于当前选中的类型字典中
-        if selected_prompt and selected_prompt in self.current_selected_type_dict:
-            # 获取该提示词对应的介绍信息
-            introduction = self.current_selected_type_dict[selected_prompt][2]
-            
-            # 更新介绍标签的文本
-            self.introduction_label.config(text=introduction)
+        if prompt:
+            # 更新介绍标签的文本为该提示词对应的介绍信息
+            self.introduction_label.config(text=prompt[2])
+
+    @ui_action
+    def search_button_click(self):
+        """
+        搜索提示词库并在窗口中列出结果，双击结果会在类型和提示词选择框中选中该条目。
+        """
+        keyword = self.search_entry.get()
+        if not keyword.strip():
+            return
+        results = search_prompts(self.prompt_type_dict, keyword, limit=SEARCH_LIMIT)
 
+        search_window = tk.Toplevel(self.root)
+        search_window.title(f"搜索: {keyword}")
+        search_window.geometry("700x420")
+        search_window.transient(self.root)
+
+        tree = ttk.Treeview(search_window, columns=("type", "name", "text", "introduction"), show="headings")
+        tree.heading("type", text="类型")
+        tree.heading("name", text="名称")
+        tree.heading("text", text="提示词文本")
+        tree.heading("introduction", text="介绍")
+        tree.column("type", width=100)
+        tree.column("name", width=120)
+        tree.column("text", width=240)
+        tree.column("introduction", width=200)
+        for index, result in enumerate(results):
+            tree.insert("", tk.END, iid=str(index), values=result)
+        tree.pack(fill="both", expand=True, padx=10, pady=10)
+
+        def select_result(event):
+            selection = tree.selection()
+            if not selection:
+                return
+            type_name, prompt_name = results[int(selection[0])][:2]
+            self.prompt_type_combobox.set(type_name)
+            self.prompt_type_combobox_selection_changed(None)
+            self.prompt_combobox.set(prompt_name)
+            self.prompt_combobox_selection_changed(None)
+
+        tree.bind("<Double-1>", select_result)
+        suffix = f"（仅显示前 {SEARCH_LIMIT} 条）" if len(results) >= SEARCH_LIMIT else ""
+        ttk.Label(search_window, text=f"共 {len(results)} 条{suffix}").pack(anchor="w", padx=10, pady=5)
+
+    @ui_action
     def add_to_prompt_button_click(self):
         """
         当用户点击 "Positive Prompt" 按钮时，将当前选中的提示词添加到正向提示文本框中。
@@ -547,17 +812,234 @@ class PromptCombinerApp:
         返回值:
         无返回值。操作结果反映在界面上的文本框中。
         """
-        selected_prompt = self.prompt_combobox.get()
-        if selected_prompt and selected_prompt in self.current_selected_type_dict:
-            prompt = self.current_selected_type_dict[selected_prompt][1]
-            self.prompt_textbox.insert(tk.END, prompt + ', ')
+        prompt = self.selected_prompt()
+        if prompt:
+            self.prompt_textbox.insert(tk.END, prompt[1] + ', ')
+
+    def get_prompt_matcher(self):
+        """
+        获取反查自动机，首次使用或数据变更后才重新构建。
+        """
+        if self.prompt_matcher is None:
+            if isinstance(self.prompt_type_dict, PlistLibrary):
+                self.prompt_matcher = PromptMatcher(self.prompt_type_dict.iter_entries())
+            else:
+                self.prompt_matcher = build_matcher(self.conn)
+        return self.prompt_matcher
 
+    @ui_action
+    def analyze_prompt_button_click(self):
+        """
+        分析正向和负向文本框中的 prompt，高亮已知和未知片段，
+        并在介绍标签中列出命中条目的中文名称和介绍。
+        """
+        matcher = self.get_prompt_matcher()
+        lines = []
+        seen = set()
+        for textbox in (self.prompt_textbox, self.negative_prompt_textbox):
+            text = textbox.get("1.0", "end-1c")
+            textbox.tag_remove("known", "1.0", tk.END)
+            textbox.tag_remove("unknown", "1.0", tk.END)
+            matches, unknown = matcher.annotate(text)
+            for start, end, pattern, payloads in matches:
+                textbox.tag_add("known", f"1.0+{start}c", f"1.0+{end}c")
+                for type_name, prompt_name, introduction in payloads:
+                    if (type_name, prompt_name) in seen:
+                        continue
+                    seen.add((type_name, prompt_name))
+                    line = f"{pattern}: {prompt_name}（{type_name}）"
+                    if introduction:
+                        line += f" - {introduction}"
+                    lines.append(line)
+            for start, end in unknown:
+                textbox.tag_add("unknown", f"1.0+{start}c", f"1.0+{end}c")
+        self.introduction_label.config(text="；".join(lines) if lines else "未找到库中的提示词")
+
+    @ui_action
+    def toggle_highlight(self):
+        """
+        打开或关闭 Positive/Negative 文本框的标签高亮，打开时构建反查自动机并整段标注。
+        """
+        for editor in self.prompt_editors:
+            if self.highlight_var.get():
+                editor.enable()
+            else:
+                editor.disable()
+
+    @ui_action
+    def normalize_prompt_button_click(self):
+        """
+        规范化正向和负向文本框中的 prompt。
+        """
+        for textbox in (self.prompt_textbox, self.negative_prompt_textbox):
+            text = textbox.get("1.0", "end-1c")
+            normalized = normalize_prompt(text)
+            if normalized != text.strip():
+                textbox.delete("1.0", tk.END)
+                textbox.insert(tk.END, normalized)
+
+    @ui_action
     def add_to_negative_button_click(self):
-        selected_prompt = self.prompt_combobox.get()
-        if selected_prompt and selected_prompt in self.current_selected_type_dict:
-            prompt = self.current_selected_type_dict[selected_prompt][1]
-            self.negative_prompt_textbox.insert(tk.END, prompt + ', ')
+        prompt = self.selected_prompt()
+        if prompt:
+            self.negative_prompt_textbox.insert(tk.END, prompt[1] + ', ')
+
+    @ui_action
+    def copy_positive_prompt(self):
+        prompt_content = self.prompt_textbox.get("1.0", tk.END).strip()
+        if not prompt_content:
+            messagebox.showwarning("提示", "Positive Prompt 中没有内容可复制！")
+            return
+        self.clipboard.copy(prompt_content, "Positive")
+        self.set_status("Positive Prompt 已复制到剪贴板")
+
+    @ui_action
+    def copy_negative_prompt(self):
+        negative_prompt_content = self.negative_prompt_textbox.get("1.0", tk.END).strip()
+        if not negative_prompt_content:
+            messagebox.showwarning("提示", "Negative Prompt 中没有内容可复制！")
+            return
+        self.clipboard.copy(negative_prompt_content, "Negative")
+        self.set_status("Negative Prompt 已复制到剪贴板")
+
+    def open_clipboard_history_dialog(self):
+        """
+        列出最近复制的内容，可按关键字过滤，双击某条重新复制到剪贴板。
+        """
+        history_window = tk.Toplevel(self.root)
+        history_window.title("复制历史")
+        history_window.geometry("700x420")
+        history_window.transient(self.root)
+
+        filter_frame = ttk.Frame(history_window)
+        filter_frame.pack(fill="x", padx=10, pady=5)
+        ttk.Label(filter_frame, text="搜索:").pack(side="left")
+        filter_entry = ttk.Entry(filter_frame)
+        filter_entry.pack(side="left", fill="x", expand=True, padx=5)
+
+        tree = ttk.Treeview(history_window, columns=("time", "label", "text"), show="headings")
+        tree.heading("time", text="时间")
+        tree.heading("label", text="来源")
+        tree.heading("text", text="内容")
+        tree.column("time", width=130)
+        tree.column("label", width=80)
+        tree.column("text", width=440)
+        tree.pack(fill="both", expand=True, padx=10, pady=5)
+        shown = []
+
+        def refresh(event=None):
+            tree.delete(*tree.get_children())
+            shown[:] = self.clipboard.search(filter_entry.get())
+            for index, entry in enumerate(shown):
+                copied_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["time"]))
+                tree.insert("", tk.END, iid=str(index), values=(copied_at, entry["label"], entry["text"]))
+
+        def copy_selected(event):
+            selection = tree.selection()
+            if not selection:
+                return
+            entry = shown[int(selection[0])]
+            self.clipboard.copy(entry["text"], entry["label"])
+            self.set_status("已从历史复制到剪贴板")
+            refresh()
 
+        def clear_history():
+            if messagebox.askyesno("确认", "确定要清空复制历史吗？", parent=history_window):
+                self.clipboard.clear()
+                refresh()
+
+        filter_entry.bind("<KeyRelease>", refresh)
+        tree.bind("<Double-1>", copy_selected)
+        ttk.Button(
+            history_window,
+            text="清空历史",
+            command=clear_history,
+            style="Accent.TButton"
+        ).pack(anchor="e", padx=10, pady=5)
+        refresh()
+        filter_entry.focus_set()
+
+    def open_diagnostics_dialog(self):
+        """
+        列出性能指标：计数器和仪表显示当前值，直方图显示次数和分位数（毫秒）。
+        可以刷新、清零或导出为 JSON。
+        """
+        diagnostics_window = tk.Toplevel(self.root)
+        diagnostics_window.title("诊断")
+        diagnostics_window.geometry("760x420")
+        diagnostics_window.transient(self.root)
+
+        columns = ("type", "value", "p50", "p90", "p99", "max")
+        tree = ttk.Treeview(diagnostics_window, columns=columns, show="tree headings")
+        tree.heading("#0", text="指标")
+        tree.column("#0", width=240)
+        for column, text in zip(columns, ("类型", "值/次数", "p50", "p90", "p99", "最大")):
+            tree.heading(column, text=text)
+            tree.column(column, width=80, anchor="e")
+        tree.pack(fill="both", expand=True, padx=10, pady=10)
+        summary_label = ttk.Label(diagnostics_window, text="")
+        summary_label.pack(anchor="w", padx=10)
+
+        def format_value(value, unit):
+            return f"{value / 1e6:.2f} ms" if unit == "ns" else f"{value:g}"
+
+        def refresh():
+            tree.delete(*tree.get_children())
+            for name, data in metrics.REGISTRY.snapshot().items():
+                if data["type"] == "histogram":
+                    if not data["count"]:
+                        continue
+                    values = [data["count"]] + [format_value(data[k], data["unit"]) for k in ("p50", "p90", "p99", "max")]
+                else:
+                    values = [data["value"], "", "", "", ""]
+                tree.insert("", tk.END, text=name, values=[data["type"]] + values)
+            rate = metrics.hit_rate("store.cache")
+            summary_label.config(text="类型缓存命中率: " + ("-" if rate is None else f"{rate:.1%}"))
+
+        def reset():
+            metrics.REGISTRY.reset()
+            refresh()
+
+        def export():
+            file_path = filedialog.asksaveasfilename(
+                parent=diagnostics_window,
+                defaultextension=".json",
+                filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            )
+            if file_path:
+                try:
+                    metrics.REGISTRY.dump(file_path)
+                except OSError as e:
+                    messagebox.showerror("错误", f"导出失败: {str(e)}", parent=diagnostics_window)
+                    return
+                self.set_status(f"性能指标已导出: {file_path}")
+
+        button_frame = ttk.Frame(diagnostics_window)
+        button_frame.pack(fill="x", padx=10, pady=5)
+        for text, command in (("刷新", refresh), ("清零", reset), ("导出JSON", export)):
+            ttk.Button(
+                button_frame, 
+                text=text, 
+                command=command,
+                style="Accent.TButton"
+            ).pack(side="left", padx=2)
+        refresh()
+
+    def on_close(self):
+        if self.watchdog:
+            self.watchdog.stop()
+        self.clipboard.flush()
+        # 等待已提交的写操作完成
+        self.db.close()
+        self.root.destroy()
+
+    def set_status(self, text):
+        self.refresh.configure(self.status_label, "text", text)
+
+    def show_db_error(self, error):
+        messagebox.showerror("错误", f"数据库操作失败: {str(error)}")
+
+    @ui_action
     def save_config_button_click(self):
         prompt = self.prompt_textbox.get("1.0", tk.END).strip()
         negative_prompt = self.negative_prompt_textbox.get("1.0", tk.END).strip()
@@ -565,28 +1047,15 @@ class PromptCombinerApp:
         def save_preset():
             save_name = save_name_entry.get().strip()
             if save_name:
-                cursor = self.conn.cursor()
-                # 检查预设名称是否已存在
-                cursor.execute("SELECT id FROM presets WHERE preset_name = ?", (save_name,))
-                existing_preset = cursor.fetchone()
-                
-                if existing_preset:
-                    # 更新现有预设
-                    cursor.execute(
-                        "UPDATE presets SET prompt = ?, negative_prompt = ? WHERE preset_name = ?",
-                        (prompt, negative_prompt, save_name)
-                    )
-                else:
-                    # 插入新预设
-                    cursor.execute(
-                        "INSERT INTO presets (preset_name, prompt, negative_prompt) VALUES (?,?,?)",
-                        (save_name, prompt, negative_prompt)
-                    )
-                
-                self.conn.commit()
+                def saved(result):
+                    self.initialize_presets()
+                    messagebox.showinfo("成功", f"预设 '{save_name}' 已保存")
+
                 save_window.destroy()
-                self.initialize_presets()
-                messagebox.showinfo("成功", f"预设 '{save_name}' 已保存")
+                self.db.write(
+                    library.save_preset, save_name, prompt, negative_prompt,
+                    callback=saved, errback=self.show_db_error
+                )
             else:
                 messagebox.showerror("错误", "请输入预设名称")
 
@@ -616,6 +1085,7 @@ class PromptCombinerApp:
         )
         save_confirm_button.pack(pady=10)
 
+    @ui_action
     def load_config_button_click(self):
         selected_preset = self.presets_combobox.get()
         if selected_preset and selected_preset in self.preset_dict:
@@ -625,6 +1095,223 @@ class PromptCombinerApp:
             self.negative_prompt_textbox.delete("1.0", tk.END)
             self.negative_prompt_textbox.insert(tk.END, negative_prompt)
 
+    @ui_action
+    def normalize_presets(self):
+        """
+        批量规范化预设表中的正向和负向 prompt。改写前列出会变化的预设个数和前几个预设的改动，确认后才写入。
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT id, prompt, negative_prompt, preset_name FROM presets")
+        rows = cursor.fetchall()
+        prompts = normalize_many(row[1] for row in rows)
+        negative_prompts = normalize_many(row[2] for row in rows)
+        changed = []
+        preview = []
+        for row, prompt, negative_prompt in zip(rows, prompts, negative_prompts):
+            if (prompt, negative_prompt) == ((row[1] or ""), (row[2] or "")):
+                continue
+            changed.append((prompt, negative_prompt, row[0]))
+            if len(preview) < NORMALIZE_PREVIEW:
+                before = row[1] if prompt != (row[1] or "") else row[2]
+                after = prompt if prompt != (row[1] or "") else negative_prompt
+                preview.append(f"{row[3]}:\n  {before}\n  -> {after}")
+        if not changed:
+            messagebox.showinfo("提示", f"{len(rows)} 个预设都已是规范格式")
+            return
+        message = f"将改写 {len(changed)}/{len(rows)} 个预设，例如:\n\n" + "\n".join(preview)
+        if len(changed) > len(preview):
+            message += f"\n\n……另有 {len(changed) - len(preview)} 个"
+        if not messagebox.askyesno("确认规范化", message + "\n\n是否继续？"):
+            return
+
+        def updated(result):
+            self.initialize_presets()
+            self.set_status(f"已规范化 {len(changed)} 个预设")
+
+        self.db.write(library.update_presets, changed, callback=updated, errback=self.show_db_error)
+
+    @ui_action
+    def open_dedupe_dialog(self):
+        """
+        打开查重窗口，列出近似重复的提示词分组，选中分组或其中一行后一键合并。
+        选中行时保留该行，选中分组时保留分组的第一行。
+        """
+        rows = load_rows(self.conn)
+        clusters, capped = find_duplicate_clusters(rows)
+        clustered_ids = {row[0] for cluster in clusters for row in cluster}
+        clusters += [[row] for row in find_repeated_variants(rows) if row[0] not in clustered_ids]
+
+        dedupe_window = tk.Toplevel(self.root)
+        dedupe_window.title("查重")
+        dedupe_window.geometry("700x420")
+        dedupe_window.transient(self.root)
+
+        tree = ttk.Treeview(dedupe_window, columns=("type", "name", "text"), show="tree headings")
+        tree.heading("#0", text="分组")
+        tree.heading("type", text="类型")
+        tree.heading("name", text="名称")
+        tree.heading("text", text="提示词文本")
+        tree.column("#0", width=120)
+        tree.column("type", width=100)
+        tree.column("name", width=120)
+        tree.column("text", width=320)
+        tree.pack(fill="both", expand=True, padx=10, pady=10)
+
+        for index, cluster in enumerate(clusters, 1):
+            label = f"分组 {index}（{len(cluster)} 条）" if len(cluster) > 1 else "重复变体"
+            parent = tree.insert("", tk.END, text=label, open=True)
+            for prompt_id, type_name, prompt_name, prompt_text in cluster:
+                tree.insert(parent, tk.END, iid=f"p{prompt_id}", values=(type_name, prompt_name, prompt_text))
+
+        def merge_selected():
+            selection = tree.selection()
+            if not selection:
+                messagebox.showerror("错误", "请选择要合并的分组", parent=dedupe_window)
+                return
+            item = selection[0]
+            parent = tree.parent(item) or item
+            children = tree.get_children(parent)
+            keep = item if tree.parent(item) else children[0]
+            keep_id = int(keep[1:])
+            drop_ids = [int(child[1:]) for child in children if child != keep]
+
+            def merged(merged_text):
+                if tree.exists(parent):
+                    tree.delete(parent)
+                self.prompt_type_dict.invalidate()
+                self.refresh_crud()
+                self.set_status(f"已合并 {len(drop_ids) + 1} 条: {merged_text}")
+
+            self.db.run(merge_prompts, keep_id, drop_ids, callback=merged, errback=self.show_db_error)
+
+        button_frame = ttk.Frame(dedupe_window)
+        button_frame.pack(fill="x", padx=10, pady=5)
+        summary = f"共 {len(clusters)} 组"
+        if capped:
+            summary += f"，{capped} 条因候选过多未与全部相似条目比较"
+        ttk.Label(button_frame, text=summary).pack(side="left")
+        ttk.Button(
+            button_frame, 
+            text="合并所选", 
+            command=merge_selected,
+            style="Accent.TButton"
+        ).pack(side="right")
+
+    @ui_action
+    def open_lint_dialog(self):
+        """
+        选择一个 .plist 或 .json 文件（可以是 .gz/.bz2/.xz 压缩的）进行校验，并在窗口中按行号列出所有问题。
+        大文件校验需要几秒，在后台线程中进行，完成后在界面线程中显示结果。
+        """
+        file_path = filedialog.askopenfilename(
+            filetypes=[
+                ("PLIST files", "*.plist"),
+                ("JSON files", "*.json"),
+                ("压缩文件", "*.gz *.bz2 *.xz"),
+                ("All files", "*.*"),
+            ]
+        )
+        if not file_path:
+            return
+        outcome = {}
+
+        def worker():
+            try:
+                outcome["result"] = lint_file(file_path)
+            except Exception as e:
+                outcome["error"] = e
+
+        def poll():
+            if not outcome:
+                self.root.after(100, poll)
+                return
+            self.lint_button.state(["!disabled"])
+            if "error" in outcome:
+                self.set_status("校验失败")
+                messagebox.showerror("错误", f"校验失败: {str(outcome['error'])}")
+                return
+            self.set_status(f"校验完成: {file_path}")
+            self.show_lint_result(file_path, outcome["result"])
+
+        self.lint_button.state(["disabled"])
+        self.set_status(f"正在校验: {file_path}")
+        threading.Thread(target=worker, daemon=True).start()
+        self.root.after(100, poll)
+
+    def show_lint_result(self, file_path, problems):
+        errors = sum(1 for p in problems if p[1] == ERROR)
+        lint_window = tk.Toplevel(self.root)
+        lint_window.title(f"校验结果 - {os.path.basename(file_path)}")
+        lint_window.geometry("700x420")
+        lint_window.transient(self.root)
+
+        ttk.Label(
+            lint_window, 
+            text=f"共 {errors} 个错误，{len(problems) - errors} 个警告"
+        ).pack(anchor="w", padx=10, pady=5)
+
+        tree = ttk.Treeview(lint_window, columns=("line", "level", "message"), show="headings")
+        tree.heading("line", text="行号")
+        tree.heading("level", text="级别")
+        tree.heading("message", text="信息")
+        tree.column("line", width=70, anchor="e")
+        tree.column("level", width=60)
+        tree.column("message", width=520)
+        tree.tag_configure("error", foreground="#c0392b")
+        for line_no, level, message in problems:
+            tree.insert("", tk.END, values=(line_no, level, message), tags=("error",) if level == ERROR else ())
+        tree.pack(fill="both", expand=True, padx=10, pady=5)
+
+    def enter_read_only_mode(self, plist_path):
+        """
+        切换为只读浏览 plist 文件：提示词生成和搜索改用 plist 的索引，
+        禁用提示词管理页以及会修改、导出或同步数据库提示词的按钮，并停止定时同步。
+        预设仍保存在数据库中。
+        """
+        self.prompt_type_dict = PlistLibrary(plist_path)
+        self.current_selected_type_dict = {}
+        self.prompt_matcher = None
+        self.read_only = True
+        self.tab_control.tab(self.crud_tab, state="disabled")
+        self.read_only_buttons = (
+            self.apply_remote_prompt_button, self.remote_sources_button,
+            self.import_button, self.export_button, self.dedupe_button,
+            self.export_changes_button, self.import_changes_button,
+            self.choose_sync_folder_button, self.sync_folder_button,
+        )
+        for button in self.read_only_buttons:
+            button.state(["disabled"])
+        self.root.title(f"AI Prompt生成器（只读: {os.path.basename(plist_path)}）")
+
+    def enable_button(self, button):
+        """
+        后台操作完成后恢复按钮；只读模式下禁用的按钮保持禁用。
+        """
+        if button not in self.read_only_buttons:
+            button.state(["!disabled"])
+
+    @ui_action
+    def open_plist_read_only_click(self):
+        file_path = filedialog.askopenfilename(
+            filetypes=[("PLIST files", "*.plist"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        try:
+            self.enter_read_only_mode(file_path)
+        except Exception as e:
+            messagebox.showerror("错误", f"打开失败: {str(e)}")
+            return
+        self.initialize_prompt_type_combobox()
+        for editor in self.prompt_editors:
+            editor.refresh()
+        self.prompt_type_combobox.set('')
+        self.prompt_combobox.set('')
+        self.prompt_combobox['values'] = []
+        self.introduction_label.config(text="")
+        self.set_status(f"只读浏览: {file_path}")
+
+    @ui_action
     def apply_remote_prompt_button_click(self):
         url = self.remote_prompt_url_textbox.get()
         if url:
@@ -632,52 +1319,179 @@ class PromptCombinerApp:
                 # 创建保存目录
                 if not os.path.exists("prompts"):
                     os.makedirs("prompts")
-                
-                file_name = "default.plist"
-                file_path = os.path.join("prompts", file_name)
-                
-                # 下载文件
-                with urllib.request.urlopen(url) as response, open(file_path, 'wb') as out_file:
-                    data = response.read()
-                    out_file.write(data)
-                
-                cursor = self.conn.cursor()
-                
-                # 清空现有数据
-                cursor.execute("DELETE FROM prompts")
-                cursor.execute("DELETE FROM prompt_types")
-                
-                # 重新导入数据
-                type_map = {}  # 用于映射类型名称到ID
-                
-                with open(file_path, "r", encoding="utf-8") as f:
-                    for line in f:
-                        fields = line.strip().split('^')
-                        if len(fields) == 4:
-                            prompt_type, prompt_name, prompt_text, introduction = fields
-                            
-                            # 如果类型不存在，创建新类型
-                            if prompt_type not in type_map:
-                                cursor.execute("INSERT INTO prompt_types (type_name) VALUES (?)", (prompt_type,))
-                                type_id = cursor.lastrowid
-                                type_map[prompt_type] = type_id
-                            else:
-                                type_id = type_map[prompt_type]
-                            
-                            # 插入提示词
-                            cursor.execute(
-                                "INSERT INTO prompts (type_id, prompt_name, prompt_text, introduction) VALUES (?,?,?,?)",
-                                (type_id, prompt_name, prompt_text, introduction)
-                            )
-                
-                self.conn.commit()
+            except OSError as e:
+                messagebox.showerror("错误", f"下载失败: {str(e)}")
+                return
 
+            file_name = "default.plist"
+            file_path = os.path.join("prompts", file_name)
+
+            def applied(result):
+                self.enable_button(self.apply_remote_prompt_button)
+                self.prompt_type_dict.invalidate()
                 self.initialize_prompt_type_dict()
                 self.initialize_prompt_type_combobox()
                 messagebox.showinfo("成功", "远程prompt应用成功")
-            except Exception as e:
+
+            def failed(e):
+                self.enable_button(self.apply_remote_prompt_button)
                 messagebox.showerror("错误", f"下载失败: {str(e)}")
 
+            # 在写线程中下载文件并重新导入数据，下载不完整或校验失败时不会导入
+            sha256 = self.remote_sha256_textbox.get().strip() or None
+            self.apply_remote_prompt_button.state(["disabled"])
+            self.db.run(sync_remote_plist, url, file_path, sha256, callback=applied, errback=failed)
+
+    @ui_action
+    def open_remote_sources_dialog(self):
+        """
+        管理远程源（名称、地址、优先级、是否启用），并同时同步所有启用的源。
+        同名提示词取优先级高的源；下载在后台线程中进行，合并后交给写线程（DBWorker）在一个事务中
+        写入数据库，写入期间界面保持响应。
+        """
+        sources_window = tk.Toplevel(self.root)
+        sources_window.title("多源同步")
+        sources_window.geometry("700x420")
+        sources_window.transient(self.root)
+
+        tree = ttk.Treeview(sources_window, columns=("name", "priority", "enabled", "url"), show="headings")
+        tree.heading("name", text="名称")
+        tree.heading("priority", text="优先级")
+        tree.heading("enabled", text="启用")
+        tree.heading("url", text="地址")
+        tree.column("name", width=100)
+        tree.column("priority", width=60)
+        tree.column("enabled", width=50)
+        tree.column("url", width=420)
+        tree.pack(fill="both", expand=True, padx=10, pady=10)
+        rows = []
+
+        def refresh():
+            tree.delete(*tree.get_children())
+            rows[:] = list_sources(self.conn)
+            for index, (name, url, priority, enabled) in enumerate(rows):
+                tree.insert("", tk.END, iid=str(index), values=(name, priority, "是" if enabled else "否", url))
+
+        form_frame = ttk.Frame(sources_window)
+        form_frame.pack(fill="x", padx=10)
+        ttk.Label(form_frame, text="名称:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        name_entry = ttk.Entry(form_frame, width=15)
+        name_entry.grid(row=0, column=1, padx=5, pady=5, sticky="w")
+        ttk.Label(form_frame, text="优先级:").grid(row=0, column=2, padx=5, pady=5, sticky="w")
+        priority_entry = ttk.Entry(form_frame, width=6)
+        priority_entry.grid(row=0, column=3, padx=5, pady=5, sticky="w")
+        enabled_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(form_frame, text="启用", variable=enabled_var).grid(row=0, column=4, padx=5, pady=5, sticky="w")
+        ttk.Label(form_frame, text="地址:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
+        url_entry = ttk.Entry(form_frame, width=60)
+        url_entry.grid(row=1, column=1, columnspan=4, padx=5, pady=5, sticky="we")
+
+        def select_source(event):
+            selection = tree.selection()
+            if not selection:
+                return
+            name, url, priority, enabled = rows[int(selection[0])]
+            for entry, value in ((name_entry, name), (priority_entry, priority), (url_entry, url)):
+                entry.delete(0, tk.END)
+                entry.insert(0, str(value))
+            enabled_var.set(bool(enabled))
+
+        def save_selected():
+            name = name_entry.get().strip()
+            url = url_entry.get().strip()
+            if not name or not url:
+                messagebox.showerror("错误", "名称和地址不能为空", parent=sources_window)
+                return
+            try:
+                priority = int(priority_entry.get().strip() or 0)
+            except ValueError:
+                messagebox.showerror("错误", "优先级必须是整数", parent=sources_window)
+                return
+            self.db.run(
+                save_source, name, url, priority, enabled_var.get(),
+                callback=lambda result: refresh(), errback=self.show_db_error
+            )
+
+        def delete_selected():
+            name = name_entry.get().strip()
+            if name and messagebox.askyesno("确认", f"确定要删除远程源 {name} 吗？", parent=sources_window):
+                self.db.run(delete_source, name, callback=lambda result: refresh(), errback=self.show_db_error)
+
+        def sync_enabled():
+            sources = load_sources(self.conn)
+            if not sources:
+                messagebox.showerror("错误", "没有启用的远程源", parent=sources_window)
+                return
+            sync_button.state(["disabled"])
+            self.set_status(f"正在同步 {len(sources)} 个远程源...")
+            outcome = {}
+
+            def worker():
+                try:
+                    outcome["result"] = fetch_sources(sources)
+                except Exception as e:
+                    outcome["result"] = ({}, {"同步": e})
+
+            def poll():
+                if "result" not in outcome:
+                    self.root.after(100, poll)
+                    return
+                sync_button.state(["!disabled"])
+                results, errors = outcome["result"]
+                failed = "\n".join(f"{name}: {error}" for name, error in sorted(errors.items()))
+                if not results:
+                    messagebox.showerror("错误", f"同步失败:\n{failed}", parent=sources_window)
+                    self.set_status("同步失败")
+                    return
+                if errors and not messagebox.askyesno(
+                    "确认", f"以下源下载失败:\n{failed}\n\n是否只用成功的源替换提示词库？", parent=sources_window
+                ):
+                    self.set_status("已取消同步")
+                    return
+
+                def written(count):
+                    self.prompt_type_dict.invalidate()
+                    self.initialize_prompt_type_dict()
+                    self.initialize_prompt_type_combobox()
+                    self.set_status(f"已从 {len(results)} 个源同步 {count} 条提示词")
+
+                def write_failed(e):
+                    # 写入完成前对话框可能已经关闭
+                    parent = sources_window if sources_window.winfo_exists() else self.root
+                    messagebox.showerror("错误", f"写入失败: {str(e)}", parent=parent)
+
+                self.db.run(
+                    write_library, merge_sources(sources, results), callback=written, errback=write_failed
+                )
+
+            threading.Thread(target=worker, daemon=True).start()
+            self.root.after(100, poll)
+
+        tree.bind("<<TreeviewSelect>>", select_source)
+        button_frame = ttk.Frame(sources_window)
+        button_frame.pack(fill="x", padx=10, pady=5)
+        ttk.Button(
+            button_frame, 
+            text="保存源", 
+            command=save_selected,
+            style="Accent.TButton"
+        ).pack(side="left", padx=2)
+        ttk.Button(
+            button_frame, 
+            text="删除源", 
+            command=delete_selected,
+            style="Destructive.TButton"
+        ).pack(side="left", padx=2)
+        sync_button = ttk.Button(
+            button_frame, 
+            text="同步启用的源", 
+            command=sync_enabled,
+            style="Accent.TButton"
+        )
+        sync_button.pack(side="right", padx=2)
+        refresh()
+
+    @ui_action
     def crud_type_combobox_selection_changed(self, event):
         selected_type = self.crud_type_combobox.get()
         if selected_type in self.prompt_type_dict:
@@ -690,6 +1504,7 @@ class PromptCombinerApp:
         self.crud_introduction_textbox.delete("1.0", tk.END)
         self.crud_prompt_name_entry.delete(0, tk.END)
 
+    @ui_action
     def crud_prompt_combobox_selection_changed(self, event):
         selected_prompt = self.crud_prompt_combobox.get()
         if selected_prompt and selected_prompt in self.current_selected_type_dict:
@@ -701,6 +1516,7 @@ class PromptCombinerApp:
             self.crud_prompt_name_entry.delete(0, tk.END)
             self.crud_prompt_name_entry.insert(0, selected_prompt)
 
+    @ui_action
     def add_prompt(self):
         selected_type = self.crud_type_combobox.get()
         prompt_name = self.crud_prompt_name_entry.get().strip()
@@ -709,29 +1525,24 @@ class PromptCombinerApp:
 
         if selected_type and prompt_name and prompt_text :
             type_id = self.prompt_type_dict[selected_type]['id']
-            cursor = self.conn.cursor()
-            
-            # 检查提示词是否已存在
-            cursor.execute(
-                "SELECT id FROM prompts WHERE type_id = ? AND prompt_name = ?",
-                (type_id, prompt_name)
-            )
-            existing_prompt = cursor.fetchone()
-            
-            if existing_prompt:
-                messagebox.showerror("错误", f"该类型下已存在名为 '{prompt_name}' 的提示词")
-                return
-            
-            cursor.execute(
-                "INSERT INTO prompts (type_id, prompt_name, prompt_text, introduction) VALUES (?,?,?,?)",
-                (type_id, prompt_name, prompt_text, introduction)
+
+            def added(inserted):
+                if not inserted:
+                    messagebox.showerror("错误", f"该类型下已存在名为 '{prompt_name}' 的提示词")
+                    return
+                self.prompt_type_dict.invalidate(type_id)
+                self.refresh_crud()
+                messagebox.showinfo("成功", "提示词添加成功")
+
+            # 检查同名提示词和插入在写线程的同一个事务中完成
+            self.db.write(
+                library.insert_prompt, type_id, prompt_name, prompt_text, introduction,
+                callback=added, errback=self.show_db_error
             )
-            self.conn.commit()
-            self.refresh_crud()
-            messagebox.showinfo("成功", "提示词添加成功")
         else:
             messagebox.showerror("错误", "请填写完整信息")
 
+    @ui_action
     def update_prompt(self):
         selected_type = self.crud_type_combobox.get()
         old_prompt_name = self.crud_prompt_combobox.get()
@@ -741,24 +1552,20 @@ class PromptCombinerApp:
 
         if selected_type and (old_prompt_name or new_prompt_name) and prompt_text and introduction:
             type_id = self.prompt_type_dict[selected_type]['id']
-            cursor = self.conn.cursor()
-            
-            if old_prompt_name and old_prompt_name != new_prompt_name:
-                # 如果名称发生了变化，先删除旧记录
-                cursor.execute("DELETE FROM prompts WHERE type_id = ? AND prompt_name = ?", (type_id, old_prompt_name))
-            
-            # 插入或更新记录
-            cursor.execute(
-                "INSERT INTO prompts (type_id, prompt_name, prompt_text, introduction) VALUES (?,?,?,?)",
-                (type_id, new_prompt_name, prompt_text, introduction)
+
+            def updated(result):
+                self.prompt_type_dict.invalidate(type_id)
+                self.refresh_crud()
+                messagebox.showinfo("成功", "提示词修改成功")
+
+            self.db.write(
+                library.update_prompt, type_id, old_prompt_name, new_prompt_name, prompt_text, introduction,
+                callback=updated, errback=self.show_db_error
             )
-            
-            self.conn.commit()
-            self.refresh_crud()
-            messagebox.showinfo("成功", "提示词修改成功")
         else:
             messagebox.showerror("错误", "请选择提示词并填写完整信息")
 
+    @ui_action
     def delete_prompt(self):
         selected_type = self.crud_type_combobox.get()
         prompt_name = self.crud_prompt_combobox.get()
@@ -766,28 +1573,31 @@ class PromptCombinerApp:
         if selected_type and prompt_name:
             if messagebox.askyesno("确认删除", f"确定要删除提示词 '{prompt_name}' 吗？"):
                 type_id = self.prompt_type_dict[selected_type]['id']
-                cursor = self.conn.cursor()
-                cursor.execute("DELETE FROM prompts WHERE type_id = ? AND prompt_name = ?", (type_id, prompt_name))
-                self.conn.commit()
-                self.refresh_crud()
-                messagebox.showinfo("成功", "提示词删除成功")
+
+                def deleted(result):
+                    self.prompt_type_dict.invalidate(type_id)
+                    self.refresh_crud()
+                    messagebox.showinfo("成功", "提示词删除成功")
+
+                self.db.write(
+                    library.delete_prompt, type_id, prompt_name, callback=deleted, errback=self.show_db_error
+                )
         else:
             messagebox.showerror("错误", "请选择要删除的提示词")
 
+    @ui_action
     def add_type(self):
         type_name = self.type_name_entry.get().strip()
         if type_name:
-            cursor = self.conn.cursor()
-            try:
-                cursor.execute("INSERT INTO prompt_types (type_name) VALUES (?)", (type_name,))
-                self.conn.commit()
+            def added(type_id):
                 self.refresh_crud()
                 messagebox.showinfo("成功", "类型添加成功")
-            except sqlite3.IntegrityError:
-                messagebox.showerror("错误", "类型名称已存在")
+
+            self.db.write(library.insert_type, type_name, callback=added, errback=self.show_type_error)
         else:
             messagebox.showerror("错误", "请输入类型名称")
 
+    @ui_action
     def update_type(self):
         old_type_name = self.crud_type_combobox.get()
         new_type_name = self.type_name_entry.get().strip()
@@ -798,154 +1608,284 @@ class PromptCombinerApp:
                 return
                 
             type_id = self.prompt_type_dict[old_type_name]['id']
-            cursor = self.conn.cursor()
-            try:
-                # 更新类型名称
-                cursor.execute("UPDATE prompt_types SET type_name = ? WHERE id = ?", (new_type_name, type_id))
-                
-                self.conn.commit()
+
+            def renamed(result):
                 self.refresh_crud()
                 messagebox.showinfo("成功", "类型修改成功")
-            except sqlite3.IntegrityError:
-                messagebox.showerror("错误", "类型名称已存在")
+
+            self.db.write(
+                library.rename_type, type_id, new_type_name, callback=renamed, errback=self.show_type_error
+            )
         else:
             messagebox.showerror("错误", "请选择类型并输入新名称")
 
+    @ui_action
     def delete_type(self):
         type_name = self.crud_type_combobox.get()
         if type_name:
             if messagebox.askyesno("确认删除", f"确定要删除类型 '{type_name}' 及其所有提示词吗？"):
                 type_id = self.prompt_type_dict[type_name]['id']
-                cursor = self.conn.cursor()
-                
-                # 删除该类型下的所有提示词
-                cursor.execute("DELETE FROM prompts WHERE type_id = ?", (type_id,))
-                
-                # 删除类型
-                cursor.execute("DELETE FROM prompt_types WHERE id = ?", (type_id,))
-                
-                self.conn.commit()
-                self.refresh_crud()
-                messagebox.showinfo("成功", "类型删除成功")
+
+                def deleted(result):
+                    self.refresh_crud()
+                    messagebox.showinfo("成功", "类型删除成功")
+
+                # 删除该类型及其下的所有提示词
+                self.db.write(library.delete_type, type_id, callback=deleted, errback=self.show_db_error)
         else:
             messagebox.showerror("错误", "请选择要删除的类型")
 
+    def show_type_error(self, error):
+        if isinstance(error, sqlite3.IntegrityError):
+            messagebox.showerror("错误", "类型名称已存在")
+        else:
+            self.show_db_error(error)
+
+    @ui_action
     def refresh_crud(self):
         self.initialize_prompt_type_dict()
         self.initialize_prompt_type_combobox()
-        self.crud_type_combobox.set('')
-        self.crud_prompt_combobox.set('')
-        self.crud_prompt_textbox.delete("1.0", tk.END)
-        self.crud_introduction_textbox.delete("1.0", tk.END)
-        self.crud_prompt_name_entry.delete(0, tk.END)
-        self.type_name_entry.delete(0, tk.END)
+        # 清空编辑区，已经为空的控件不会被重写
+        for widget in (self.crud_type_combobox, self.crud_prompt_combobox, self.crud_prompt_textbox,
+                       self.crud_introduction_textbox, self.crud_prompt_name_entry, self.type_name_entry):
+            self.refresh.set_text(widget, "")
 
+    @ui_action
     def export_to_json(self):
-        cursor = self.conn.cursor()
-        
-        # 获取所有类型
-        cursor.execute("SELECT id, type_name FROM prompt_types")
-        types = cursor.fetchall()
-        
-        # 获取所有提示词
-        cursor.execute("SELECT id, type_id, prompt_name, prompt_text, introduction FROM prompts")
-        prompts = cursor.fetchall()
-        
-        # 构建JSON数据结构
-        json_data = {}
-        
-        # 添加类型和提示词
-        for type_id, type_name in types:
-            type_prompts = {}
-            for prompt in prompts:
-                p_id, p_type_id, p_name, p_text, p_intro = prompt
-                if p_type_id == type_id:
-                    type_prompts[p_name] = {
-                        "prompt_text": p_text,
-                        "introduction": p_intro
-                    }
-            json_data[type_name] = type_prompts
-        
-        # 保存到文件
-        try:
-            file_path = filedialog.asksaveasfilename(
-                defaultextension=".json",
-                filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
-            )
-            if file_path:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(json_data, f, ensure_ascii=False, indent=4)
-                self.status_label.config(text=f"导出成功: {file_path}")
-                messagebox.showinfo("成功", f"数据已导出到 {file_path}")
-        except Exception as e:
+        # 保存到文件，按扩展名选择格式，选择压缩格式时边写边压缩
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[
+                ("JSON files", "*.json"),
+                ("PLIST files", "*.plist"),
+                ("CSV files", "*.csv"),
+                ("TSV files", "*.tsv"),
+                ("gzip 压缩的 JSON", "*.json.gz"),
+                ("bzip2 压缩的 JSON", "*.json.bz2"),
+                ("xz 压缩的 JSON", "*.json.xz"),
+                ("gzip 压缩的 PLIST", "*.plist.gz"),
+                ("All files", "*.*"),
+            ]
+        )
+        if not file_path:
+            return
+        exporter = exporter_for(file_path)
+        if exporter is None:
+            messagebox.showerror("错误", "导出失败: 请使用 .json、.plist、.csv 或 .tsv 扩展名")
+            return
+        self.run_export(self.export_button, exporter, file_path)
+
+    @ui_action
+    def export_presets_to_styles(self):
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            initialfile="styles.csv",
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+        )
+        if file_path:
+            self.run_export(self.export_styles_button, export_styles_csv, file_path)
+
+    @ui_action
+    def export_changes_click(self):
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".jsonl",
+            filetypes=[
+                ("增量文件", "*.jsonl"),
+                ("gzip 压缩的增量文件", "*.jsonl.gz"),
+                ("All files", "*.*"),
+            ]
+        )
+        if not file_path:
+            return
+
+        def exported(result):
+            count, since, until = result
+            self.enable_button(self.export_changes_button)
+            self.set_status(f"导出成功: {file_path}")
+            messagebox.showinfo("成功", f"已导出 {count} 条变更（序号 {since} 到 {until}）到 {file_path}")
+
+        def failed(e):
+            self.enable_button(self.export_changes_button)
+            self.set_status("导出失败")
             messagebox.showerror("错误", f"导出失败: {str(e)}")
 
-    def import_from_json(self):
-        try:
-            file_path = filedialog.askopenfilename(
-                filetypes=[("JSON files", "*.json"), ("PLIST files", "*.plist"), ("All files", "*.*")]
-            )
-            if file_path:
-                file_ext = os.path.splitext(file_path)[1].lower()
-                
-                cursor = self.conn.cursor()
-                
-                # 清空现有数据
-                cursor.execute("DELETE FROM prompts")
-                cursor.execute("DELETE FROM prompt_types")
-                
-                if file_ext == '.json':
-                    # 处理JSON文件
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        json_data = json.load(f)
-                    
-                    # 导入JSON数据
-                    type_map = {}  # 用于映射类型名称到ID
-                    
-                    for type_name, prompts in json_data.items():
-                        # 创建类型
-                        cursor.execute("INSERT INTO prompt_types (type_name) VALUES (?)", (type_name,))
-                        type_id = cursor.lastrowid
-                        type_map[type_name] = type_id
-                        
-                        # 创建提示词
-                        for prompt_name, prompt_data in prompts.items():
-                            prompt_text = prompt_data.get("prompt_text", "")
-                            introduction = prompt_data.get("introduction", "")
-                            cursor.execute("INSERT INTO prompts (type_id, prompt_name, prompt_text, introduction) VALUES (?,?,?,?)",
-                                           (type_id, prompt_name, prompt_text, introduction))
-                
-                elif file_ext == '.plist':
-                    # 处理PLIST文件
-                    type_map = {}  # 用于映射类型名称到ID
-                    
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        for line in f:
-                            fields = line.strip().split('^')
-                            if len(fields) == 4:
-                                prompt_type, prompt_name, prompt_text, introduction = fields
-                                
-                                # 如果类型不存在，创建新类型
-                                if prompt_type not in type_map:
-                                    cursor.execute("INSERT INTO prompt_types (type_name) VALUES (?)", (prompt_type,))
-                                    type_id = cursor.lastrowid
-                                    type_map[prompt_type] = type_id
-                                else:
-                                    type_id = type_map[prompt_type]
-                                
-                                # 插入提示词
-                                cursor.execute("INSERT INTO prompts (type_id, prompt_name, prompt_text, introduction) VALUES (?,?,?,?)",
-                                               (type_id, prompt_name, prompt_text, introduction))
-                
-                self.conn.commit()
+        self.export_changes_button.state(["disabled"])
+        self.set_status(f"正在导出增量: {file_path}")
+        self.db.run(export_changes, file_path, callback=exported, errback=failed)
+
+    @ui_action
+    def import_changes_click(self):
+        file_path = filedialog.askopenfilename(
+            filetypes=[
+                ("增量文件", "*.jsonl *.jsonl.gz"),
+                ("All files", "*.*"),
+            ]
+        )
+        if not file_path:
+            return
+
+        def imported(result):
+            self.enable_button(self.import_changes_button)
+            if result.skipped:
+                self.set_status(f"已跳过: {file_path}")
+                messagebox.showinfo("提示", "该增量已经导入过")
+                return
+            self.prompt_type_dict.invalidate()
+            self.refresh_crud()
+            self.initialize_presets()
+            self.set_status(f"导入成功: {file_path}")
+            message = f"已应用 {result.changes} 条变更"
+            if result.gap:
+                message += "\n\n注意：该增量的起点晚于上次从同一台机器导入的终点，中间的修改可能缺失。"
+            messagebox.showinfo("成功", message)
+
+        def failed(e):
+            self.enable_button(self.import_changes_button)
+            self.set_status("导入失败")
+            messagebox.showerror("错误", f"导入失败: {str(e)}")
+
+        self.import_changes_button.state(["disabled"])
+        self.set_status(f"正在导入增量: {file_path}")
+        self.db.run(import_changes, file_path, callback=imported, errback=failed)
+
+    @ui_action
+    def choose_sync_folder_click(self):
+        folder = filedialog.askdirectory()
+        if not folder:
+            return
+        self.sync_folder_textbox.delete(0, tk.END)
+        self.sync_folder_textbox.insert(0, folder)
+        self.start_folder_sync(quiet=False)
+
+    @ui_action
+    def sync_folder_click(self):
+        self.start_folder_sync(quiet=False)
+
+    def auto_sync_folder(self):
+        if self.read_only:
+            return
+        self.start_folder_sync(quiet=True)
+        self.root.after(SYNC_INTERVAL_MS, self.auto_sync_folder)
+
+    def start_folder_sync(self, quiet):
+        """
+        在写线程中与同步文件夹双向同步。quiet 为真时（定时同步）只更新状态栏，不弹出提示。
+        """
+        folder = self.sync_folder_textbox.get().strip()
+        if not folder or self.folder_sync_running:
+            return
+        if not os.path.isdir(folder):
+            if not quiet:
+                messagebox.showerror("错误", f"同步文件夹不存在: {folder}")
+            return
+
+        def synced(result):
+            self.folder_sync_running = False
+            self.enable_button(self.sync_folder_button)
+            if result.applied:
+                self.prompt_type_dict.invalidate()
                 self.refresh_crud()
-                self.status_label.config(text=f"导入成功: {file_path}")
-                messagebox.showinfo("成功", "数据导入成功")
-        except Exception as e:
+                self.initialize_presets()
+            skipped = f"，跳过无法识别的 {result.skipped} 行" if result.skipped else ""
+            if result.pushed or result.pulled or result.skipped or not quiet:
+                self.set_status(
+                    f"同步完成: 发送 {result.pushed} 条，收到 {result.pulled} 条，应用 {result.applied} 条{skipped}"
+                )
+            if not quiet:
+                messagebox.showinfo(
+                    "成功", f"已发送 {result.pushed} 条修改，收到 {result.pulled} 条，其中 {result.applied} 条已应用{skipped}"
+                )
+
+        def failed(e):
+            self.folder_sync_running = False
+            self.enable_button(self.sync_folder_button)
+            self.set_status("同步失败")
+            if not quiet:
+                messagebox.showerror("错误", f"同步失败: {str(e)}")
+
+        self.folder_sync_running = True
+        self.sync_folder_button.state(["disabled"])
+        if not quiet:
+            self.db.write(set_state, "sync_folder", folder, errback=self.show_db_error)
+        self.db.run(sync_folder, folder, callback=synced, errback=failed)
+
+    def run_export(self, button, exporter, file_path):
+        """
+        在写线程中执行导出，大库导出时界面保持响应。导出只读数据，写线程的连接能看到所有已提交的修改。
+        """
+        def exported(count):
+            self.enable_button(button)
+            self.set_status(f"导出成功: {file_path}")
+            messagebox.showinfo("成功", f"数据已导出到 {file_path}")
+
+        def failed(e):
+            self.enable_button(button)
+            self.set_status("导出失败")
+            messagebox.showerror("错误", f"导出失败: {str(e)}")
+
+        button.state(["disabled"])
+        self.set_status(f"正在导出: {file_path}")
+        self.db.run(exporter, file_path, callback=exported, errback=failed)
+
+    @ui_action
+    def import_from_json(self):
+        file_path = filedialog.askopenfilename(
+            filetypes=[
+                ("JSON files", "*.json"),
+                ("PLIST files", "*.plist"),
+                ("压缩文件", "*.gz *.bz2 *.xz"),
+                ("All files", "*.*"),
+            ]
+        )
+        if not file_path:
+            return
+        # library.json.gz 之类的压缩文件按去掉压缩后缀后的扩展名判断格式
+        file_ext = os.path.splitext(strip_compression_suffix(file_path))[1].lower()
+        if file_ext == '.json':
+            # 处理JSON文件
+            stage = stage_json_file
+        elif file_ext == '.plist':
+            # 处理PLIST文件
+            stage = stage_plist_file
+        else:
+            messagebox.showerror("错误", f"导入失败: 不支持的文件类型 {file_ext}")
+            return
+        mode = MERGE_MODES[self.import_mode_combobox.current()][0]
+
+        def staged(diff):
+            # 先给出合并预览，确认后才修改提示词库
+            if not messagebox.askyesno("确认导入", f"{describe_diff(diff, mode)}\n\n是否继续导入？"):
+                self.db.run(discard_staging)
+                self.enable_button(self.import_button)
+                self.set_status("已取消导入")
+                return
+            self.set_status(f"正在合并: {file_path}")
+            self.db.run(apply_merge, mode, callback=imported, errback=failed)
+
+        def imported(count):
+            self.enable_button(self.import_button)
+            self.prompt_type_dict.invalidate()
+            self.refresh_crud()
+            self.set_status(f"导入成功: {file_path}（新增或修改 {count} 条）")
+            messagebox.showinfo("成功", "数据导入成功")
+
+        def failed(e):
+            self.enable_button(self.import_button)
+            self.set_status("导入失败")
             messagebox.showerror("错误", f"导入失败: {str(e)}")
 
+        # 读取文件和合并都在写线程中进行，界面保持响应；暂存的临时表在写线程的连接上
+        self.import_button.state(["disabled"])
+        self.set_status(f"正在读取: {file_path}")
+        self.db.run(stage, file_path, callback=staged, errback=failed)
+
 
 if __name__ == "__main__":
+    # 打包后的程序使用进程池时需要
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(description="AI Prompt生成器")
+    parser.add_argument("--plist", default=None, help="以只读模式直接浏览该 .plist 文件")
+    args, _ = parser.parse_known_args()
     root = tk.Tk()
-    app = PromptCombinerApp(root)
+    app = PromptCombinerApp(root, plist_path=args.plist)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,200 @@
+"""
+提示词反查：用 Aho-Corasick 自动机一次扫描粘贴的 prompt，找出其中包含的库条目。
+
+每条提示词的 prompt_text 会按 '/' 拆成多个变体（如 through glass/against glass），
+所有变体作为模式串构建同一个自动机，匹配时不区分大小写，并要求命中位置两侧是单词边界。
+"""
+from collections import deque
+
+
+def fold_case(text):
+    """
+    转为小写，且保证结果与原文逐字符对应、长度不变。
+
+    str.lower() 可能改变长度（如 'İ' 变为两个字符），导致命中位置偏移；
+    小写后不是单个字符的字符保持原样。
+    """
+    if text.isascii():
+        return text.lower()
+    return "".join(low if len(low) == 1 else ch for ch, low in ((ch, ch.lower()) for ch in text))
+
+
+def split_variants(prompt_text):
+    """
+    将 prompt_text 按 '/' 拆分为去重后的小写变体列表。
+
+    参数:
+    prompt_text: 数据库中的提示词文本。
+
+    返回值:
+    变体字符串列表，保持原有顺序。
+    """
+    variants = []
+    for part in (prompt_text or "").split('/'):
+        part = fold_case(" ".join(part.split()))
+        if part and part not in variants:
+            variants.append(part)
+    return variants
+
+
+def split_tokens(text):
+    """
+    按逗号切分 prompt，返回 (start, end) 区间列表，区间已去掉首尾空白。
+    """
+    tokens = []
+    start = 0
+    length = len(text)
+    while start <= length:
+        end = text.find(',', start)
+        if end == -1:
+            end = length
+        s, e = start, end
+        while s < e and text[s].isspace():
+            s += 1
+        while e > s and text[e - 1].isspace():
+            e -= 1
+        if s < e:
+            tokens.append((s, e))
+        start = end + 1
+    return tokens
+
+
+class PromptMatcher:
+    """
+    基于 Aho-Corasick 的多模式匹配器。
+
+    每个模式串对应一个或多个库条目 (type_name, prompt_name, introduction)，
+    构建完成后可以反复调用 annotate，复杂度与文本长度和命中数成正比。
+    """
+
+    def __init__(self, entries=()):
+        """
+        参数:
+        entries: 可迭代的 (type_name, prompt_name, prompt_text, introduction) 元组。
+        """
+        # goto[state] 为字符到下一状态的转移表
+        self._goto = [{}]
+        self._fail = [0]
+        # out[state] 为在该状态结束的模式串长度（包含失败链上的输出）
+        self._out = [()]
+        self._pattern_at = [None]
+        self.payloads = {}
+
+        for type_name, prompt_name, prompt_text, introduction in entries:
+            for variant in split_variants(prompt_text):
+                payload = (type_name, prompt_name, introduction or "")
+                if variant in self.payloads:
+                    if payload not in self.payloads[variant]:
+                        self.payloads[variant].append(payload)
+                else:
+                    self.payloads[variant] = [payload]
+                    self._add_pattern(variant)
+        self._build()
+
+    def __len__(self):
+        return len(self.payloads)
+
+    def _add_pattern(self, pattern):
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+                self._pattern_at.append(None)
+            state = nxt
+        self._pattern_at[state] = pattern
+
+    def _build(self):
+        # 广度优先计算失败指针，并把失败链上的输出合并进来
+        goto, fail, out = self._goto, self._fail, self._out
+        queue = deque()
+        for state in goto[0].values():
+            queue.append(state)
+            pattern = self._pattern_at[state]
+            out[state] = (len(pattern),) if pattern else ()
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                pattern = self._pattern_at[nxt]
+                own = (len(pattern),) if pattern else ()
+                out[nxt] = own + out[fail[nxt]]
+
+    def find_all(self, text):
+        """
+        扫描文本，返回不重叠的命中列表 [(start, end, pattern), ...]。
+
+        同一位置起始的多个命中取最长者，命中必须位于单词边界上。
+        """
+        lowered = fold_case(text)
+        goto, fail, out = self._goto, self._fail, self._out
+        candidates = []
+        state = 0
+        for i, ch in enumerate(lowered):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                end = i + 1
+                if end < len(lowered) and lowered[end].isalnum():
+                    continue
+                for length in out[state]:
+                    start = end - length
+                    if start > 0 and lowered[start - 1].isalnum():
+                        continue
+                    candidates.append((start, end))
+        # 最左最长优先，去掉重叠的命中
+        candidates.sort(key=lambda c: (c[0], c[0] - c[1]))
+        matches = []
+        last_end = 0
+        for start, end in candidates:
+            if start >= last_end:
+                matches.append((start, end, lowered[start:end]))
+                last_end = end
+        return matches
+
+    def annotate(self, text):
+        """
+        对整段 prompt 做反查标注。
+
+        参数:
+        text: 待分析的 prompt 文本。
+
+        返回值:
+        (matches, unknown)
+        - matches: [(start, end, pattern, payloads), ...]，payloads 为库条目列表。
+        - unknown: [(start, end), ...]，不包含任何命中的逗号分隔片段。
+        """
+        matches = [(s, e, p, self.payloads[p]) for s, e, p in self.find_all(text)]
+        unknown = []
+        idx = 0
+        for start, end in split_tokens(text):
+            while idx < len(matches) and matches[idx][1] <= start:
+                idx += 1
+            if idx < len(matches) and matches[idx][0] < end:
+                continue
+            unknown.append((start, end))
+        return matches, unknown
+
+
+def build_matcher(conn):
+    """
+    从数据库中读取全部提示词并构建匹配器。
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''
+            SELECT t.type_name, p.prompt_name, p.prompt_text, p.introduction
+            FROM prompts p JOIN prompt_types t ON p.type_id = t.id
+        ''')
+        return PromptMatcher(cursor.fetchall())
+    finally:
+        cursor.close()
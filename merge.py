@@ -0,0 +1,277 @@
+"""
+按冲突策略合并导入。
+
+导入文件先批量写入连接上的临时表（import_staging），再用几条 INSERT ... SELECT ... ON CONFLICT
+语句一次性合并进 prompts，合并的工作都在 SQLite 里完成，不需要在 Python 中逐条比较。
+写入临时表后可以先用 merge_diff 统计将要发生的变化，确认后再 apply_merge，取消则 discard_staging。
+
+临时表只属于当前连接，暂存、统计和合并必须使用同一个连接（main.py 中都在 DBWorker 的线程里执行）。
+
+冲突指同一类型下的同名提示词，策略:
+- replace: 清空提示词库后导入（原来的行为）；
+- skip: 只添加新的提示词，已有的保持不变；
+- overwrite: 已有的提示词用文件中的内容覆盖；
+- newest: 比较修改时间（updated_at），文件中较新的才覆盖。
+"""
+import os
+from collections import namedtuple
+from time import perf_counter_ns
+
+from compressed import open_file
+from json_stream import iter_json_prompts
+from library import BATCH_SIZE, FIELD_COUNT, clear_prompts, record_import, resume_change_log
+
+REPLACE = "replace"
+SKIP = "skip"
+OVERWRITE = "overwrite"
+NEWEST = "newest"
+# (策略, 界面上显示的名称)
+MERGE_MODES = [
+    (REPLACE, "替换整个库"),
+    (SKIP, "跳过已有"),
+    (OVERWRITE, "覆盖已有"),
+    (NEWEST, "保留较新"),
+]
+
+# 合并预览的统计
+# - staged: 文件中的提示词条数（同名的只算一次）
+# - new_types: 库中没有的类型数
+# - added: 库中没有的提示词
+# - changed: 库中已有且内容不同的提示词
+# - newer: changed 中文件的修改时间较新的
+# - unchanged: 库中已有且内容相同的提示词
+# - removed: 库中有、文件中没有的提示词（只在 replace 时会被删除）
+MergeDiff = namedtuple("MergeDiff", "staged new_types added changed newer unchanged removed")
+
+_STAGE_PROMPT = (
+    "INSERT INTO import_staging (type_index, prompt_name, prompt_text, introduction, updated_at) "
+    "VALUES (?,?,?,?,?) "
+    "ON CONFLICT (type_index, prompt_name) DO UPDATE SET prompt_text = excluded.prompt_text, "
+    "introduction = excluded.introduction, updated_at = excluded.updated_at"
+)
+
+# 库中已有的提示词与文件中的内容是否不同
+_CHANGED = "(prompts.prompt_text IS NOT excluded.prompt_text OR prompts.introduction IS NOT excluded.introduction)"
+_ON_CONFLICT = {
+    SKIP: "DO NOTHING",
+    OVERWRITE: f'''DO UPDATE SET prompt_text = excluded.prompt_text, introduction = excluded.introduction,
+        updated_at = excluded.updated_at WHERE {_CHANGED}''',
+    NEWEST: f'''DO UPDATE SET prompt_text = excluded.prompt_text, introduction = excluded.introduction,
+        updated_at = excluded.updated_at
+        WHERE {_CHANGED} AND excluded.updated_at > COALESCE(prompts.updated_at, 0)''',
+}
+
+
+def create_staging(conn):
+    """
+    创建（或清空）当前连接上的暂存临时表。
+    """
+    cursor = conn.cursor()
+    # 文件中出现的所有类型，包括没有提示词的；type_id 为库中对应的类型 ID，库中没有时为 NULL
+    cursor.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS import_staging_types (
+            type_name TEXT NOT NULL UNIQUE,
+            type_id INTEGER
+        )
+    ''')
+    # 类型按 import_staging_types 的 rowid 存放，比较和连接时不再逐行按类型名称查找；
+    # 普通表（带 rowid），合并时按文件中的顺序写入
+    cursor.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS import_staging (
+            type_index INTEGER NOT NULL,
+            prompt_name TEXT NOT NULL,
+            prompt_text TEXT,
+            introduction TEXT,
+            updated_at INTEGER,
+            UNIQUE (type_index, prompt_name)
+        )
+    ''')
+    cursor.execute("DELETE FROM import_staging")
+    cursor.execute("DELETE FROM import_staging_types")
+    cursor.close()
+
+
+def discard_staging(conn):
+    """
+    删除暂存的数据，取消合并时调用。
+    """
+    conn.execute("DROP TABLE IF EXISTS temp.import_staging")
+    conn.execute("DROP TABLE IF EXISTS temp.import_staging_types")
+    conn.commit()
+
+
+def _resolve_types(cursor):
+    # 类型数很少，一次查出所有暂存类型在库中的 ID
+    cursor.execute('''
+        UPDATE import_staging_types SET type_id = (
+            SELECT id FROM prompt_types WHERE prompt_types.type_name = import_staging_types.type_name
+        )
+    ''')
+
+
+def stage_events(conn, events, updated_at, batch_size=BATCH_SIZE):
+    """
+    把 json_stream.iter_json_prompts 生成的事件写入暂存表，同名的以最后一条为准。
+
+    参数:
+    conn: 数据库连接。
+    events: (类型名称, 名称, 记录) 事件。
+    updated_at: 记录中没有 updated_at 时使用的修改时间（Unix 秒）。
+    batch_size: 每批插入的条数。
+
+    返回值:
+    暂存后的 merge_diff 统计。
+    """
+    create_staging(conn)
+    cursor = conn.cursor()
+    type_indexes = {}
+    batch = []
+    for type_name, prompt_name, record in events:
+        type_index = type_indexes.get(type_name)
+        if type_index is None:
+            cursor.execute("INSERT INTO import_staging_types (type_name) VALUES (?)", (type_name,))
+            type_index = type_indexes[type_name] = cursor.lastrowid
+        if prompt_name is None:
+            continue
+        batch.append((
+            type_index, prompt_name, record.get("prompt_text", ""), record.get("introduction", ""),
+            record.get("updated_at") or updated_at
+        ))
+        if len(batch) >= batch_size:
+            cursor.executemany(_STAGE_PROMPT, batch)
+            batch.clear()
+    cursor.executemany(_STAGE_PROMPT, batch)
+    _resolve_types(cursor)
+    cursor.close()
+    conn.commit()
+    return merge_diff(conn)
+
+
+def stage_plist_lines(conn, lines, updated_at, batch_size=BATCH_SIZE):
+    """
+    把 plist 行写入暂存表，字段数不对的行会被跳过。plist 没有修改时间，统一使用 updated_at。
+
+    返回值:
+    暂存后的 merge_diff 统计。
+    """
+    def events():
+        for line in lines:
+            fields = line.strip().split('^')
+            if len(fields) == FIELD_COUNT:
+                prompt_type, prompt_name, prompt_text, introduction = fields
+                yield prompt_type, prompt_name, {"prompt_text": prompt_text, "introduction": introduction}
+
+    return stage_events(conn, events(), updated_at, batch_size)
+
+
+def stage_json_file(conn, file_path):
+    """
+    暂存导出格式的 JSON 文件（可以是压缩文件），没有 updated_at 的记录使用文件的修改时间。
+    """
+    with open_file(file_path, "rt") as f:
+        return stage_events(conn, iter_json_prompts(f), int(os.path.getmtime(file_path)))
+
+
+def stage_plist_file(conn, file_path):
+    """
+    暂存 plist 文件（可以是压缩文件），修改时间取文件的修改时间。
+    """
+    with open_file(file_path, "rt") as f:
+        return stage_plist_lines(conn, f, int(os.path.getmtime(file_path)))
+
+
+def merge_diff(conn):
+    """
+    统计把暂存表合并进提示词库会发生的变化，不修改数据。
+
+    返回值:
+    MergeDiff。
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f'''
+            SELECT
+                COUNT(*),
+                COALESCE(SUM(prompts.id IS NULL), 0),
+                COALESCE(SUM(prompts.id IS NOT NULL AND {_CHANGED}), 0),
+                COALESCE(SUM(prompts.id IS NOT NULL AND {_CHANGED}
+                    AND excluded.updated_at > COALESCE(prompts.updated_at, 0)), 0)
+            FROM import_staging AS excluded
+            JOIN import_staging_types AS staged_types ON staged_types.rowid = excluded.type_index
+            LEFT JOIN prompts ON prompts.type_id = staged_types.type_id AND prompts.prompt_name = excluded.prompt_name
+        ''')
+        staged, added, changed, newer = cursor.fetchone()
+        cursor.execute("SELECT COUNT(*) FROM import_staging_types WHERE type_id IS NULL")
+        new_types = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*) FROM prompts")
+        existing = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+    matched = staged - added
+    return MergeDiff(staged, new_types, added, changed, newer, matched - changed, existing - matched)
+
+
+def describe_diff(diff, mode):
+    """
+    把 merge_diff 的统计按策略转换为给用户确认的文字。
+    """
+    lines = [f"文件中共有 {diff.staged} 条提示词，新类型 {diff.new_types} 个。"]
+    if mode == REPLACE:
+        lines.append(f"将清空现有的库：新增 {diff.added} 条，修改 {diff.changed} 条，删除 {diff.removed} 条。")
+    elif mode == SKIP:
+        lines.append(f"将新增 {diff.added} 条，跳过已有的 {diff.changed + diff.unchanged} 条。")
+    elif mode == OVERWRITE:
+        lines.append(f"将新增 {diff.added} 条，覆盖 {diff.changed} 条，内容相同的 {diff.unchanged} 条不变。")
+    else:
+        lines.append(
+            f"将新增 {diff.added} 条，更新较新的 {diff.newer} 条，"
+            f"保留库中较新的 {diff.changed - diff.newer} 条，内容相同的 {diff.unchanged} 条不变。"
+        )
+    return "\n".join(lines)
+
+
+def apply_merge(conn, mode):
+    """
+    按策略把暂存表合并进提示词库，在一个事务中完成，失败时回滚。完成后删除暂存的数据。
+
+    参数:
+    conn: 暂存时使用的数据库连接。
+    mode: REPLACE、SKIP、OVERWRITE 或 NEWEST。
+
+    返回值:
+    新增和修改的提示词条数。
+    """
+    if mode != REPLACE and mode not in _ON_CONFLICT:
+        raise ValueError(f"未知的合并策略: {mode}")
+    start = perf_counter_ns()
+    cursor = conn.cursor()
+    try:
+        if mode == REPLACE:
+            clear_prompts(cursor)
+        # WHERE true 避免 SQLite 把 ON CONFLICT 当作连接条件解析
+        cursor.execute('''
+            INSERT INTO prompt_types (type_name)
+            SELECT type_name FROM import_staging_types WHERE true ORDER BY rowid
+            ON CONFLICT (type_name) DO NOTHING
+        ''')
+        _resolve_types(cursor)
+        cursor.execute(f'''
+            INSERT INTO prompts (type_id, prompt_name, prompt_text, introduction, updated_at)
+            SELECT staged_types.type_id, s.prompt_name, s.prompt_text, s.introduction, s.updated_at
+            FROM import_staging AS s JOIN import_staging_types AS staged_types ON staged_types.rowid = s.type_index
+            WHERE true ORDER BY s.rowid
+            ON CONFLICT (type_id, prompt_name) {_ON_CONFLICT.get(mode, "DO NOTHING")}
+        ''')
+        count = cursor.rowcount
+        if mode == REPLACE:
+            resume_change_log(cursor)
+        cursor.execute("DROP TABLE temp.import_staging")
+        cursor.execute("DROP TABLE temp.import_staging_types")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    record_import(count, start)
+    return count
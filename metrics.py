@@ -0,0 +1,296 @@
+"""
+进程内的性能指标：计数器、仪表和延迟直方图。
+
+直方图采用 HDR 式的对数-线性分桶：数值按二进制位数分段，每段再均分为
+2 ** (SUB_BUCKET_BITS - 1) 个子桶，相对误差约 3%，桶数随数值范围对数增长。
+记录一次只做几次整数运算和一次字典更新，开销在 1 微秒以内，可以一直开启。
+
+指标保存在全局的 REGISTRY 中，可以在诊断窗口查看，也可以调用 dump 写出 JSON。
+设置环境变量 PROMPTS_METRICS=<路径> 时程序退出前自动写出。
+"""
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+METRICS_ENV = "PROMPTS_METRICS"
+SUB_BUCKET_BITS = 5
+_HALF = 1 << (SUB_BUCKET_BITS - 1)
+
+
+def bucket_index(value):
+    """
+    返回非负整数 value 所在的桶编号：小于 2 ** SUB_BUCKET_BITS 的值各占一个桶，
+    更大的值只保留最高的 SUB_BUCKET_BITS 位。
+    """
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    if shift <= 0:
+        return value
+    return (shift << (SUB_BUCKET_BITS - 1)) + (value >> shift)
+
+
+def bucket_bounds(index):
+    """
+    返回桶 index 覆盖的数值区间 [lower, upper)。
+    """
+    if index < (1 << SUB_BUCKET_BITS):
+        return index, index + 1
+    shift, top = divmod(index - _HALF, _HALF)
+    top += _HALF
+    return top << shift, (top + 1) << shift
+
+
+class Counter:
+    __slots__ = ('value',)
+
+    kind = "counter"
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def reset(self):
+        self.value = 0
+
+    def snapshot(self):
+        return {"value": self.value}
+
+
+class Gauge:
+    __slots__ = ('value',)
+
+    kind = "gauge"
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def reset(self):
+        self.value = 0
+
+    def snapshot(self):
+        return {"value": self.value}
+
+
+class Histogram:
+    """
+    记录非负整数的分布，计时类的直方图以纳秒为单位。
+    """
+
+    __slots__ = ('unit', 'counts', 'count', 'total', 'min', 'max')
+
+    kind = "histogram"
+
+    def __init__(self, unit="ns"):
+        self.unit = unit
+        self.reset()
+
+    def reset(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, value):
+        value = int(value)
+        if value < 0:
+            value = 0
+        index = bucket_index(value)
+        counts = self.counts
+        counts[index] = counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if self.min is None or value < self.min:
+            self.min = value
+
+    def percentile(self, percent):
+        """
+        返回第 percent 百分位的近似值（所在桶的中点），没有记录时返回 0。
+        """
+        if not self.count:
+            return 0
+        rank = max(1, round(self.count * percent / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                lower, upper = bucket_bounds(index)
+                return min((lower + upper - 1) / 2, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "unit": self.unit,
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0,
+            "min": self.min or 0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class Registry:
+    """
+    按名称保存指标，同名指标只创建一次。
+    """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _get(self, name, factory):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = factory()
+        return metric
+
+    def counter(self, name):
+        return self._get(name, Counter)
+
+    def gauge(self, name):
+        return self._get(name, Gauge)
+
+    def histogram(self, name, unit="ns"):
+        return self._get(name, functools.partial(Histogram, unit))
+
+    def snapshot(self):
+        """
+        返回 {名称: {"type", ...各指标的字段}}，按名称排序。
+        """
+        return {
+            name: {"type": metric.kind, **metric.snapshot()}
+            for name, metric in sorted(self.metrics.items())
+        }
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"time": time.time(), "metrics": self.snapshot()}, f, ensure_ascii=False, indent=4)
+
+    def reset(self):
+        # 原地清零：调用方通常在模块级保存了指标对象
+        for metric in self.metrics.values():
+            metric.reset()
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+class timed:
+    """
+    把代码块的耗时（纳秒）记入直方图 name，可用作上下文管理器或装饰器。
+
+    每次 with timed(...) 都要查找一次直方图，频繁执行的代码应在模块级取得直方图，
+    直接用 time.perf_counter_ns() 计时后调用 record。
+    """
+
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, name):
+        self.histogram = REGISTRY.histogram(name)
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record(time.perf_counter_ns() - self.start)
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.histogram.record(time.perf_counter_ns() - start)
+        return wrapper
+
+
+# {线程 ID: 正在执行的操作名称栈}，嵌套调用时最内层在最后
+_actions = {}
+
+
+def _action_stack():
+    stack = _actions.get(threading.get_ident())
+    if stack is None:
+        stack = _actions[threading.get_ident()] = []
+    return stack
+
+
+def current_action(thread_id=None):
+    """
+    返回线程 thread_id（默认为当前线程）正在执行的操作名称（最外层），没有时返回 None。
+    """
+    stack = _actions.get(threading.get_ident() if thread_id is None else thread_id)
+    return stack[0] if stack else None
+
+
+def push_action(name):
+    """
+    在当前线程中标记开始执行操作 name，例如后台线程执行界面提交的任务时沿用提交时的操作名。
+    """
+    _action_stack().append(name)
+
+
+def pop_action():
+    _action_stack().pop()
+
+
+def ui_action(func):
+    """
+    界面回调的装饰器：记录回调耗时 ui.<函数名>，并计数异常。
+    执行期间 current_action() 返回该回调的名称，供 SQL 跟踪等按操作归类。
+    """
+    name = func.__name__
+    latency = REGISTRY.histogram(f"ui.{name}")
+    errors = REGISTRY.counter(f"ui.{name}.errors")
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter_ns()
+        stack = _action_stack()
+        stack.append(name)
+        try:
+            return func(*args, **kwargs)
+        except BaseException:
+            errors.inc()
+            raise
+        finally:
+            stack.pop()
+            latency.record(time.perf_counter_ns() - start)
+    return wrapper
+
+
+def hit_rate(name):
+    """
+    返回 <name>.hit 与 <name>.miss 两个计数器算出的命中率，没有访问时返回 None。
+    """
+    metrics = REGISTRY.metrics
+    hits = metrics[f"{name}.hit"].value if f"{name}.hit" in metrics else 0
+    misses = metrics[f"{name}.miss"].value if f"{name}.miss" in metrics else 0
+    return hits / (hits + misses) if hits + misses else None
+
+
+def _dump_at_exit():
+    path = os.environ.get(METRICS_ENV)
+    if path:
+        try:
+            REGISTRY.dump(path)
+        except OSError as e:
+            print(f"写出性能指标失败: {e}")
+
+
+atexit.register(_dump_at_exit)
@@ -0,0 +1,338 @@
+"""
+数据库结构迁移。
+
+main.py（prompts.db）和 prompts.py（test.db）早期的表结构不一致:
+- main.py 的 prompts 表有 introduction 列，presets 表没有；
+- prompts.py 正好相反。
+
+这里用 PRAGMA user_version 记录结构版本，打开数据库时在一个事务里一次性执行
+所有未完成的迁移步骤。进程中途被杀掉时事务会整体回滚，下次打开会从原来的版本
+重新开始，不会留下半迁移的数据库。
+"""
+import sqlite3
+import uuid
+
+# 各表的目标结构，迁移时会按列名与现有表比对
+TABLES = {
+    "prompt_types": '''
+        CREATE TABLE {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type_name TEXT UNIQUE
+        )
+    ''',
+    "prompts": '''
+        CREATE TABLE {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type_id INTEGER,
+            prompt_name TEXT,
+            prompt_text TEXT,
+            introduction TEXT,
+            updated_at INTEGER,
+            FOREIGN KEY (type_id) REFERENCES prompt_types (id)
+        )
+    ''',
+    "presets": '''
+        CREATE TABLE {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            preset_name TEXT,
+            prompt TEXT,
+            negative_prompt TEXT,
+            introduction TEXT
+        )
+    ''',
+    "remote_sources": '''
+        CREATE TABLE {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE,
+            url TEXT,
+            priority INTEGER DEFAULT 0,
+            enabled INTEGER DEFAULT 1
+        )
+    ''',
+    "change_log": '''
+        CREATE TABLE {name} (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            type_name TEXT,
+            name TEXT
+        )
+    ''',
+    "sync_state": '''
+        CREATE TABLE {name} (
+            name TEXT PRIMARY KEY,
+            value
+        )
+    ''',
+    "row_versions": '''
+        CREATE TABLE {name} (
+            kind TEXT NOT NULL,
+            type_name TEXT NOT NULL DEFAULT '',
+            name TEXT NOT NULL DEFAULT '',
+            vector TEXT NOT NULL,
+            updated_at INTEGER,
+            writer TEXT,
+            deleted INTEGER DEFAULT 0,
+            PRIMARY KEY (kind, type_name, name)
+        ) WITHOUT ROWID
+    ''',
+}
+
+# 维护 change_log 的触发器。日志只记录被修改的键（类型名称 + 名称），导出增量时再读取当前内容:
+# 行还在就是新增或修改，不在就是删除。
+# 类型和提示词的触发器在整库替换导入的事务中会被暂时删除（见 library.clear_prompts），按名称保存。
+PROMPT_LOG_TRIGGERS = {
+    "prompt_types_log_insert": '''
+        CREATE TRIGGER IF NOT EXISTS prompt_types_log_insert AFTER INSERT ON prompt_types
+        BEGIN
+            INSERT INTO change_log (kind, type_name) VALUES ('type', NEW.type_name);
+        END
+    ''',
+    "prompt_types_log_update": '''
+        CREATE TRIGGER IF NOT EXISTS prompt_types_log_update AFTER UPDATE OF type_name ON prompt_types
+        WHEN OLD.type_name IS NOT NEW.type_name
+        BEGIN
+            INSERT INTO change_log (kind, type_name) VALUES ('type', OLD.type_name), ('type', NEW.type_name);
+            -- 改名后类型下所有提示词的键都变了
+            INSERT INTO change_log (kind, type_name, name)
+                SELECT 'prompt', OLD.type_name, prompt_name FROM prompts WHERE type_id = NEW.id;
+            INSERT INTO change_log (kind, type_name, name)
+                SELECT 'prompt', NEW.type_name, prompt_name FROM prompts WHERE type_id = NEW.id;
+        END
+    ''',
+    "prompt_types_log_delete": '''
+        CREATE TRIGGER IF NOT EXISTS prompt_types_log_delete AFTER DELETE ON prompt_types
+        BEGIN
+            INSERT INTO change_log (kind, type_name) VALUES ('type', OLD.type_name);
+        END
+    ''',
+    "prompts_log_insert": '''
+        CREATE TRIGGER IF NOT EXISTS prompts_log_insert AFTER INSERT ON prompts
+        BEGIN
+            INSERT INTO change_log (kind, type_name, name)
+                SELECT 'prompt', type_name, NEW.prompt_name FROM prompt_types WHERE id = NEW.type_id;
+        END
+    ''',
+    "prompts_log_update": '''
+        CREATE TRIGGER IF NOT EXISTS prompts_log_update AFTER UPDATE ON prompts
+        BEGIN
+            INSERT INTO change_log (kind, type_name, name)
+                SELECT 'prompt', type_name, OLD.prompt_name FROM prompt_types
+                WHERE id = OLD.type_id AND (OLD.type_id IS NOT NEW.type_id OR OLD.prompt_name IS NOT NEW.prompt_name);
+            INSERT INTO change_log (kind, type_name, name)
+                SELECT 'prompt', type_name, NEW.prompt_name FROM prompt_types WHERE id = NEW.type_id;
+        END
+    ''',
+    "prompts_log_delete": '''
+        CREATE TRIGGER IF NOT EXISTS prompts_log_delete AFTER DELETE ON prompts
+        BEGIN
+            INSERT INTO change_log (kind, type_name, name)
+                SELECT 'prompt', type_name, OLD.prompt_name FROM prompt_types WHERE id = OLD.type_id;
+        END
+    ''',
+}
+PRESET_LOG_TRIGGERS = {
+    "presets_log_insert": '''
+        CREATE TRIGGER IF NOT EXISTS presets_log_insert AFTER INSERT ON presets
+        BEGIN
+            INSERT INTO change_log (kind, name) VALUES ('preset', NEW.preset_name);
+        END
+    ''',
+    "presets_log_update": '''
+        CREATE TRIGGER IF NOT EXISTS presets_log_update AFTER UPDATE ON presets
+        BEGIN
+            INSERT INTO change_log (kind, name) SELECT 'preset', OLD.preset_name
+                WHERE OLD.preset_name IS NOT NEW.preset_name;
+            INSERT INTO change_log (kind, name) VALUES ('preset', NEW.preset_name);
+        END
+    ''',
+    "presets_log_delete": '''
+        CREATE TRIGGER IF NOT EXISTS presets_log_delete AFTER DELETE ON presets
+        BEGIN
+            INSERT INTO change_log (kind, name) VALUES ('preset', OLD.preset_name);
+        END
+    ''',
+}
+
+DEFAULT_SOURCE_URL = "https://raw.githubusercontent.com/bgvioletsky/prompts/refs/heads/main/default.plist"
+
+
+def table_columns(cursor, name):
+    """
+    返回表的列名列表，表不存在时返回空列表。
+    """
+    cursor.execute(f"PRAGMA table_info({name})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def _target_columns(cursor, name):
+    # 在临时库里建一张同结构的表来读取目标列名和类型
+    cursor.execute(TABLES[name].format(name=f"temp.{name}_target"))
+    cursor.execute(f"PRAGMA temp.table_info({name}_target)")
+    columns = [(row[1], row[2]) for row in cursor.fetchall()]
+    cursor.execute(f"DROP TABLE temp.{name}_target")
+    return columns
+
+
+def rebuild_table(cursor, name):
+    """
+    按目标结构重建表：新建表后用一条 INSERT ... SELECT 整表拷贝共有的列，
+    再删除旧表并改名。表上的索引和触发器会随旧表一起删除，由调用方重建。
+    """
+    existing = table_columns(cursor, name)
+    new_name = f"{name}_new"
+    cursor.execute(f"DROP TABLE IF EXISTS {new_name}")
+    cursor.execute(TABLES[name].format(name=new_name))
+    common = [c for c in table_columns(cursor, new_name) if c in existing]
+    column_list = ", ".join(common)
+    cursor.execute(f"INSERT INTO {new_name} ({column_list}) SELECT {column_list} FROM {name}")
+    cursor.execute(f"DROP TABLE {name}")
+    # 其他表的触发器（如 prompt_types_log_update）引用了刚删除的表，
+    # 新版的 RENAME 会重新检查整个结构而报错，按旧行为只改表名
+    cursor.execute("PRAGMA legacy_alter_table = ON")
+    try:
+        cursor.execute(f"ALTER TABLE {new_name} RENAME TO {name}")
+    finally:
+        cursor.execute("PRAGMA legacy_alter_table = OFF")
+
+
+def ensure_table(cursor, name):
+    """
+    使表结构与 TABLES 一致：不存在则创建；只缺少列时直接 ADD COLUMN（只改表定义，
+    不拷贝数据）；列有出入时整表重建。
+    """
+    existing = table_columns(cursor, name)
+    if not existing:
+        cursor.execute(TABLES[name].format(name=name))
+        return
+    target = _target_columns(cursor, name)
+    target_names = [column for column, _ in target]
+    if existing == target_names:
+        return
+    if existing == target_names[:len(existing)]:
+        for column, column_type in target[len(existing):]:
+            cursor.execute(f"ALTER TABLE {name} ADD COLUMN {column} {column_type}")
+    else:
+        rebuild_table(cursor, name)
+
+
+def _migrate_1(cursor):
+    # 统一两个入口的表结构，prompts 和 presets 都带 introduction 列
+    for name in ("prompt_types", "prompts", "presets"):
+        ensure_table(cursor, name)
+
+
+def _migrate_2(cursor):
+    # 按类型懒加载提示词时按 type_id 查询和计数
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_prompts_type_id ON prompts (type_id)")
+
+
+def _migrate_3(cursor):
+    # 多个远程源，默认带上项目自己的 default.plist
+    ensure_table(cursor, "remote_sources")
+    cursor.execute(
+        "INSERT OR IGNORE INTO remote_sources (name, url, priority) VALUES (?, ?, ?)",
+        ("default", DEFAULT_SOURCE_URL, 0)
+    )
+
+
+def _migrate_4(cursor):
+    # 按冲突策略合并导入：同一类型下名称唯一，并记录修改时间（Unix 秒）供“保留较新”比较。
+    # 旧版本的修改和导入会留下同名的重复行，保留最后写入（id 最大）的一行
+    ensure_table(cursor, "prompts")
+    cursor.execute('''
+        DELETE FROM prompts WHERE id NOT IN (
+            SELECT MAX(id) FROM prompts GROUP BY type_id, prompt_name
+        )
+    ''')
+    cursor.execute("UPDATE prompts SET updated_at = CAST(strftime('%s', 'now') AS INTEGER) WHERE updated_at IS NULL")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_prompts_type_name ON prompts (type_id, prompt_name)")
+    # ensure_table 整表重建时会丢掉原有的索引
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_prompts_type_id ON prompts (type_id)")
+
+
+def _migrate_5(cursor):
+    # 增量同步：变更日志、本机标识和同步进度
+    ensure_table(cursor, "change_log")
+    ensure_table(cursor, "sync_state")
+    for trigger in (*PROMPT_LOG_TRIGGERS.values(), *PRESET_LOG_TRIGGERS.values()):
+        cursor.execute(trigger)
+    cursor.execute(
+        "INSERT OR IGNORE INTO sync_state (name, value) VALUES ('station_id', ?)", (uuid.uuid4().hex,)
+    )
+    # 已有的数据没有日志，用一条 reset 表示从 0 开始的增量包含整个库
+    cursor.execute("INSERT INTO change_log (kind) VALUES ('reset')")
+    # 只有 reset 之后的预设修改会被导出，已有的预设逐条记一次
+    cursor.execute("INSERT INTO change_log (kind, name) SELECT 'preset', preset_name FROM presets ORDER BY id")
+
+
+def _migrate_6(cursor):
+    # 文件夹同步：每个键的版本向量（见 file_sync.py）
+    ensure_table(cursor, "row_versions")
+
+
+# (版本号, 迁移函数)，按顺序执行
+MIGRATIONS = [
+    (1, _migrate_1),
+    (2, _migrate_2),
+    (3, _migrate_3),
+    (4, _migrate_4),
+    (5, _migrate_5),
+    (6, _migrate_6),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """
+    把数据库升级到最新结构版本。
+
+    所有未执行的迁移步骤和 user_version 的更新在同一个事务中完成。
+
+    参数:
+    conn: sqlite3 数据库连接。
+
+    返回值:
+    (迁移前版本, 迁移后版本)
+    """
+    version = get_version(conn)
+    if version >= LATEST_VERSION:
+        return version, version
+
+    conn.commit()
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        # 另一个进程可能已经完成了迁移
+        current = get_version(conn)
+        for target, step in MIGRATIONS:
+            if target > current:
+                step(cursor)
+                cursor.execute(f"PRAGMA user_version = {target}")
+        cursor.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        raise
+    finally:
+        cursor.close()
+        conn.isolation_level = isolation_level
+    return version, get_version(conn)
+
+
+if __name__ == "__main__":
+    import sys
+
+    for path in sys.argv[1:]:
+        connection = sqlite3.connect(path)
+        try:
+            before, after = migrate(connection)
+        finally:
+            connection.close()
+        print(f"{path}: {before} -> {after}")
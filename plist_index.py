@@ -0,0 +1,341 @@
+"""
+只读浏览 .plist 提示词库，不导入 SQLite。
+
+plist 文件（每行 "类型^名称^提示词^介绍"）用 mmap 映射。旁边的 .idx 索引文件记录每个
+类型的行偏移，以及按名称排序的位置，用于二分查找。索引同样用 mmap 映射，直接
+cast 成 memoryview 使用，所以打开已建立索引的大文件只需几毫秒。字段只在访问某一行时
+才从映射中切出并解码。
+
+索引头部记录 plist 的大小和修改时间，任一变化时自动重建；目录不可写时索引只保存在内存中。
+使用映射前同样比较文件的大小和修改时间，文件在浏览期间被改写（尤其是截短）时重新映射，
+避免访问已不存在的页面触发 SIGBUS。
+"""
+import mmap
+import os
+import re
+import struct
+from collections.abc import ItemsView, Mapping
+
+from store import TypeEntry
+
+INDEX_SUFFIX = ".idx"
+FIELD_COUNT = 4
+
+_MAGIC = b"PLIDX001"
+# magic, plist 大小, plist 修改时间（纳秒）, 类型数, 填充
+_HEADER = struct.Struct("<8sQqI4x")
+# 类型名称字节数, 条数
+_TYPE_HEADER = struct.Struct("<II")
+
+
+class PlistChangedError(Exception):
+    """
+    文件变化后仍在使用变化前取得的 PlistPrompts。
+    """
+
+
+def _pad(n):
+    return -n % 8
+
+
+def index_path_for(path):
+    return path + INDEX_SUFFIX
+
+
+def _map_file(path):
+    # 空文件无法 mmap，返回空字节串
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def build_index(path):
+    """
+    扫描 plist 文件，返回索引内容（bytes）。
+
+    与导入时相同，字段数不为 4 的行会被跳过；同一类型下名称重复时，
+    位置取第一次出现，内容取最后一次。
+    """
+    stat = os.stat(path)
+    data = _map_file(path)
+    types = {}
+    try:
+        pos = 0
+        readline = data.readline if data else (lambda: b"")
+        for line in iter(readline, b""):
+            start = pos
+            pos += len(line)
+            fields = line.strip().split(b'^')
+            if len(fields) != FIELD_COUNT:
+                continue
+            entry = types.get(fields[0])
+            if entry is None:
+                entry = types[fields[0]] = ([], {})
+            offsets, slots = entry
+            slot = slots.get(fields[1])
+            if slot is None:
+                slots[fields[1]] = len(offsets)
+                offsets.append(start)
+            else:
+                offsets[slot] = start
+    finally:
+        if data:
+            data.close()
+
+    parts = [_HEADER.pack(_MAGIC, stat.st_size, stat.st_mtime_ns, len(types))]
+    for type_name, (offsets, slots) in types.items():
+        names = list(slots)
+        order = sorted(range(len(names)), key=names.__getitem__)
+        parts.append(_TYPE_HEADER.pack(len(type_name), len(offsets)))
+        parts.append(type_name + b"\0" * _pad(len(type_name)))
+        parts.append(struct.pack(f"<{len(offsets)}Q", *offsets))
+        parts.append(struct.pack(f"<{len(order)}I", *order) + b"\0" * _pad(4 * len(order)))
+    return b"".join(parts)
+
+
+def _index_is_current(index_path, stat):
+    try:
+        with open(index_path, "rb") as f:
+            header = f.read(_HEADER.size)
+    except OSError:
+        return False
+    if len(header) != _HEADER.size:
+        return False
+    magic, size, mtime_ns, _ = _HEADER.unpack(header)
+    return magic == _MAGIC and size == stat.st_size and mtime_ns == stat.st_mtime_ns
+
+
+class _PlistItems(ItemsView):
+    # 每行只切分一次
+    def __iter__(self):
+        prompts = self._mapping
+        prompts._check()
+        for offset in prompts.offsets:
+            fields = prompts._fields(offset)
+            yield fields[1], (offset, fields[2], fields[3])
+
+
+class PlistPrompts(Mapping):
+    """
+    单个类型下的提示词，接口与 store.PromptColumns 相同：名称映射到 (行偏移, 提示词, 介绍)。
+    """
+
+    __slots__ = ('_library', '_generation', '_data', 'offsets', '_order')
+
+    def __init__(self, library, data, offsets, order):
+        self._library = library
+        self._generation = library.generation
+        self._data = data
+        self.offsets = offsets
+        self._order = order
+
+    def _check(self):
+        # 文件变化后旧的映射可能越过文件末尾，不能再访问
+        self._library.check()
+        if self._generation != self._library.generation:
+            raise PlistChangedError(f"{self._library.path} 已被修改")
+
+    def _fields(self, offset):
+        data = self._data
+        end = data.find(b'\n', offset)
+        if end == -1:
+            end = len(data)
+        return data[offset:end].decode('utf-8', errors='replace').strip().split('^')
+
+    def _name_bytes(self, offset):
+        data = self._data
+        start = data.find(b'^', offset) + 1
+        return data[start:data.find(b'^', start)]
+
+    def name_at(self, i):
+        self._check()
+        return self._fields(self.offsets[i])[1]
+
+    def row_at(self, i):
+        self._check()
+        offset = self.offsets[i]
+        fields = self._fields(offset)
+        return offset, fields[2], fields[3]
+
+    def _position(self, name):
+        # 在按名称排序的位置上二分查找，不需要把名称读进内存
+        key = name.encode('utf-8')
+        order, offsets = self._order, self.offsets
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._name_bytes(offsets[order[mid]]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(order) and self._name_bytes(offsets[order[lo]]) == key:
+            return order[lo]
+        return None
+
+    def __getitem__(self, name):
+        self._check()
+        i = self._position(name)
+        if i is None:
+            raise KeyError(name)
+        offset = self.offsets[i]
+        fields = self._fields(offset)
+        return offset, fields[2], fields[3]
+
+    def __contains__(self, name):
+        self._check()
+        return self._position(name) is not None
+
+    def __iter__(self):
+        self._check()
+        for offset in self.offsets:
+            yield self._fields(offset)[1]
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def items(self):
+        return _PlistItems(self)
+
+
+class PlistLibrary(Mapping):
+    """
+    只读的 plist 提示词库，接口与 store.PromptStore 相同：{类型名称: {'id', 'count', 'prompts'}}。
+    """
+
+    read_only = True
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = index_path_for(path)
+        # 每次重新映射加一，PlistPrompts 据此判断自己是否过期
+        self.generation = 0
+        self._stat = None
+        self._data = b""
+        self._index = b""
+        self._types = {}
+        self._prompts = []
+        self.reload()
+
+    def close(self):
+        # 不显式关闭 mmap：仍被引用的 PlistPrompts 持有索引的 memoryview，
+        # 映射在最后一个引用释放时自动关闭
+        self._types = {}
+        self._prompts = []
+        self._data = self._index = b""
+
+    def reload(self):
+        """
+        映射 plist 和索引；索引不存在或与 plist 的大小、修改时间不一致时重建。
+        """
+        self.close()
+        self.generation += 1
+        stat = os.stat(self.path)
+        self._stat = (stat.st_size, stat.st_mtime_ns)
+        if _index_is_current(self.index_path, stat):
+            self._index = _map_file(self.index_path)
+        else:
+            index = build_index(self.path)
+            try:
+                temp_path = self.index_path + ".tmp"
+                with open(temp_path, "wb") as f:
+                    f.write(index)
+                os.replace(temp_path, self.index_path)
+                self._index = _map_file(self.index_path)
+            except OSError:
+                # 只读目录下直接使用内存中的索引
+                self._index = index
+        self._data = _map_file(self.path)
+        self._load_index()
+
+    def _load_index(self):
+        view = memoryview(self._index)
+        _, _, _, type_count = _HEADER.unpack_from(view, 0)
+        pos = _HEADER.size
+        for type_id in range(type_count):
+            name_length, count = _TYPE_HEADER.unpack_from(view, pos)
+            pos += _TYPE_HEADER.size
+            type_name = bytes(view[pos:pos + name_length]).decode('utf-8', errors='replace')
+            pos += name_length + _pad(name_length)
+            offsets = view[pos:pos + 8 * count].cast('Q')
+            pos += 8 * count
+            order = view[pos:pos + 4 * count].cast('I')
+            pos += 4 * count + _pad(4 * count)
+            self._types[type_name] = TypeEntry(self, type_id)
+            self._prompts.append(PlistPrompts(self, self._data, offsets, order))
+
+    def check(self):
+        """
+        文件的大小或修改时间与映射时不同则重新映射，返回是否重新映射。
+        文件被删除时原映射仍然有效，继续使用。
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        if (stat.st_size, stat.st_mtime_ns) == self._stat:
+            return False
+        self.reload()
+        return True
+
+    def count(self, type_id):
+        self.check()
+        return len(self._prompts[type_id])
+
+    def prompts(self, type_id):
+        self.check()
+        return self._prompts[type_id]
+
+    def invalidate(self, type_id=None):
+        pass
+
+    def iter_entries(self):
+        """
+        按文件顺序产出 (类型名称, 名称, 提示词, 介绍)，用于构建反查自动机。
+        """
+        self.check()
+        for type_name, entry in self._types.items():
+            for prompt_name, (_, prompt_text, introduction) in self._prompts[entry.id].items():
+                yield type_name, prompt_name, prompt_text, introduction
+
+    def search(self, words, limit=None):
+        """
+        搜索名称、提示词或介绍包含全部 words（小写）的提示词。
+
+        用第一个词在整个映射上查找候选行（ASCII 不区分大小写），再解码候选行核对全部关键字，
+        所以只有命中的行会被解码。
+        """
+        self.check()
+        data = self._data
+        if not data:
+            return []
+        pattern = re.compile(re.escape(words[0].encode('utf-8')), re.IGNORECASE)
+        results = []
+        seen = set()
+        for match in pattern.finditer(data):
+            start = data.rfind(b'\n', 0, match.start()) + 1
+            if start in seen:
+                continue
+            seen.add(start)
+            end = data.find(b'\n', start)
+            fields = data[start:len(data) if end == -1 else end].decode('utf-8', errors='replace').strip().split('^')
+            if len(fields) != FIELD_COUNT:
+                continue
+            haystack = "\n".join(fields[1:]).lower()
+            if all(word in haystack for word in words):
+                results.append(tuple(fields))
+                if limit is not None and len(results) >= limit:
+                    break
+        return results
+
+    def __getitem__(self, type_name):
+        self.check()
+        return self._types[type_name]
+
+    def __iter__(self):
+        self.check()
+        return iter(self._types)
+
+    def __len__(self):
+        self.check()
+        return len(self._types)
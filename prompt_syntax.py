@@ -0,0 +1,469 @@
+"""
+A1111 / ComfyUI 提示词语法的解析与规范化。
+
+支持的语法:
+- (tag)、((tag))、(tag:1.2)：强调与显式权重，嵌套时权重相乘。
+- [tag]：减弱（权重除以 1.1）。
+- [a|b]：交替；[a:b:0.5]、[a:0.5]、[a::0.5]：按步数切换。
+- <lora:name:0.8> 等扩展网络标记：原样保留。
+- BREAK：分段关键字。
+- \\( \\) \\[ \\] \\\\：转义字符。
+
+parse_prompt 把字符串解析为节点列表（AST），to_prompt 把 AST 还原成字符串，
+normalize_prompt 在此基础上合并空白和逗号、去重并合并重复标签的权重。
+"""
+import re
+from functools import lru_cache
+
+# AST 节点均为元组，第一个元素是节点类型:
+#   ('text', str)
+#   ('group', children, weight)          圆括号/方括号，weight 为相对倍数
+#   ('alt', [children, ...])             [a|b]
+#   ('sched', [children, ...], step)     [a:b:0.5] / [a:0.5] / [a::0.5]
+#   ('extra', raw)                       <lora:...>
+#   ('break',)
+EMPHASIS = 1.1
+
+# 顶层的 ':'、'|'、'>' 都是普通字符，只有这些字符会让 prompt 走完整解析
+_SPECIAL = re.compile(r'[\\()\[\]<]')
+_WEIGHTED_TAG = re.compile(
+    r'\s*(?:\(([^\\()\[\]<:|]*):\s*([-+]?(?:\d+(?:\.\d*)?|\.\d+))\s*\)'
+    r'|\(([^\\()\[\]<:|]*)\)|\[([^\\()\[\]<:|]*)\])\s*\Z'
+)
+# 不含嵌套、转义和扩展网络的单个标签，如 "(tag:1.2)"、"[tag]"
+_SIMPLE_TAG = re.compile(r'[^\\()\[\]<]*(?:(?:\([^\\()\[\]<]*\)|\[[^\\()\[\]<|:]*\])[^\\()\[\]<]*)*\Z')
+_TEXT_STOP = re.compile(r'[\\()\[\]<|:]|\bBREAK\b')
+_NUMBER = re.compile(r'\s*[-+]?(\d+(\.\d*)?|\.\d+)\s*$')
+_WHITESPACE = re.compile(r'\s{2,}|[^\S ]')
+_ESCAPE = re.compile(r'([\\()\[\]<])')
+_ESCAPE_NESTED = re.compile(r'([\\()\[\]<:|])')
+_BREAK_WORD = re.compile(r'\bBREAK\b')
+_WORD_CHAR = re.compile(r'\w')
+
+
+class _Parser:
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+
+    def parse(self):
+        nodes = self._parse_sequence(None)
+        return _restore_separators(nodes)
+
+    def _parse_sequence(self, closer):
+        """
+        解析到 closer（')' 或 ']'）为止，返回包含 ('sep', ch) 临时节点的列表。
+        """
+        text = self.text
+        nodes = []
+        buf = []
+        while self.pos < len(text):
+            m = _TEXT_STOP.search(text, self.pos)
+            if m is None:
+                buf.append(text[self.pos:])
+                self.pos = len(text)
+                break
+            if m.start() > self.pos:
+                buf.append(text[self.pos:m.start()])
+            self.pos = m.start()
+            token = m.group(0)
+            if token == '\\':
+                if self.pos + 1 < len(text):
+                    buf.append(text[self.pos + 1])
+                    self.pos += 2
+                else:
+                    buf.append('\\')
+                    self.pos += 1
+                continue
+            if token in (')', ']'):
+                if token == closer:
+                    break
+                # 不匹配的右括号按普通字符处理
+                buf.append(token)
+                self.pos += 1
+                continue
+            if buf:
+                nodes.append(('text', ''.join(buf)))
+                buf = []
+            if token == 'BREAK':
+                nodes.append(('break',))
+                self.pos += 5
+            elif token == '(':
+                self.pos += 1
+                nodes.append(self._finish_group(self._parse_sequence(')'), EMPHASIS))
+                self.pos += 1
+            elif token == '[':
+                self.pos += 1
+                nodes.append(self._finish_bracket(self._parse_sequence(']')))
+                self.pos += 1
+            elif token == '<':
+                end = text.find('>', self.pos)
+                if end == -1:
+                    buf.append('<')
+                    self.pos += 1
+                else:
+                    nodes.append(('extra', text[self.pos:end + 1]))
+                    self.pos = end + 1
+            else:
+                nodes.append(('sep', token))
+                self.pos += 1
+        if buf:
+            nodes.append(('text', ''.join(buf)))
+        return nodes
+
+    @staticmethod
+    def _finish_group(nodes, default_weight):
+        # (xxx:1.2)：最后一个 ':' 之后是数字时视为显式权重
+        for i in range(len(nodes) - 1, -1, -1):
+            node = nodes[i]
+            if node[0] == 'sep' and node[1] == ':':
+                tail = nodes[i + 1:]
+                if len(tail) == 1 and tail[0][0] == 'text' and _NUMBER.match(tail[0][1]):
+                    return ('group', _restore_separators(nodes[:i]), float(tail[0][1]))
+                break
+            if node[0] != 'text':
+                break
+        return ('group', _restore_separators(nodes), default_weight)
+
+    def _finish_bracket(self, nodes):
+        parts = [[]]
+        colons = []
+        for node in nodes:
+            if node[0] == 'sep' and node[1] == '|':
+                parts.append([])
+            else:
+                parts[-1].append(node)
+        if len(parts) > 1:
+            return ('alt', [_restore_separators(p) for p in parts])
+        # [a:b:0.5] / [a:0.5] / [a::0.5]
+        parts = [[]]
+        for node in nodes:
+            if node[0] == 'sep' and node[1] == ':':
+                parts.append([])
+                colons.append(node)
+            else:
+                parts[-1].append(node)
+        if 2 <= len(parts) <= 3:
+            step = parts[-1]
+            if len(step) == 1 and step[0][0] == 'text' and _NUMBER.match(step[0][1]):
+                options = [_restore_separators(p) for p in parts[:-1]]
+                return ('sched', options, step[0][1].strip())
+        return ('group', _restore_separators(nodes), 1 / EMPHASIS)
+
+
+def _restore_separators(nodes):
+    """
+    把未被语法消费的 ':' 和 '|' 还原为普通文本，并合并相邻文本节点。
+    """
+    result = []
+    for node in nodes:
+        if node[0] == 'sep':
+            node = ('text', node[1])
+        if node[0] == 'text' and result and result[-1][0] == 'text':
+            result[-1] = ('text', result[-1][1] + node[1])
+        else:
+            result.append(node)
+    return result
+
+
+def parse_prompt(text):
+    """
+    将 prompt 字符串解析为 AST 节点列表。
+
+    参数:
+    text: prompt 字符串。
+
+    返回值:
+    节点元组列表，格式见模块开头的说明。
+    """
+    return _Parser(text or "").parse()
+
+
+def format_weight(weight):
+    """
+    格式化权重，最多保留三位小数。
+    """
+    return f"{round(weight, 3):g}"
+
+
+def _escape(text, nested=False):
+    # 括号内的 ':' 和 '|' 也有语法含义，需要一并转义
+    pattern = _ESCAPE_NESTED if nested else _ESCAPE
+    if pattern.search(text):
+        text = pattern.sub(r'\\\1', text)
+    if 'BREAK' in text:
+        text = _BREAK_WORD.sub(r'\\BREAK', text)
+    return text
+
+
+def to_prompt(nodes, nested=False):
+    """
+    将 AST 还原为 prompt 字符串，parse_prompt(to_prompt(nodes)) 与 nodes 等价。
+    """
+    out = []
+    for i, node in enumerate(nodes):
+        kind = node[0]
+        if kind == 'text':
+            text = _escape(node[1], nested)
+            # 紧邻 BREAK 的单词字符需要转义，否则会和 BREAK 连成一个单词
+            if i > 0 and nodes[i - 1][0] == 'break' and _WORD_CHAR.match(text):
+                text = '\\' + text
+            if i + 1 < len(nodes) and nodes[i + 1][0] == 'break' and _WORD_CHAR.match(text[-1:]):
+                text = text[:-1] + '\\' + text[-1]
+            out.append(text)
+        elif kind == 'group':
+            inner = to_prompt(node[1], True)
+            weight = node[2]
+            if weight == EMPHASIS:
+                out.append(f"({inner})")
+            elif weight == 1 / EMPHASIS:
+                out.append(f"[{inner}]")
+            else:
+                out.append(f"({inner}:{format_weight(weight)})")
+        elif kind == 'alt':
+            out.append("[" + "|".join(to_prompt(o, True) for o in node[1]) + "]")
+        elif kind == 'sched':
+            out.append("[" + ":".join(to_prompt(o, True) for o in node[1]) + ":" + node[2] + "]")
+        elif kind == 'extra':
+            out.append(node[1])
+        elif kind == 'break':
+            out.append("BREAK")
+    return "".join(out)
+
+
+def _collapse(text):
+    if _WHITESPACE.search(text):
+        return _WHITESPACE.sub(' ', text)
+    return text
+
+
+def _canonical_nodes(nodes):
+    """
+    折叠嵌套节点内部的空白（用于交替、切换等不参与去重的结构）。
+    """
+    result = []
+    for node in nodes:
+        kind = node[0]
+        if kind == 'text':
+            node = ('text', _collapse(node[1]))
+        elif kind == 'group':
+            node = ('group', _canonical_nodes(node[1]), node[2])
+        elif kind == 'alt':
+            node = ('alt', [_canonical_nodes(o) for o in node[1]])
+        elif kind == 'sched':
+            node = ('sched', [_canonical_nodes(o) for o in node[1]], node[2])
+        result.append(node)
+    return result
+
+
+def _flatten(nodes, weight, tags):
+    """
+    展开 AST，把权重下推到每一段文本，按逗号和 BREAK 切分为标签。
+
+    tags 的结构为 [segment, ...]，segment 为 [tag, ...]，tag 为 [(text, weight, opaque), ...]。
+    """
+    for node in nodes:
+        kind = node[0]
+        if kind == 'text':
+            pieces = node[1].split(',')
+            for i, piece in enumerate(pieces):
+                if i:
+                    tags[-1].append([])
+                if piece:
+                    tags[-1][-1].append((piece, weight, False))
+        elif kind == 'group':
+            _flatten(node[1], weight * node[2], tags)
+        elif kind == 'alt':
+            inner = "|".join(to_prompt(_canonical_nodes(o), True) for o in node[1])
+            tags[-1][-1].append(("[" + inner + "]", weight, True))
+        elif kind == 'sched':
+            inner = ":".join(to_prompt(_canonical_nodes(o), True) for o in node[1])
+            tags[-1][-1].append(("[" + inner + ":" + node[2] + "]", weight, True))
+        elif kind == 'extra':
+            tags[-1][-1].append((node[1], weight, True))
+        elif kind == 'break':
+            tags.append([[]])
+
+
+def _format_piece(text, weight, opaque):
+    body = text if opaque else _escape(text)
+    if round(weight, 3) == 1:
+        return body
+    # 片段首尾的空白放在括号外面
+    stripped = body.strip()
+    if not stripped:
+        return body
+    lead = body[:len(body) - len(body.lstrip())]
+    trail = body[len(body.rstrip()):]
+    return f"{lead}({stripped}:{format_weight(weight)}){trail}"
+
+
+def _render_tag(pieces):
+    """
+    合并同权重的相邻片段并折叠空白，返回 (key, weight, rendered) 或 None。
+    """
+    merged = []
+    for text, weight, opaque in pieces:
+        if not opaque and merged and not merged[-1][2] and round(merged[-1][1], 3) == round(weight, 3):
+            merged[-1] = (merged[-1][0] + text, weight, False)
+        else:
+            merged.append((text, weight, opaque))
+    merged = [(t if o else _collapse(t), w, o) for t, w, o in merged]
+    # 去掉标签首尾的空白以及因此变空的片段
+    while merged and not merged[0][2] and not merged[0][0].strip():
+        merged.pop(0)
+    while merged and not merged[-1][2] and not merged[-1][0].strip():
+        merged.pop()
+    if not merged:
+        return None
+    if not merged[0][2]:
+        merged[0] = (merged[0][0].lstrip(), merged[0][1], False)
+    if not merged[-1][2]:
+        merged[-1] = (merged[-1][0].rstrip(), merged[-1][1], False)
+    if len(merged) == 1:
+        text, weight, opaque = merged[0]
+        return (text.lower() if not opaque else text), weight, merged[0]
+    rendered = ""
+    for piece in merged:
+        formatted = _format_piece(*piece)
+        # 相邻片段边界上的空白只保留一个
+        if rendered.endswith(' ') and formatted.startswith(' '):
+            formatted = formatted.lstrip(' ')
+        rendered += formatted
+    return rendered.lower(), 1.0, (rendered, 1.0, True)
+
+
+def _normalize_plain(text, dedupe):
+    # 不含任何特殊语法时的快速路径
+    tags = [" ".join(piece.split()) for piece in text.split(',')]
+    tags = [tag for tag in tags if tag]
+    if dedupe:
+        keys = [tag.lower() for tag in tags]
+        if len(set(keys)) != len(keys):
+            seen = set()
+            unique = []
+            for tag, key in zip(tags, keys):
+                if key not in seen:
+                    seen.add(key)
+                    unique.append(tag)
+            tags = unique
+    return ", ".join(tags)
+
+
+@lru_cache(maxsize=65536)
+def normalize_prompt(text, dedupe=True):
+    """
+    规范化 prompt 字符串。
+
+    - 折叠多余空白，统一使用 ", " 分隔标签，去掉空标签。
+    - 嵌套括号折算为显式权重，如 ((tag)) -> (tag:1.21)。
+    - dedupe 为 True 时按不区分大小写去重，重复标签保留首次出现的位置，
+      权重取其中最大的一个。
+    - BREAK 分段之间不去重。
+
+    参数:
+    text: prompt 字符串。
+    dedupe: 是否去除重复标签。
+
+    返回值:
+    规范化后的 prompt 字符串。
+    """
+    if not text:
+        return ""
+    if 'BREAK' not in text:
+        if not _SPECIAL.search(text):
+            return _normalize_plain(text, dedupe)
+        pieces = text.split(',')
+        if all(_SIMPLE_TAG.match(piece) for piece in pieces):
+            # 括号都不跨逗号时逐个标签处理，只有带语法的标签才需要完整解析
+            tags = []
+            for piece in pieces:
+                if _SPECIAL.search(piece):
+                    rendered = _render_simple_tag(piece)
+                else:
+                    # 不含特殊字符的文本无需转义，直接按不透明片段输出
+                    piece = " ".join(piece.split())
+                    rendered = (piece.lower(), 1.0, (piece, 1.0, True)) if piece else None
+                if rendered is not None:
+                    tags.append(rendered)
+            return _join_tags(tags, dedupe)
+    return _normalize_full(text, dedupe)
+
+
+def _normalize_full(text, dedupe):
+    # 完整解析：逗号和 BREAK 可能出现在括号内，需要先展开整个 AST 再切分标签
+    segments = [[[]]]
+    _flatten(parse_prompt(text), 1.0, segments)
+    rendered_segments = []
+    for segment in segments:
+        tags = [_render_tag(pieces) for pieces in segment]
+        rendered = _join_tags([t for t in tags if t is not None], dedupe)
+        if rendered:
+            rendered_segments.append(rendered)
+    return " BREAK ".join(rendered_segments)
+
+
+def _render_simple_tag(piece):
+    # 最常见的 "(tag:1.2)"、"(tag)"、"[tag]" 直接用正则处理
+    m = _WEIGHTED_TAG.match(piece)
+    if m:
+        text = " ".join((m.group(1) or m.group(3) or m.group(4) or "").split())
+        if text and 'BREAK' not in text:
+            if m.group(2):
+                weight = float(m.group(2))
+            elif m.group(3) is not None:
+                weight = EMPHASIS
+            else:
+                weight = 1 / EMPHASIS
+            return text.lower(), weight, (text, weight, False)
+    tags = [[[]]]
+    _flatten(parse_prompt(piece), 1.0, tags)
+    return _render_tag(tags[0][0])
+
+
+def _join_tags(tags, dedupe):
+    """
+    合并重复标签并拼接，tags 为 _render_tag 的返回值列表。
+    """
+    order = []
+    merged = {}
+    for key, weight, piece in tags:
+        if not dedupe:
+            key = len(order)
+        if key in merged:
+            if weight > merged[key][1]:
+                merged[key] = (piece, weight)
+            continue
+        merged[key] = (piece, weight)
+        order.append(key)
+    result = []
+    for key in order:
+        (text, _, opaque), weight = merged[key]
+        result.append(_format_piece(text, weight, opaque))
+    return ", ".join(result)
+
+
+def normalize_many(prompts, dedupe=True):
+    """
+    批量规范化，适用于清理预设表和导入的提示词库。
+
+    参数:
+    prompts: 可迭代的 prompt 字符串。
+    dedupe: 是否去除重复标签。
+
+    返回值:
+    规范化结果列表，与输入顺序一致。
+    """
+    # 批量处理时用局部字典缓存重复的 prompt，避免挤占 normalize_prompt 的 LRU 缓存
+    normalize = normalize_prompt.__wrapped__
+    cache = {}
+    result = []
+    for prompt in prompts:
+        if not prompt:
+            result.append("")
+            continue
+        normalized = cache.get(prompt)
+        if normalized is None:
+            normalized = cache[prompt] = normalize(prompt, dedupe)
+        result.append(normalized)
+    return result
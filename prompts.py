@@ -15,7 +15,12 @@ import os
 import urllib.request
 import sys
 import platform
-import pyperclip
+
+from migrations import migrate
+from clipboard import ClipboardHistory
+from metrics import ui_action
+import sqltrace
+from ui_watchdog import start_watchdog
 
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -64,8 +69,15 @@ class PromptCombinerApp:
         self.current_selected_type_dict = {}  # 当前选中类型的提示词
         self.preset_dict = {}  # 预设字典
         db_path = resource_path('test.db')
-        self.conn = sqlite3.connect(db_path)
+        # 设置 PROMPTS_SQL_TRACE 时记录每条 SQL 的耗时，退出时按操作汇总
+        self.conn = sqltrace.connect(db_path)
         self.create_tables()
+        # 剪贴板及复制历史，关闭窗口时写入尚未保存的历史
+        self.clipboard = ClipboardHistory(self.root, resource_path('clipboard_history.json'))
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # 设置 PROMPTS_WATCHDOG 时检测界面卡顿，报告写入 stalls 目录
+        self.watchdog = start_watchdog(self.root, resource_path('stalls'))
         self.tab_control = ttk.Notebook(root)
         self.prompt_tab = ttk.Frame(self.tab_control)
         # 状态栏
@@ -84,33 +96,8 @@ class PromptCombinerApp:
         self.initialize_prompt_type_combobox()
         self.initialize_presets()
     def create_tables(self):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS prompt_types (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                type_name TEXT UNIQUE
-            )
-        ''')
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS prompts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                type_id INTEGER,
-                prompt_name TEXT,
-                prompt_text TEXT,
-                FOREIGN KEY (type_id) REFERENCES prompt_types (id)
-            )
-        ''')
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS presets (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                preset_name TEXT,
-                prompt TEXT,
-                negative_prompt TEXT,
-                introduction TEXT
-            )
-        ''')
-        
-        self.conn.commit()
+        # 与 main.py 共用同一套表结构和迁移
+        migrate(self.conn)
         
     def create_prompt_tab(self):
         main_frame = ttk.Frame(self.prompt_tab)
@@ -343,6 +330,7 @@ class PromptCombinerApp:
         # 清除prompt组合框的当前选中项
         self.prompt_combobox.set('')
     
+    @ui_action
     def prompt_combobox_selection_changed(self, event):
 
         # 获取当前选中的提示词
@@ -356,17 +344,20 @@ class PromptCombinerApp:
             # 更新介绍标签的文本
             self.introduction_label.config(text=introduction)
 
+    @ui_action
     def add_to_prompt_button_click(self):
         selected_prompt = self.prompt_combobox.get()
         if selected_prompt and selected_prompt in self.current_selected_type_dict:
             prompt = self.current_selected_type_dict[selected_prompt][1]
             self.prompt_textbox.insert(tk.END, prompt + ', ')
 
+    @ui_action
     def add_to_negative_button_click(self):
         selected_prompt = self.prompt_combobox.get()
         if selected_prompt and selected_prompt in self.current_selected_type_dict:
             prompt = self.current_selected_type_dict[selected_prompt][1]
             self.negative_prompt_textbox.insert(tk.END, prompt + ', ')
+    @ui_action
     def load_config_button_click(self):
         selected_preset = self.presets_combobox.get()
         if selected_preset and selected_preset in self.preset_dict:
@@ -377,6 +368,7 @@ class PromptCombinerApp:
             self.negative_prompt_textbox.insert(tk.END, negative_prompt)
             self.introduction_label.config(text="")
             self.introduction_label.config(text=introduction)
+    @ui_action
     def save_config_button_click(self):
         prompt = self.prompt_textbox.get("1.0", tk.END).strip()
         negative_prompt = self.negative_prompt_textbox.get("1.0", tk.END).strip()
@@ -451,23 +443,32 @@ class PromptCombinerApp:
         # 让第一列可伸展宽度
         save_frame.grid_columnconfigure(0, weight=1)
 
+    @ui_action
     def copy_positive_prompt(self):
         prompt_content = self.prompt_textbox.get("1.0", tk.END).strip()
         if not prompt_content:
             messagebox.showwarning("提示", "Positive Prompt 中没有内容可复制！")
             return
-        pyperclip.copy(prompt_content)
+        self.clipboard.copy(prompt_content, "Positive")
         self.status_label.config(text="Positive Prompt 已复制到剪贴板")
 
+    @ui_action
     def copy_negative_prompt(self):
         negative_prompt_content = self.negative_prompt_textbox.get("1.0", tk.END).strip()
         if not negative_prompt_content:
             messagebox.showwarning("提示", "Negative Prompt 中没有内容可复制！")
             return
-        pyperclip.copy(negative_prompt_content)
+        self.clipboard.copy(negative_prompt_content, "Negative")
         self.status_label.config(text="Negative Prompt 已复制到剪贴板")
 
+    def on_close(self):
+        if self.watchdog:
+            self.watchdog.stop()
+        self.clipboard.flush()
+        self.root.destroy()
 
+
+    @ui_action
     def crud_type_combobox_selection_changed(self, event):
         selected_type = self.crud_type_combobox.get()
         if selected_type in self.prompt_type_dict:
@@ -479,6 +480,7 @@ class PromptCombinerApp:
         self.crud_prompt_textbox.delete("1.0", tk.END)
         self.crud_prompt_name_entry.delete(0, tk.END)
 
+    @ui_action
     def crud_prompt_combobox_selection_changed(self, event):
         selected_prompt = self.crud_prompt_combobox.get()
         if selected_prompt and selected_prompt in self.current_selected_type_dict:
@@ -490,6 +492,7 @@ class PromptCombinerApp:
     def prevent_typing(self, event):
         # 阻止用户输入
         return "break"
+    @ui_action
     def add_type(self):
         type_name = self.type_name_entry.get().strip()
         if type_name:
@@ -504,6 +507,7 @@ class PromptCombinerApp:
         else:
             messagebox.showerror("错误", "请输入类型名称")
 
+    @ui_action
     def update_type(self):
         old_type_name = self.crud_type_combobox.get()
         new_type_name = self.type_name_entry.get().strip()
@@ -529,6 +533,7 @@ class PromptCombinerApp:
         else:
             messagebox.showerror("错误", "请选择类型并输入新名称")
 
+    @ui_action
     def delete_type(self):
         type_name = self.crud_type_combobox.get()
         if type_name:
@@ -548,6 +553,7 @@ class PromptCombinerApp:
         else:
             messagebox.showerror("错误", "请选择要删除的类型")
 
+    @ui_action
     def add_prompt(self):
         selected_type = self.crud_type_combobox.get()
         prompt_name = self.crud_prompt_name_entry.get().strip()
@@ -578,6 +584,7 @@ class PromptCombinerApp:
         else:
             messagebox.showerror("错误", "请填写完整信息")
 
+    @ui_action
     def update_prompt(self):
         selected_type = self.crud_type_combobox.get()
         old_prompt_name = self.crud_prompt_combobox.get()
@@ -594,7 +601,8 @@ class PromptCombinerApp:
             
             # 插入或更新记录
             cursor.execute(
-                "INSERT INTO prompts (type_id, prompt_name, prompt_text) VALUES (?,?,?)",
+                "INSERT INTO prompts (type_id, prompt_name, prompt_text) VALUES (?,?,?) "
+                "ON CONFLICT (type_id, prompt_name) DO UPDATE SET prompt_text = excluded.prompt_text",
                 (type_id, new_prompt_name, prompt_text)
             )
             
@@ -604,6 +612,7 @@ class PromptCombinerApp:
         else:
             messagebox.showerror("错误", "请选择提示词并填写完整信息")
 
+    @ui_action
     def delete_prompt(self):
         selected_type = self.crud_type_combobox.get()
         prompt_name = self.crud_prompt_combobox.get()
@@ -752,6 +761,7 @@ class PromptCombinerApp:
         # 状态标签
         self.status_label = ttk.Label(main_frame, text="准备就绪", width=40)
         self.status_label.pack(padx=5, pady=5)
+    @ui_action
     def apply_remote_prompt_button_click(self):
         url = self.remote_prompt_url_textbox.get()
         if url:
@@ -807,7 +817,7 @@ class PromptCombinerApp:
 
                             if not existing_prompt:
                                 cursor.execute(
-                                    "INSERT INTO prompts (type_id, prompt_name, prompt_text) VALUES (?,?,?)",
+                                    "INSERT INTO prompts (type_id, prompt_name, prompt_text, introduction) VALUES (?,?,?,?)",
                                     (type_id, prompt_name, prompt_text, introduction)
                                 )
 
@@ -820,6 +830,7 @@ class PromptCombinerApp:
             except Exception as e:
                 messagebox.showerror("错误", f"远程数据处理失败: {str(e)}")
 
+    @ui_action
     def export_to_json(self):
         cursor = self.conn.cursor()
         
@@ -858,6 +869,7 @@ class PromptCombinerApp:
                 messagebox.showinfo("成功", f"数据已导出到 {file_path}")
         except Exception as e:
             messagebox.showerror("错误", f"导出失败: {str(e)}")
+    @ui_action
     def import_from_json(self):
         try:
             file_path = filedialog.askopenfilename(
@@ -886,7 +898,8 @@ class PromptCombinerApp:
                         # 创建提示词
                         for prompt_name, prompt_data in prompts.items():
                             prompt_text = prompt_data.get("prompt_text", "")
-                            cursor.execute("INSERT INTO prompts (type_id, prompt_name, prompt_text) VALUES (?,?,?)",
+                            cursor.execute("INSERT INTO prompts (type_id, prompt_name, prompt_text) VALUES (?,?,?) "
+                                           "ON CONFLICT (type_id, prompt_name) DO UPDATE SET prompt_text = excluded.prompt_text",
                                            (type_id, prompt_name, prompt_text))
                 
                 elif file_ext == '.plist':
@@ -897,7 +910,7 @@ class PromptCombinerApp:
                         for line in f:
                             fields = line.strip().split('^')
                             if len(fields) == 4:
-                                prompt_type, prompt_name, prompt_text = fields
+                                prompt_type, prompt_name, prompt_text, introduction = fields
                                 
                                 # 如果类型不存在，创建新类型
                                 if prompt_type not in type_map:
@@ -908,8 +921,10 @@ class PromptCombinerApp:
                                     type_id = type_map[prompt_type]
                                 
                                 # 插入提示词
-                                cursor.execute("INSERT INTO prompts (type_id, prompt_name, prompt_text) VALUES (?,?,?)",
-                                               (type_id, prompt_name, prompt_text))
+                                cursor.execute("INSERT INTO prompts (type_id, prompt_name, prompt_text, introduction) VALUES (?,?,?,?) "
+                                               "ON CONFLICT (type_id, prompt_name) DO UPDATE SET "
+                                               "prompt_text = excluded.prompt_text, introduction = excluded.introduction",
+                                               (type_id, prompt_name, prompt_text, introduction))
                 
                 self.conn.commit()
                 self.refresh_crud()
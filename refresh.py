@@ -0,0 +1,98 @@
+"""
+合并的空闲时控件刷新。
+
+修改数据后往往要改写好几个控件（组合框的候选项、状态栏、清空输入框等），每次改写都是一次
+Tcl 调用并触发重绘；导入或批量编辑时同样的改写会重复很多次。RefreshScheduler 只记录控件
+最终应有的值，在事件循环空闲时（after_idle）统一写一次，并跳过没有变化的值，
+所以连续多次更新只产生一次重绘。
+
+- configure: 控件选项，例如组合框的 values、标签的 text。只应通过调度器修改这些选项，
+  调度器记住上次写入的值，相同时不再写入。
+- set_text: 输入框、组合框或 Text 的内容。用户可能已经修改过，刷新时先读取当前内容再比较。
+"""
+import tkinter as tk
+
+import metrics
+
+_flushes = metrics.counter("ui.refresh.flushes")
+_writes = metrics.counter("ui.refresh.writes")
+_skipped = metrics.counter("ui.refresh.skipped")
+
+
+def _get_text(widget):
+    if isinstance(widget, tk.Text):
+        return widget.get("1.0", "end-1c")
+    return widget.get()
+
+
+def _set_text(widget, text):
+    if isinstance(widget, tk.Text):
+        widget.delete("1.0", tk.END)
+        if text:
+            widget.insert("1.0", text)
+    elif hasattr(widget, "set"):
+        # ttk.Combobox
+        widget.set(text)
+    else:
+        widget.delete(0, tk.END)
+        if text:
+            widget.insert(0, text)
+
+
+class RefreshScheduler:
+    """
+    参数:
+    root: Tk 主窗口，用于安排 after_idle。
+    """
+
+    def __init__(self, root):
+        self.root = root
+        # {(控件, 选项或 None): 值}，选项为 None 表示控件内容；按第一次标记的顺序刷新
+        self._dirty = {}
+        # {(控件, 选项): 上次写入的值}
+        self._pushed = {}
+        self._job = None
+
+    def configure(self, widget, option, value):
+        """
+        在空闲时把控件选项 option 设为 value，列表会转换为元组后比较。
+        """
+        if isinstance(value, list):
+            value = tuple(value)
+        self._mark((widget, option), value)
+
+    def set_text(self, widget, text):
+        """
+        在空闲时把控件内容设为 text。
+        """
+        self._mark((widget, None), text)
+
+    def _mark(self, key, value):
+        self._dirty[key] = value
+        if self._job is None:
+            self._job = self.root.after_idle(self.flush)
+
+    def flush(self):
+        """
+        立即写入所有待刷新的值，之后读取控件的代码可以先调用它。
+        """
+        if self._job is not None:
+            self.root.after_cancel(self._job)
+            self._job = None
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        _flushes.inc()
+        for (widget, option), value in dirty.items():
+            if option is None:
+                if _get_text(widget) == value:
+                    _skipped.inc()
+                    continue
+                _set_text(widget, value)
+            else:
+                if self._pushed.get((widget, option)) == value:
+                    _skipped.inc()
+                    continue
+                widget.configure(**{option: value})
+                self._pushed[widget, option] = value
+            _writes.inc()
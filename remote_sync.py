@@ -0,0 +1,200 @@
+"""
+多个远程提示词源的并发同步。
+
+远程源保存在 remote_sources 表中（名称、地址、优先级、是否启用）。同步时在有界线程池中
+同时下载并解析所有启用的源，每个源有独立的超时，总耗时接近最慢的那个源而不是各源之和。
+解析结果按优先级合并：同一类型下的同名提示词取优先级最高的源，优先级相同时按源名称排序，
+结果与下载完成的先后无关。合并后在一个事务中替换整个提示词库。
+"""
+import concurrent.futures
+from collections import namedtuple
+from time import perf_counter_ns
+
+import metrics
+from compressed import open_url
+from library import FIELD_COUNT, UPSERT_PROMPT, clear_prompts, record_import, resume_change_log, timestamp
+
+# 每个源的网络超时（秒）
+DEFAULT_TIMEOUT = 30
+# 同时下载的源数
+MAX_WORKERS = 4
+
+Source = namedtuple("Source", "name url priority")
+
+_fetch_latency = metrics.histogram("sync.fetch_sources")
+_source_errors = metrics.counter("sync.source_errors")
+
+
+class SyncError(Exception):
+    """
+    同步失败，errors 为 {源名称: 异常}。
+    """
+
+    def __init__(self, message, errors):
+        super().__init__(message)
+        self.errors = errors
+
+
+def load_sources(conn, include_disabled=False):
+    """
+    读取远程源，按优先级从高到低、名称升序排列。
+    """
+    query = "SELECT name, url, priority FROM remote_sources"
+    if not include_disabled:
+        query += " WHERE enabled"
+    query += " ORDER BY priority DESC, name"
+    return [Source(*row) for row in conn.execute(query).fetchall()]
+
+
+def list_sources(conn):
+    """
+    返回 [(名称, 地址, 优先级, 是否启用), ...]，供界面列出全部远程源。
+    """
+    return conn.execute(
+        "SELECT name, url, priority, enabled FROM remote_sources ORDER BY priority DESC, name"
+    ).fetchall()
+
+
+def save_source(conn, name, url, priority=0, enabled=True):
+    """
+    新增远程源，名称已存在时更新其地址、优先级和启用状态。
+    """
+    conn.execute('''
+        INSERT INTO remote_sources (name, url, priority, enabled) VALUES (?, ?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET url = excluded.url, priority = excluded.priority, enabled = excluded.enabled
+    ''', (name, url, int(priority), int(bool(enabled))))
+    conn.commit()
+
+
+def delete_source(conn, name):
+    conn.execute("DELETE FROM remote_sources WHERE name = ?", (name,))
+    conn.commit()
+
+
+def parse_plist_text(text):
+    return parse_plist_lines(text.splitlines())
+
+
+def parse_plist_lines(lines):
+    """
+    解析 plist 行，字段数不对的行会被跳过。
+
+    返回值:
+    {(类型名称, 名称): (提示词, 介绍)}，按第一次出现的顺序排列；同一源内重复的条目与导入时相同，取最后一次。
+    """
+    entries = {}
+    for line in lines:
+        fields = line.strip().split('^')
+        if len(fields) != FIELD_COUNT:
+            continue
+        entries[fields[0], fields[1]] = (fields[2], fields[3])
+    return entries
+
+
+def fetch_source(source, timeout=DEFAULT_TIMEOUT):
+    """
+    下载并解析一个源，在线程池的工作线程中执行；压缩的源边下载边解压解析。
+    """
+    response, lines = open_url(source.url, timeout)
+    with response:
+        return parse_plist_lines(lines)
+
+
+def fetch_sources(sources, timeout=DEFAULT_TIMEOUT, max_workers=MAX_WORKERS):
+    """
+    并发下载并解析多个源。
+
+    返回值:
+    (results, errors)
+    - results: {源名称: parse_plist_lines 的结果}
+    - errors: {源名称: 异常}
+    """
+    results = {}
+    errors = {}
+    if not sources:
+        return results, errors
+    start = perf_counter_ns()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(sources))) as executor:
+        futures = {executor.submit(fetch_source, source, timeout): source for source in sources}
+        for future in concurrent.futures.as_completed(futures):
+            source = futures[future]
+            try:
+                results[source.name] = future.result()
+            except Exception as e:
+                errors[source.name] = e
+    _source_errors.inc(len(errors))
+    _fetch_latency.record(perf_counter_ns() - start)
+    return results, errors
+
+
+def merge_sources(sources, results):
+    """
+    按优先级合并各源的解析结果，缺少结果的源被忽略。
+
+    优先级高的源先写入，之后的源只补充尚不存在的条目；优先级相同时按名称排序。
+    条目的顺序为优先级最高的源中的顺序，其后依次是其他源新增的条目。
+
+    返回值:
+    {(类型名称, 名称): (提示词, 介绍)}
+    """
+    merged = {}
+    for source in sorted(sources, key=lambda s: (-s.priority, s.name)):
+        entries = results.get(source.name)
+        if not entries:
+            continue
+        for key, value in entries.items():
+            if key not in merged:
+                merged[key] = value
+    return merged
+
+
+def write_library(conn, merged):
+    """
+    在一个事务中用合并结果替换整个提示词库，失败时回滚，原有数据不受影响。
+
+    返回值:
+    写入的提示词条数。
+    """
+    start = perf_counter_ns()
+    updated_at = timestamp()
+    cursor = conn.cursor()
+    try:
+        clear_prompts(cursor)
+        type_ids = {}
+        for type_name, _ in merged:
+            if type_name not in type_ids:
+                cursor.execute("INSERT INTO prompt_types (type_name) VALUES (?)", (type_name,))
+                type_ids[type_name] = cursor.lastrowid
+        cursor.executemany(
+            UPSERT_PROMPT,
+            ((type_ids[type_name], prompt_name, prompt_text, introduction, updated_at)
+             for (type_name, prompt_name), (prompt_text, introduction) in merged.items())
+        )
+        resume_change_log(cursor)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    record_import(len(merged), start)
+    return len(merged)
+
+
+def sync_sources(conn, sources, timeout=DEFAULT_TIMEOUT, max_workers=MAX_WORKERS, allow_partial=False):
+    """
+    下载、合并并写入多个源。
+
+    参数:
+    conn: 数据库连接，只在调用线程中使用。
+    sources: Source 列表。
+    allow_partial: 为 False 时任一源失败都不写入；为 True 时只要有源成功就用成功的源替换提示词库。
+
+    返回值:
+    (写入的条数, errors)
+    """
+    results, errors = fetch_sources(sources, timeout, max_workers)
+    if not results or (errors and not allow_partial):
+        names = ", ".join(sorted(errors)) or "无可用的源"
+        raise SyncError(f"同步失败: {names}", errors)
+    return write_library(conn, merge_sources(sources, results)), errors
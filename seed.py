@@ -0,0 +1,148 @@
+"""
+预置的种子数据库。
+
+打包时从 default.plist 生成一个已导入、已 VACUUM 的 seed.db 随程序分发，
+首次运行时直接复制为用户的 prompts.db，不必再逐行解析 plist。
+种子中记录了源 plist 的 sha256，check 命令会在种子过期时失败。
+
+命令行用法:
+    python seed.py build [--plist default.plist] [--output seed.db]
+    python seed.py check [--plist default.plist] [--seed seed.db]
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import sqlite3
+import sys
+
+from changelog import reset_station
+from library import import_plist_file
+from migrations import migrate
+
+SEED_NAME = "seed.db"
+SOURCE_NAME = "default.plist"
+
+
+class SeedError(Exception):
+    pass
+
+
+def bundled_path(name):
+    """
+    返回随程序分发的文件路径，兼容 PyInstaller 打包后的临时目录。
+    """
+    base = getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base, name)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_seed(plist_path, seed_path):
+    """
+    从 plist 生成种子数据库，返回导入的提示词条数。
+
+    先写到临时文件，完成后再替换 seed_path，中途失败不会留下不完整的种子。
+    """
+    temp_path = seed_path + ".tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    conn = sqlite3.connect(temp_path)
+    try:
+        migrate(conn)
+        count = import_plist_file(conn, plist_path)
+        conn.execute("CREATE TABLE seed_info (key TEXT PRIMARY KEY, value TEXT)")
+        conn.executemany("INSERT INTO seed_info (key, value) VALUES (?, ?)", [
+            ("source_sha256", file_sha256(plist_path)),
+            ("prompt_count", str(count)),
+        ])
+        conn.commit()
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    os.replace(temp_path, seed_path)
+    return count
+
+
+def read_seed_info(seed_path):
+    if not os.path.exists(seed_path):
+        raise SeedError(f"种子数据库不存在: {seed_path}")
+    conn = sqlite3.connect(f"file:{seed_path}?mode=ro", uri=True)
+    try:
+        return dict(conn.execute("SELECT key, value FROM seed_info").fetchall())
+    except sqlite3.DatabaseError as e:
+        raise SeedError(f"无法读取种子信息: {e}")
+    finally:
+        conn.close()
+
+
+def check_seed(plist_path, seed_path):
+    """
+    检查种子数据库是否由当前的 plist 生成，不一致时抛出 SeedError。
+    """
+    info = read_seed_info(seed_path)
+    expected = file_sha256(plist_path)
+    if info.get("source_sha256") != expected:
+        raise SeedError(
+            f"种子数据库已过期: {seed_path} 由 sha256={info.get('source_sha256')} 生成，"
+            f"当前 {plist_path} 为 sha256={expected}，请重新运行 python seed.py build"
+        )
+    return info
+
+
+def install_seed(db_path, seed_path=None):
+    """
+    首次运行时把种子数据库复制为 db_path。
+
+    仅在 db_path 不存在（或为空文件）且找到种子时复制，返回是否复制了种子。
+    种子中的本机标识是生成种子时的，复制后重新分配，每次安装的标识都不同。
+    """
+    if os.path.exists(db_path) and os.path.getsize(db_path) > 0:
+        return False
+    seed_path = seed_path or bundled_path(SEED_NAME)
+    if not os.path.exists(seed_path):
+        return False
+    temp_path = db_path + ".tmp"
+    shutil.copyfile(seed_path, temp_path)
+    conn = sqlite3.connect(temp_path)
+    try:
+        conn.execute("DROP TABLE IF EXISTS seed_info")
+        conn.commit()
+        # 旧版本生成的种子先升级到最新结构，再分配新的标识
+        migrate(conn)
+        reset_station(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(temp_path, db_path)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成或检查种子数据库")
+    parser.add_argument("command", choices=["build", "check"])
+    parser.add_argument("--plist", default=bundled_path(SOURCE_NAME), help="源 plist 文件")
+    parser.add_argument("--output", "--seed", dest="seed", default=bundled_path(SEED_NAME), help="种子数据库路径")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        count = build_seed(args.plist, args.seed)
+        print(f"已生成 {args.seed}，共 {count} 条提示词")
+        return 0
+    try:
+        info = check_seed(args.plist, args.seed)
+    except SeedError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+    print(f"{args.seed} 与 {args.plist} 一致，共 {info.get('prompt_count')} 条提示词")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""
+可选的 SQL 跟踪和慢查询日志。
+
+设置环境变量 PROMPTS_SQL_TRACE 后，connect 返回带计时的连接:
+- 每条语句记录耗时、所属的界面操作和 SQL，写入 PROMPTS_SQL_TRACE 指定的文件
+  （值为 "1" 或 "-" 时写到标准错误）；
+- 超过 PROMPTS_SQL_SLOW_MS（默认 50 毫秒）的语句附带 EXPLAIN QUERY PLAN；
+- 程序退出时按界面操作汇总语句条数，并列出同一操作内重复执行最多的语句，
+  逐行查询（N+1）之类的模式一眼就能看出来。
+
+计时包在 Cursor.execute / executemany 外面，SELECT 只计到返回第一行为止；
+set_trace_callback 另外统计 SQLite 实际执行的每条语句，包括隐式的 BEGIN/COMMIT。
+未设置环境变量时 connect 等同于 sqlite3.connect，没有任何额外开销。
+"""
+import atexit
+import os
+import sqlite3
+import sys
+import threading
+from collections import Counter, defaultdict
+from time import perf_counter_ns
+
+import metrics
+
+TRACE_ENV = "PROMPTS_SQL_TRACE"
+SLOW_ENV = "PROMPTS_SQL_SLOW_MS"
+DEFAULT_SLOW_MS = 50.0
+# 汇总时每个操作列出的重复语句条数
+SUMMARY_TOP = 5
+# 只对这些语句执行 EXPLAIN QUERY PLAN
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+_NO_ACTION = "(无)"
+
+
+def _one_line(sql):
+    return " ".join(sql.split())
+
+
+class Tracer:
+    """
+    收集语句耗时和按操作的统计，写出日志。
+
+    参数:
+    out: 可写的文本流。
+    slow_ms: 慢查询阈值（毫秒）。
+    """
+
+    def __init__(self, out, slow_ms=DEFAULT_SLOW_MS):
+        self.out = out
+        self.slow_ns = int(slow_ms * 1e6)
+        self.lock = threading.Lock()
+        # {操作: Counter(SQL 模板)}，SQL 模板为未展开参数的原始语句
+        self.statements = defaultdict(Counter)
+        # {操作: SQLite 实际执行的语句数}
+        self.executed = Counter()
+        self.slow = 0
+        self._count = metrics.counter("sql.statements")
+        self._latency = metrics.histogram("sql.duration")
+
+    def record(self, conn, sql, params, elapsed, many=False):
+        action = metrics.current_action() or _NO_ACTION
+        self._count.inc()
+        self._latency.record(elapsed)
+        with self.lock:
+            self.statements[action][_one_line(sql)] += 1
+            self.out.write(f"{elapsed / 1e6:10.3f} ms  [{action}] {'(many) ' if many else ''}{_one_line(sql)}\n")
+            if elapsed >= self.slow_ns:
+                self.slow += 1
+                self.out.write(f"    慢查询 (>= {self.slow_ns / 1e6:g} ms)\n")
+                for line in self.explain(conn, sql, params):
+                    self.out.write(f"    {line}\n")
+
+    def explain(self, conn, sql, params):
+        if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+            return []
+        try:
+            cursor = sqlite3.Connection.cursor(conn)
+            try:
+                rows = cursor.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+            finally:
+                cursor.close()
+        except sqlite3.Error as e:
+            return [f"EXPLAIN 失败: {e}"]
+        return [f"- {row[-1]}" for row in rows]
+
+    def on_statement(self, sql):
+        # set_trace_callback 的回调，统计 SQLite 实际执行的语句
+        self.executed[metrics.current_action() or _NO_ACTION] += 1
+
+    def summary(self):
+        """
+        返回按操作汇总的文本：语句条数、实际执行条数和重复最多的语句。
+        """
+        lines = ["SQL 汇总（按界面操作）:"]
+        invocations = {
+            name[3:]: metric.count for name, metric in metrics.REGISTRY.metrics.items()
+            if name.startswith("ui.") and getattr(metric, "kind", None) == "histogram"
+        }
+        with self.lock:
+            for action, statements in sorted(self.statements.items(), key=lambda item: -sum(item[1].values())):
+                total = sum(statements.values())
+                calls = invocations.get(action) or 1
+                lines.append(
+                    f"  {action}: {total} 条语句（SQLite 执行 {self.executed[action]} 条），"
+                    f"调用 {calls} 次，平均每次 {total / calls:.1f} 条"
+                )
+                for sql, count in statements.most_common(SUMMARY_TOP):
+                    lines.append(f"    {count:8d} x {sql}")
+            lines.append(f"  慢查询: {self.slow} 条")
+        return "\n".join(lines)
+
+    def close(self):
+        self.out.write(self.summary() + "\n")
+        self.out.flush()
+        if self.out is not sys.stderr:
+            self.out.close()
+
+
+class TracingCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        start = perf_counter_ns()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.connection.tracer.record(self.connection, sql, parameters, perf_counter_ns() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        # 参数可能是生成器，只记录第一组供 EXPLAIN 使用
+        first = []
+
+        def remember(rows):
+            for row in rows:
+                if not first:
+                    first.append(row)
+                yield row
+
+        start = perf_counter_ns()
+        try:
+            return super().executemany(sql, remember(seq_of_parameters))
+        finally:
+            self.connection.tracer.record(
+                self.connection, sql, first[0] if first else (), perf_counter_ns() - start, many=True
+            )
+
+
+class TracingConnection(sqlite3.Connection):
+    tracer = None
+
+    def cursor(self, factory=TracingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+_tracer = None
+
+
+def get_tracer():
+    """
+    按环境变量创建全局的 Tracer，未开启跟踪时返回 None。
+    """
+    global _tracer
+    target = os.environ.get(TRACE_ENV)
+    if not target:
+        return None
+    if _tracer is None:
+        try:
+            slow_ms = float(os.environ.get(SLOW_ENV, DEFAULT_SLOW_MS))
+        except ValueError:
+            slow_ms = DEFAULT_SLOW_MS
+        out = sys.stderr if target in ("1", "-") else open(target, "a", encoding="utf-8")
+        _tracer = Tracer(out, slow_ms)
+        atexit.register(_tracer.close)
+    return _tracer
+
+
+def connect(path, **kwargs):
+    """
+    打开数据库；开启跟踪时返回 TracingConnection，否则与 sqlite3.connect 相同。
+    """
+    tracer = get_tracer()
+    if tracer is None:
+        return sqlite3.connect(path, **kwargs)
+    conn = sqlite3.connect(path, factory=TracingConnection, **kwargs)
+    conn.tracer = tracer
+    conn.set_trace_callback(tracer.on_statement)
+    return conn
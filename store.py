@@ -0,0 +1,348 @@
+"""
+提示词库的紧凑内存表示。
+
+每个类型的提示词按列存放：id 放在 array 中，名称、提示词和介绍各自拼接成一个长字符串，
+另用 array 记录每条的起止偏移。与 {名称: (id, 提示词, 介绍)} 的字典相比，
+不再为每条提示词保存元组、独立字符串和字典项，占用的内存和 GC 扫描量都小得多。
+PromptColumns 实现只读 Mapping 接口，界面代码可以照旧按名称取 (id, 提示词, 介绍)。
+
+PromptStore 在此基础上按类型懒加载：启动时只读类型名称，与提示词总数无关。
+"""
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from collections.abc import ItemsView, Mapping
+from itertools import accumulate
+from time import perf_counter_ns
+
+import metrics
+
+
+def _pack(strings):
+    """
+    把字符串序列拼接为 (长字符串, 偏移数组)，第 i 条为 buffer[offsets[i]:offsets[i + 1]]，
+    None 视为空字符串。
+    """
+    if None in strings:
+        strings = [s or "" for s in strings]
+    return "".join(strings), array('I', accumulate(map(len, strings), initial=0))
+
+
+class _ColumnItems(ItemsView):
+    # 按位置顺序遍历，避免每个名称都走一次名称索引
+    def __iter__(self):
+        columns = self._mapping
+        for i in range(len(columns)):
+            yield columns.name_at(i), columns.row_at(i)
+
+
+class PromptColumns(Mapping):
+    """
+    单个类型下的提示词，按名称映射到 (id, 提示词, 介绍)。
+
+    名称到位置的索引在第一次按名称查找时才建立，只浏览列表时不会产生。
+    """
+
+    __slots__ = ('ids', '_names', '_name_offsets', '_texts', '_text_offsets',
+                 '_intros', '_intro_offsets', '_index')
+
+    def __init__(self, ids, names, texts, intros):
+        """
+        参数:
+        ids, names, texts, intros: 等长的序列，名称重复时与字典相同：位置取第一次出现，值取最后一次。
+        """
+        if len(set(names)) != len(names):
+            ids, names, texts, intros = list(ids), list(names), list(texts), list(intros)
+            positions = {}
+            for i, name in enumerate(names):
+                first = positions.setdefault(name, i)
+                if first != i:
+                    ids[first], texts[first], intros[first] = ids[i], texts[i], intros[i]
+                    ids[i] = None
+            keep = [i for i, prompt_id in enumerate(ids) if prompt_id is not None]
+            ids = [ids[i] for i in keep]
+            names = [names[i] for i in keep]
+            texts = [texts[i] for i in keep]
+            intros = [intros[i] for i in keep]
+
+        self.ids = array('q', ids)
+        self._names, self._name_offsets = _pack(names)
+        self._texts, self._text_offsets = _pack(texts)
+        self._intros, self._intro_offsets = _pack(intros)
+        self._index = None
+
+    def name_at(self, i):
+        offsets = self._name_offsets
+        return self._names[offsets[i]:offsets[i + 1]]
+
+    def text_at(self, i):
+        offsets = self._text_offsets
+        return self._texts[offsets[i]:offsets[i + 1]]
+
+    def introduction_at(self, i):
+        offsets = self._intro_offsets
+        return self._intros[offsets[i]:offsets[i + 1]]
+
+    def row_at(self, i):
+        return self.ids[i], self.text_at(i), self.introduction_at(i)
+
+    def _position(self, name):
+        if self._index is None:
+            self._index = {self.name_at(i): i for i in range(len(self.ids))}
+        return self._index.get(name)
+
+    def __getitem__(self, name):
+        i = self._position(name)
+        if i is None:
+            raise KeyError(name)
+        return self.row_at(i)
+
+    def __contains__(self, name):
+        return self._position(name) is not None
+
+    def __iter__(self):
+        for i in range(len(self.ids)):
+            yield self.name_at(i)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def items(self):
+        return _ColumnItems(self)
+
+    def find(self, words):
+        """
+        返回名称、提示词或介绍中包含全部 words 的位置列表（按顺序）。
+
+        words 应为不含空白的小写字符串。每列只整体转换一次小写，
+        再在拼接后的长字符串上用 str.find 查找，不逐条构造字符串。
+        """
+        if not words or not self.ids:
+            return []
+        found = [set() for _ in words]
+        columns = (
+            (self._names, self._name_offsets),
+            (self._texts, self._text_offsets),
+            (self._intros, self._intro_offsets),
+        )
+        for buffer, offsets in columns:
+            lowered = buffer.lower()
+            if len(lowered) != len(buffer):
+                # 少数字符转小写后长度会变，偏移失效，只能逐条比较
+                for i in range(len(self.ids)):
+                    value = buffer[offsets[i]:offsets[i + 1]].lower()
+                    for rows, word in zip(found, words):
+                        if word in value:
+                            rows.add(i)
+                continue
+            for rows, word in zip(found, words):
+                start = lowered.find(word)
+                while start != -1:
+                    i = bisect_right(offsets, start) - 1
+                    end = offsets[i + 1]
+                    if start + len(word) <= end:
+                        # 命中在第 i 条之内，跳到下一条继续查找
+                        rows.add(i)
+                        start = lowered.find(word, end)
+                    else:
+                        start = lowered.find(word, start + 1)
+        return sorted(set.intersection(*found))
+
+
+def build_prompt_store(types, prompts):
+    """
+    构建与 prompt_type_dict 相同结构的字典，每个类型的 'prompts' 为 PromptColumns。
+
+    参数:
+    types: 可迭代的 (类型ID, 类型名称)。
+    prompts: 可迭代的 (id, 类型ID, 名称, 提示词, 介绍)，例如数据库游标。
+
+    返回值:
+    {类型名称: {'id': 类型ID, 'prompts': PromptColumns}}
+    """
+    columns = {}
+    names = []
+    for type_id, type_name in types:
+        columns[type_id] = ([], [], [], [])
+        names.append((type_name, type_id))
+    for prompt_id, type_id, prompt_name, prompt_text, introduction in prompts:
+        lists = columns.get(type_id)
+        if lists is not None:
+            lists[0].append(prompt_id)
+            lists[1].append(prompt_name)
+            lists[2].append(prompt_text)
+            lists[3].append(introduction)
+    store = {}
+    for type_name, type_id in names:
+        store[type_name] = {
+            'id': type_id,
+            'prompts': PromptColumns(*columns.pop(type_id))
+        }
+    return store
+
+
+# 最多缓存提示词的类型数
+CACHE_TYPES = 16
+
+_cache_hits = metrics.counter("store.cache.hit")
+_cache_misses = metrics.counter("store.cache.miss")
+_cached_types = metrics.gauge("store.cache.types")
+_load_latency = metrics.histogram("db.load_type")
+_count_latency = metrics.histogram("db.count")
+_search_latency = metrics.histogram("db.search")
+
+
+class TypeEntry(Mapping):
+    """
+    类型条目，键为 'id'、'count' 和 'prompts'，访问 'count' 和 'prompts' 时才从数据库读取。
+    """
+
+    __slots__ = ('store', 'id')
+
+    _KEYS = ('id', 'count', 'prompts')
+
+    def __init__(self, store, type_id):
+        self.store = store
+        self.id = type_id
+
+    def __getitem__(self, key):
+        if key == 'id':
+            return self.id
+        if key == 'count':
+            return self.store.count(self.id)
+        if key == 'prompts':
+            return self.store.prompts(self.id)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._KEYS)
+
+    def __len__(self):
+        return len(self._KEYS)
+
+
+class PromptStore(Mapping):
+    """
+    按需加载的提示词库，结构与 prompt_type_dict 相同：{类型名称: {'id', 'count', 'prompts'}}。
+
+    reload 只读取类型名称，耗时与提示词总数无关；某个类型的条数和提示词在第一次访问时
+    按 type_id 索引读取，提示词放入容量为 capacity 的 LRU 缓存。写入数据库后调用
+    invalidate 丢弃对应类型的缓存。
+    """
+
+    def __init__(self, conn, capacity=CACHE_TYPES):
+        self.conn = conn
+        self.capacity = capacity
+        self._types = {}
+        self._counts = {}
+        self._cache = OrderedDict()
+
+    def reload(self):
+        """
+        重新读取类型名称。仍然存在的类型保留已缓存的条数和提示词，
+        已删除的类型（包括整库导入后被替换的类型）从缓存中移除。
+        """
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("SELECT id, type_name FROM prompt_types")
+            self._types = {type_name: TypeEntry(self, type_id) for type_id, type_name in cursor.fetchall()}
+        finally:
+            cursor.close()
+        type_ids = {entry.id for entry in self._types.values()}
+        for type_id in [t for t in self._cache if t not in type_ids]:
+            del self._cache[type_id]
+        for type_id in [t for t in self._counts if t not in type_ids]:
+            del self._counts[type_id]
+
+    def count(self, type_id):
+        """
+        返回类型下的提示词条数，已加载的类型直接取缓存的长度。
+        """
+        columns = self._cache.get(type_id)
+        if columns is not None:
+            return len(columns)
+        count = self._counts.get(type_id)
+        if count is None:
+            start = perf_counter_ns()
+            count = self.conn.execute("SELECT COUNT(*) FROM prompts WHERE type_id = ?", (type_id,)).fetchone()[0]
+            _count_latency.record(perf_counter_ns() - start)
+            self._counts[type_id] = count
+        return count
+
+    def prompts(self, type_id):
+        """
+        返回类型的 PromptColumns，未缓存时从数据库读取。
+        """
+        columns = self._cache.get(type_id)
+        if columns is not None:
+            _cache_hits.inc()
+            self._cache.move_to_end(type_id)
+            return columns
+        _cache_misses.inc()
+        start = perf_counter_ns()
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(
+                "SELECT id, prompt_name, prompt_text, introduction FROM prompts WHERE type_id = ? ORDER BY id",
+                (type_id,)
+            )
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+        columns = PromptColumns(*zip(*rows)) if rows else PromptColumns((), (), (), ())
+        self._cache[type_id] = columns
+        while len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+        _cached_types.set(len(self._cache))
+        _load_latency.record(perf_counter_ns() - start)
+        return columns
+
+    def invalidate(self, type_id=None):
+        """
+        丢弃 type_id 的缓存，type_id 为 None 时清空全部缓存。
+        """
+        if type_id is None:
+            self._cache.clear()
+            self._counts.clear()
+        else:
+            self._cache.pop(type_id, None)
+            self._counts.pop(type_id, None)
+
+    def search(self, words, limit=None):
+        """
+        在数据库中搜索名称、提示词或介绍包含全部 words（小写）的提示词，不加载任何类型。
+
+        返回值:
+        [(类型名称, 名称, 提示词, 介绍), ...]，按类型和提示词的 id 排序。
+        """
+        # LIKE 本身对 ASCII 不区分大小写，比先 lower() 再查找快得多；
+        # CROSS JOIN 让 prompts 顺序扫描，而不是按类型逐条回表，命中的行再排序
+        condition = "(p.prompt_name LIKE ? ESCAPE '\\' OR p.prompt_text LIKE ? ESCAPE '\\' OR p.introduction LIKE ? ESCAPE '\\')"
+        conditions = " AND ".join([condition] * len(words))
+        params = []
+        for word in words:
+            pattern = "%" + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            params += [pattern] * 3
+        start = perf_counter_ns()
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(f'''
+                SELECT t.type_name, p.prompt_name, ifnull(p.prompt_text, ''), ifnull(p.introduction, '')
+                FROM prompts p CROSS JOIN prompt_types t ON p.type_id = t.id
+                WHERE {conditions}
+                ORDER BY t.id, p.id
+                LIMIT ?
+            ''', (*params, -1 if limit is None else limit))
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+            _search_latency.record(perf_counter_ns() - start)
+
+    def __getitem__(self, type_name):
+        return self._types[type_name]
+
+    def __iter__(self):
+        return iter(self._types)
+
+    def __len__(self):
+        return len(self._types)
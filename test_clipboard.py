@@ -0,0 +1,50 @@
+from clipboard import ClipboardHistory
+
+
+class FakeRoot:
+    """
+    代替 Tk 主窗口，只记录剪贴板内容。
+    """
+
+    def __init__(self):
+        self.clipboard = ""
+
+    def clipboard_clear(self):
+        self.clipboard = ""
+
+    def clipboard_append(self, text):
+        self.clipboard += text
+
+    def after(self, ms, func):
+        return "job"
+
+    def after_cancel(self, job):
+        pass
+
+
+def test_history_stays_bounded():
+    root = FakeRoot()
+    history = ClipboardHistory(root, size=50)
+    for i in range(10000):
+        history.copy(f"prompt {i}", label=str(i))
+        assert len(history.entries) <= 50
+    assert len(history.entries) == 50
+    assert root.clipboard == "prompt 9999"
+    assert [entry["text"] for entry in history.entries][:2] == ["prompt 9999", "prompt 9998"]
+    assert history.entries[-1]["text"] == "prompt 9950"
+
+
+def test_repeated_copy_moves_to_front():
+    history = ClipboardHistory(FakeRoot(), size=3)
+    for text in ("a", "b", "c", "a"):
+        history.copy(text)
+    assert [entry["text"] for entry in history.entries] == ["a", "c", "b"]
+
+
+def test_load_truncates_to_size(tmp_path):
+    path = str(tmp_path / "history.json")
+    history = ClipboardHistory(FakeRoot(), path, size=100)
+    for i in range(100):
+        history.copy(str(i))
+    history.flush()
+    assert len(ClipboardHistory(FakeRoot(), path, size=10).entries) == 10
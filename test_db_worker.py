@@ -0,0 +1,50 @@
+import threading
+
+from db_worker import DBWorker
+
+
+class FakeRoot:
+    """
+    代替 Tk 主窗口：after 只记下回调，由测试手动驱动轮询。
+    """
+
+    def __init__(self):
+        self.pending = []
+        self.reported = []
+
+    def after(self, ms, func):
+        self.pending.append(func)
+
+    def report_callback_exception(self, exc, value, tb):
+        self.reported.append(value)
+
+    def run_until(self, condition, limit=1000):
+        for _ in range(limit):
+            if condition():
+                return
+            if self.pending:
+                self.pending.pop(0)()
+            # 给写线程执行操作的时间
+            threading.Event().wait(0.005)
+        raise AssertionError("回调没有被调用")
+
+
+def test_raising_callback_does_not_stop_polling(tmp_path):
+    root = FakeRoot()
+    worker = DBWorker(root, str(tmp_path / "worker.db"))
+    results = []
+    try:
+        def broken(result):
+            raise RuntimeError("控件已销毁")
+
+        worker.run(lambda conn: 1, callback=broken).result()
+        root.run_until(lambda: root.reported)
+        assert isinstance(root.reported[0], RuntimeError)
+
+        worker.run(lambda conn: 2, callback=results.append)
+        worker.run(lambda conn: 1 / 0, errback=results.append)
+        root.run_until(lambda: len(results) == 2)
+        assert results[0] == 2
+        assert isinstance(results[1], ZeroDivisionError)
+    finally:
+        worker.close()
@@ -0,0 +1,77 @@
+import random
+import sqlite3
+
+import pytest
+
+import dedupe
+from dedupe import find_duplicate_clusters, load_rows, merge_prompts
+from migrations import migrate
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:", isolation_level="")
+    migrate(conn)
+    return conn
+
+
+def add(conn, type_name, name, text, introduction=""):
+    conn.execute("INSERT OR IGNORE INTO prompt_types (type_name) VALUES (?)", (type_name,))
+    type_id = conn.execute("SELECT id FROM prompt_types WHERE type_name = ?", (type_name,)).fetchone()[0]
+    cursor = conn.execute(
+        "INSERT INTO prompts (type_id, prompt_name, prompt_text, introduction) VALUES (?, ?, ?, ?)",
+        (type_id, name, text, introduction)
+    )
+    conn.commit()
+    return cursor.lastrowid
+
+
+def test_clusters_only_contain_one_type(conn):
+    a = add(conn, "背景", "玻璃", "through glass/against glass")
+    b = add(conn, "背景", "玻璃2", "Against Glass/through glass/through glass")
+    c = add(conn, "动作", "玻璃", "through glass")
+    clusters, capped = find_duplicate_clusters(load_rows(conn))
+    assert capped == 0
+    assert [[row[0] for row in cluster] for cluster in clusters] == [[a, b]]
+    assert c not in {row[0] for cluster in clusters for row in cluster}
+
+
+def test_capped_sets_are_counted():
+    rng = random.Random(0)
+    common = [f"w{i}" for i in range(8)]
+    # 大量彼此有重叠但达不到阈值的集合落进同一批桶
+    rows = [(i, "t", f"n{i}", " ".join(common + [f"x{rng.randrange(10 ** 6)}" for _ in range(2)]))
+            for i in range(200)]
+    report = find_duplicate_clusters(rows, threshold=0.99)
+    assert report.clusters == []
+    assert report.capped > 0
+    assert report.capped <= len(rows) - dedupe.BUCKET_REPRESENTATIVES
+
+
+def test_merge_prompts_within_type(conn):
+    keep = add(conn, "背景", "玻璃", "through glass", "透过玻璃")
+    drop = add(conn, "背景", "玻璃2", "Through Glass/against glass", "贴着玻璃")
+    assert merge_prompts(conn, keep, [drop]) == "through glass/against glass"
+    assert conn.execute("SELECT id, introduction FROM prompts").fetchall() == [(keep, "透过玻璃；贴着玻璃")]
+
+
+def test_merge_prompts_rejects_other_types(conn):
+    keep = add(conn, "背景", "玻璃", "through glass")
+    other = add(conn, "动作", "玻璃", "through glass")
+    with pytest.raises(ValueError):
+        merge_prompts(conn, keep, [other])
+    assert conn.execute("SELECT COUNT(*) FROM prompts").fetchone()[0] == 2
+
+
+def test_other_type_center_does_not_shadow_same_type_duplicate():
+    words = [f"w2_{i}" for i in range(8)]
+    rows = [
+        # 两个中心彼此不相似（Jaccard 0.25），第三条与两者都相似（0.625）
+        (1, "动作", "x", " ".join(words[:5])),
+        (2, "服装", "y", " ".join(words[3:])),
+        (3, "服装", "z", " ".join(words)),
+    ]
+    # 不区分类型分桶时第三条先遇到另一类型的中心，与同类型的重复条目失之交臂
+    clusters, capped = find_duplicate_clusters(rows)
+    assert capped == 0
+    assert [[row[0] for row in cluster] for cluster in clusters] == [[2, 3]]
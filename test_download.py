@@ -0,0 +1,211 @@
+import gzip
+import hashlib
+import os
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import pytest
+
+import download
+from download import ChecksumError, DownloadError, checksum_url, download as fetch, fetch_checksum
+
+PAYLOAD = random.Random(0).randbytes(300 * 1024)
+SHA256 = hashlib.sha256(PAYLOAD).hexdigest()
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    按 server.mode 模拟不同的服务器:
+    - drop: 前 server.drops 次响应只发送一部分正文就断开连接；
+    - ignore_range: 忽略 Range，总是返回 200 和完整文件；
+    - gzip: 没有 Range 时以 Content-Encoding: gzip 传输，前 server.drops 次只发送一部分；
+    - br: 总是以不支持的 Content-Encoding: br 响应；
+    - 其他: 正常支持 Range，超出文件长度时返回 416。
+    server.sidecar 为校验文件的状态码，默认 200。
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.paths.append(self.path)
+        if urlsplit(self.path).path.endswith(".sha256"):
+            if server.sidecar != 200:
+                self.send_error(server.sidecar)
+                return
+            body = f"{SHA256}  library.plist\n".encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        server.requests.append(self.headers.get("Range"))
+        server.encodings.append(self.headers.get("Accept-Encoding"))
+        if server.mode == "br" or (server.mode == "gzip" and not self.headers.get("Range")):
+            body = gzip.compress(PAYLOAD) if server.mode == "gzip" else PAYLOAD
+            self.send_response(200)
+            self.send_header("Content-Encoding", server.mode)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", '"v1-gzip"')
+            self.end_headers()
+            if server.drops > 0:
+                server.drops -= 1
+                body = body[:len(body) // 2]
+                self.close_connection = True
+            self.wfile.write(body)
+            return
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and server.mode != "ignore_range":
+            start = int(range_header.split("=", 1)[1].split("-", 1)[0])
+            if start >= len(PAYLOAD):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(PAYLOAD)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(PAYLOAD) - 1}/{len(PAYLOAD)}")
+        else:
+            self.send_response(200)
+        body = PAYLOAD[start:]
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", '"v1"')
+        self.end_headers()
+        if server.mode == "drop" and server.drops > 0:
+            # 声明了完整长度，只发送一部分就断开
+            server.drops -= 1
+            self.wfile.write(body[:len(body) // 3])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(download, "RETRY_DELAY", 0)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.mode = "normal"
+    httpd.drops = 0
+    httpd.requests = []
+    httpd.encodings = []
+    httpd.paths = []
+    httpd.sidecar = 200
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/library.plist"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_resumes_after_dropped_connections(server, tmp_path):
+    server.mode = "drop"
+    server.drops = 3
+    target = str(tmp_path / "library.plist")
+
+    assert fetch(server.url, target, sha256=SHA256) == SHA256
+
+    with open(target, "rb") as f:
+        assert hashlib.sha256(f.read()).hexdigest() == SHA256
+    assert not os.path.exists(target + download.PART_SUFFIX)
+    # 第一次请求完整文件，之后每次从已下载的位置续传
+    assert server.requests[0] is None
+    assert len(server.requests) == 4
+    assert all(r and r.startswith("bytes=") for r in server.requests[1:])
+
+
+def test_restarts_when_server_ignores_range(server, tmp_path):
+    server.mode = "ignore_range"
+    target = str(tmp_path / "library.plist")
+    with open(target + download.PART_SUFFIX, "wb") as f:
+        f.write(PAYLOAD[:1000])
+
+    assert fetch(server.url, target, sha256=SHA256) == SHA256
+
+    assert server.requests == ["bytes=1000-"]
+    with open(target, "rb") as f:
+        assert f.read() == PAYLOAD
+
+
+def test_restarts_after_416(server, tmp_path):
+    # 残留的 .part 比服务器上的文件还长（文件已变化）
+    target = str(tmp_path / "library.plist")
+    with open(target + download.PART_SUFFIX, "wb") as f:
+        f.write(b"x" * (len(PAYLOAD) + 10))
+
+    assert fetch(server.url, target, sha256=SHA256) == SHA256
+
+    assert server.requests == [f"bytes={len(PAYLOAD) + 10}-", None]
+    with open(target, "rb") as f:
+        assert f.read() == PAYLOAD
+
+
+def test_checksum_mismatch_discards_download(server, tmp_path):
+    target = str(tmp_path / "library.plist")
+    with pytest.raises(ChecksumError):
+        fetch(server.url, target, sha256="0" * 64)
+    assert not os.path.exists(target)
+    assert not os.path.exists(target + download.PART_SUFFIX)
+
+
+def test_fetch_checksum_reads_sidecar(server):
+    assert fetch_checksum(server.url) == SHA256
+
+
+def test_gzip_content_encoding_is_decoded(server, tmp_path):
+    server.mode = "gzip"
+    target = str(tmp_path / "library.plist")
+
+    assert fetch(server.url, target, sha256=SHA256) == SHA256
+
+    assert server.encodings == ["gzip"]
+    with open(target, "rb") as f:
+        assert f.read() == PAYLOAD
+
+
+def test_interrupted_gzip_transfer_resumes_as_identity(server, tmp_path):
+    server.mode = "gzip"
+    server.drops = 1
+    target = str(tmp_path / "library.plist")
+
+    assert fetch(server.url, target, sha256=SHA256) == SHA256
+
+    # 写入的是解压后的内容，续传时按 identity 编码请求剩余部分
+    assert server.requests[0] is None and server.requests[1].startswith("bytes=")
+    assert server.encodings == ["gzip", "identity"]
+    with open(target, "rb") as f:
+        assert f.read() == PAYLOAD
+
+
+def test_unsupported_content_encoding_is_rejected(server, tmp_path):
+    server.mode = "br"
+    target = str(tmp_path / "library.plist")
+    with pytest.raises(DownloadError):
+        fetch(server.url, target)
+    assert not os.path.exists(target)
+
+
+def test_checksum_url_keeps_query():
+    assert checksum_url("http://h/a/library.plist?encoding=gzip&t=1") == "http://h/a/library.plist.sha256?encoding=gzip&t=1"
+
+
+def test_fetch_checksum_with_query(server):
+    assert fetch_checksum(server.url + "?token=abc") == SHA256
+    assert server.paths == ["/library.plist.sha256?token=abc"]
+
+
+@pytest.mark.parametrize("status", [403, 404, 503])
+def test_unreachable_sidecar_means_no_checksum(server, status):
+    server.sidecar = status
+    assert fetch_checksum(server.url) is None
+
+
+def test_unparsable_sidecar_means_no_checksum(monkeypatch, server):
+    monkeypatch.setattr(download, "CHECKSUM_SUFFIX", "")
+    # 校验文件的地址返回的是 plist 本身
+    assert fetch_checksum(server.url) is None
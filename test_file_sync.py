@@ -0,0 +1,134 @@
+import json
+import sqlite3
+
+import pytest
+
+from changelog import set_state, station_id
+from file_sync import FORMAT, VERSION, sync_folder
+from migrations import migrate
+from seed import build_seed, install_seed
+
+PLIST = "人物^girl^1girl^女孩\n人物^boy^1boy^男孩\n风景^sky^blue sky^天空\n"
+
+
+@pytest.fixture
+def folder(tmp_path):
+    path = tmp_path / "share"
+    path.mkdir()
+    return str(path)
+
+
+def open_db(path, station=None):
+    conn = sqlite3.connect(path, isolation_level="")
+    migrate(conn)
+    if station:
+        set_state(conn, "station_id", station)
+        conn.commit()
+    return conn
+
+
+def edit(conn, type_name, name, text, updated_at):
+    conn.execute("INSERT OR IGNORE INTO prompt_types (type_name) VALUES (?)", (type_name,))
+    type_id = conn.execute("SELECT id FROM prompt_types WHERE type_name = ?", (type_name,)).fetchone()[0]
+    conn.execute('''
+        INSERT INTO prompts (type_id, prompt_name, prompt_text, introduction, updated_at) VALUES (?, ?, ?, '', ?)
+        ON CONFLICT (type_id, prompt_name) DO UPDATE SET
+            prompt_text = excluded.prompt_text, updated_at = excluded.updated_at
+    ''', (type_id, name, text, updated_at))
+    conn.commit()
+
+
+def library(conn):
+    return sorted(conn.execute('''
+        SELECT prompt_types.type_name, prompts.prompt_name, prompts.prompt_text
+        FROM prompts JOIN prompt_types ON prompt_types.id = prompts.type_id
+    '''))
+
+
+def test_seeded_installs_exchange_changes(tmp_path, folder):
+    plist = tmp_path / "default.plist"
+    plist.write_text(PLIST, encoding="utf-8")
+    seed = str(tmp_path / "seed.db")
+    build_seed(str(plist), seed)
+    conns = []
+    for name in ("a.db", "b.db"):
+        install_seed(str(tmp_path / name), seed)
+        conns.append(open_db(str(tmp_path / name)))
+    a, b = conns
+    assert station_id(a) != station_id(b)
+
+    sync_folder(a, folder)
+    sync_folder(b, folder)
+    edit(a, "人物", "girl", "edited on a", 2000000000)
+    sync_folder(a, folder)
+    result = sync_folder(b, folder)
+
+    assert result.applied == 1
+    assert ("人物", "girl", "edited on a") in library(b)
+    assert library(a) == library(b)
+
+
+def test_concurrent_edits_converge(tmp_path, folder):
+    a = open_db(str(tmp_path / "a.db"), "a")
+    b = open_db(str(tmp_path / "b.db"), "b")
+    c = open_db(str(tmp_path / "c.db"), "c")
+    edit(a, "人物", "girl", "1girl", 100)
+    for _ in range(2):
+        for conn in (a, b, c):
+            sync_folder(conn, folder)
+
+    # 同一条提示词在两台机器上同时修改，修改时间较晚的获胜
+    edit(a, "人物", "girl", "from a", 300)
+    edit(b, "人物", "girl", "from b", 200)
+    b.execute("INSERT INTO presets (preset_name, prompt, negative_prompt) VALUES ('p', 'x', 'y')")
+    b.commit()
+    for _ in range(2):
+        for conn in (a, b, c):
+            sync_folder(conn, folder)
+
+    assert library(a) == library(b) == library(c) == [("人物", "girl", "from a")]
+    assert c.execute("SELECT preset_name, prompt FROM presets").fetchall() == [("p", "x")]
+    assert sync_folder(a, folder) == (0, 0, 0, 0)
+
+
+def test_incomplete_batch_is_applied_once_complete(tmp_path, folder):
+    a = open_db(str(tmp_path / "a.db"), "a")
+    b = open_db(str(tmp_path / "b.db"), "b")
+    edit(a, "人物", "girl", "1girl", 100)
+    sync_folder(a, folder)
+    log = tmp_path / "share" / "a.jsonl"
+    data = log.read_bytes()
+
+    # 文件只同步了一部分：没有 commit 行的批次不应用
+    log.write_bytes(data[:-10])
+    assert sync_folder(b, folder).applied == 0
+    assert library(b) == []
+
+    log.write_bytes(data)
+    # 类型和提示词各一条
+    assert sync_folder(b, folder).applied == 2
+    assert library(b) == [("人物", "girl", "1girl")]
+
+
+def test_malformed_lines_are_skipped(tmp_path, folder):
+    b = open_db(str(tmp_path / "b.db"), "b")
+    good = {"op": "upsert", "kind": "prompt", "type": "人物", "name": "girl", "prompt_text": "1girl",
+            "introduction": "", "updated_at": 100, "vv": {"x": 1}, "ts": 100}
+    lines = [
+        {"format": FORMAT, "version": VERSION, "station": "x", "seq": 1},
+        good,
+        {"op": "upsert", "kind": "prompt", "type": "人物", "name": "boy"},
+        dict(good, name="bad vector", vv=["x", 1]),
+        dict(good, kind="unknown"),
+    ]
+    text = "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines)
+    text += '{"op": "upsert", "kind": "pro\n{"commit": 1}\n'
+    log = tmp_path / "share" / "x.jsonl"
+    log.write_text(text, encoding="utf-8")
+
+    result = sync_folder(b, folder)
+    assert (result.pulled, result.applied, result.skipped) == (1, 1, 4)
+    assert library(b) == [("人物", "girl", "1girl")]
+    assert b.execute("SELECT value FROM sync_state WHERE name = 'cursor:x'").fetchone()[0] == log.stat().st_size
+    # 读取位置已经越过坏行，之后的同步不会再失败
+    assert sync_folder(b, folder) == (0, 0, 0, 0)
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+from compressed import CODECS
+from lint import ERROR, WARNING, lint_file, lint_plist
+
+PLIST = (
+    "人物^girl^1girl^女孩\n"
+    "人物^boy^1boy\n"
+    "风景^sky^blue sky^天空\n"
+    "人物^girl^1girl, solo^重复\n"
+    "^empty^x^\n"
+) * 50
+
+
+def write(path, data):
+    codec = CODECS.get(path.suffix)
+    if codec:
+        with codec.open(path, "wb") as f:
+            f.write(data)
+    else:
+        path.write_bytes(data)
+    return str(path)
+
+
+@pytest.mark.parametrize("suffix", sorted(CODECS))
+def test_compressed_plist_matches_plain(tmp_path, suffix):
+    data = PLIST.encode("utf-8")
+    plain = lint_plist(write(tmp_path / "library.plist", data), workers=1, chunk_size=64)
+    compressed = lint_file(write(tmp_path / f"library.plist{suffix}", data))
+
+    assert compressed == plain
+    assert lint_plist(str(tmp_path / f"library.plist{suffix}"), chunk_size=64) == plain
+    assert (2, ERROR, "字段数为 3，应为 4") in plain
+    assert (4, WARNING, "重复的类型和名称 (人物, girl)，首次出现在第 1 行") in plain
+    assert (250, ERROR, "类型为空") in plain
+
+
+def test_compressed_json(tmp_path):
+    data = json.dumps({"人物": {"girl": {"prompt_text": "", "introduction": ""}}}, ensure_ascii=False, indent=4)
+    path = write(tmp_path / "library.json.gz", data.encode("utf-8"))
+    assert lint_file(path) == [(3, ERROR, "提示词文本为空")]
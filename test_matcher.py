@@ -0,0 +1,33 @@
+import pytest
+
+from matcher import PromptMatcher, fold_case, split_variants
+
+ENTRIES = [
+    ("风格", "杰作", "masterpiece", "高质量"),
+    ("地点", "伊斯坦布尔", "İstanbul", ""),
+    ("背景", "玻璃", "through glass/against glass", ""),
+]
+
+
+@pytest.mark.parametrize("text", ["İstanbul", "ǅ", "Straße", "ΣΑΣ", "Ａ", "abc"])
+def test_fold_case_preserves_length(text):
+    assert len(fold_case(text)) == len(text)
+
+
+def test_offsets_after_non_ascii_prefix():
+    text = "İstanbul, masterpiece"
+    matches = PromptMatcher(ENTRIES).find_all(text)
+    assert matches == [(0, 8, "İstanbul"), (10, 21, "masterpiece")]
+    assert text[10:21] == "masterpiece"
+
+
+def test_annotate_spans_map_back_to_text():
+    matcher = PromptMatcher(ENTRIES)
+    text = "İİ, MASTERPIECE, Against Glass, unknown"
+    matches, unknown = matcher.annotate(text)
+    assert [text[s:e] for s, e, _, _ in matches] == ["MASTERPIECE", "Against Glass"]
+    assert [text[s:e] for s, e in unknown] == ["İİ", "unknown"]
+
+
+def test_split_variants():
+    assert split_variants(" Through  Glass/against glass/through glass ") == ["through glass", "against glass"]
@@ -0,0 +1,44 @@
+import sqlite3
+
+import pytest
+
+from bench import OLD_LAYOUTS
+from migrations import LATEST_VERSION, PROMPT_LOG_TRIGGERS, get_version, migrate, rebuild_table, table_columns
+
+
+@pytest.mark.parametrize("layout", sorted(OLD_LAYOUTS))
+def test_old_layouts_are_upgraded(layout):
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(OLD_LAYOUTS[layout])
+    conn.execute("INSERT INTO prompt_types (type_name) VALUES ('人物')")
+    conn.execute("INSERT INTO prompts (type_id, prompt_name, prompt_text) VALUES (1, 'girl', '1girl')")
+    # 旧版本留下的同名重复行只保留最后一行
+    conn.execute("INSERT INTO prompts (type_id, prompt_name, prompt_text) VALUES (1, 'girl', '1girl, solo')")
+    conn.execute("INSERT INTO presets (preset_name, prompt, negative_prompt) VALUES ('p', 'a', 'b')")
+    conn.commit()
+
+    assert migrate(conn) == (0, LATEST_VERSION)
+    assert table_columns(conn.cursor(), "prompts")[-2:] == ["introduction", "updated_at"]
+    assert "introduction" in table_columns(conn.cursor(), "presets")
+    assert conn.execute("SELECT prompt_name, prompt_text FROM prompts").fetchall() == [("girl", "1girl, solo")]
+    assert conn.execute("SELECT preset_name FROM presets").fetchall() == [("p",)]
+
+
+def test_rebuild_table_with_log_triggers():
+    conn = sqlite3.connect(":memory:")
+    migrate(conn)
+    conn.execute("INSERT INTO prompt_types (type_name) VALUES ('人物')")
+    conn.execute("INSERT INTO prompts (type_id, prompt_name, prompt_text) VALUES (1, 'girl', '1girl')")
+    conn.commit()
+
+    # prompt_types 上的触发器引用了 prompts，重建时改名不能失败
+    cursor = conn.cursor()
+    rebuild_table(cursor, "prompts")
+    for trigger in PROMPT_LOG_TRIGGERS.values():
+        cursor.execute(trigger)
+    conn.commit()
+
+    assert get_version(conn) == LATEST_VERSION
+    assert conn.execute("SELECT prompt_name, prompt_text FROM prompts").fetchall() == [("girl", "1girl")]
+    conn.execute("UPDATE prompt_types SET type_name = '角色'")
+    assert conn.execute("SELECT COUNT(*) FROM change_log WHERE kind = 'prompt'").fetchone()[0] >= 2
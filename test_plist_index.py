@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from plist_index import PlistChangedError, PlistLibrary
+
+PLIST = "人物^girl^1girl^女孩\n人物^boy^1boy^男孩\n风景^sky^blue sky^天空\n"
+
+
+def rewrite(path, text):
+    stat = os.stat(path)
+    path.write_text(text, encoding="utf-8")
+    # 保证修改时间一定变化
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+@pytest.fixture
+def plist(tmp_path):
+    path = tmp_path / "library.plist"
+    path.write_text(PLIST, encoding="utf-8")
+    return path
+
+
+def test_browse(plist):
+    library = PlistLibrary(str(plist))
+    prompts = library["人物"]["prompts"]
+    assert list(library) == ["人物", "风景"]
+    assert list(prompts) == ["girl", "boy"]
+    assert prompts["boy"][1:] == ("1boy", "男孩")
+    assert library.search(["sky"]) == [("风景", "sky", "blue sky", "天空")]
+
+
+def test_truncated_file_is_remapped(plist):
+    library = PlistLibrary(str(plist))
+    prompts = library["人物"]["prompts"]
+    assert "boy" in prompts
+
+    rewrite(plist, "人物^girl^1girl^女孩\n")
+    # 旧的映射越过了文件末尾，不能再使用
+    with pytest.raises(PlistChangedError):
+        prompts["boy"]
+    with pytest.raises(PlistChangedError):
+        list(prompts)
+    assert list(library) == ["人物"]
+    assert dict(library["人物"]["prompts"]) == {"girl": (0, "1girl", "女孩")}
+    assert library.search(["boy"]) == []
+
+
+def test_unchanged_file_is_not_remapped(plist):
+    library = PlistLibrary(str(plist))
+    generation = library.generation
+    prompts = library["风景"]["prompts"]
+    assert not library.check()
+    assert prompts["sky"][1] == "blue sky"
+    assert library.generation == generation
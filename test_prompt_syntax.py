@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+from prompt_syntax import _normalize_full, normalize_many, normalize_prompt, parse_prompt, to_prompt
+
+# 随机 prompt 的组成部分，覆盖所有语法字符、转义、扩展网络和 BREAK
+TOKENS = [
+    "(", ")", "[", "]", ":", "|", ",", ", ", "\\", "\\(", "\\)", "\\\\", "<lora:x:0.8>", "<", ">",
+    "BREAK", " ", "  ", "\n", "a", "Cat", "blue sky", "1girl", "1.2", "0.5", ".5", "-1",
+]
+CASES = 3000
+
+normalize = normalize_prompt.__wrapped__
+
+
+def random_prompts(seed):
+    rng = random.Random(seed)
+    for _ in range(CASES):
+        yield "".join(rng.choice(TOKENS) for _ in range(rng.randint(0, 14)))
+
+
+@pytest.mark.parametrize("dedupe", [True, False])
+def test_normalize_is_idempotent(dedupe):
+    for text in random_prompts(1):
+        normalized = normalize(text, dedupe)
+        assert normalize(normalized, dedupe) == normalized, text
+
+
+def test_to_prompt_round_trips_ast():
+    for text in random_prompts(2):
+        nodes = parse_prompt(text)
+        assert parse_prompt(to_prompt(nodes)) == nodes, text
+
+
+@pytest.mark.parametrize("dedupe", [True, False])
+def test_fast_paths_match_full_parse(dedupe):
+    for text in random_prompts(3):
+        if text:
+            assert normalize(text, dedupe) == _normalize_full(text, dedupe), text
+
+
+@pytest.mark.parametrize("text, expected", [
+    # 相邻的同权重片段属于同一个标签
+    ("(a)(b)", "(ab:1.1)"),
+    ("(a:1.2)(b)", "(a:1.2)(b:1.1)"),
+    ("((a))", "(a:1.21)"),
+    ("[a]", "(a:0.909)"),
+    ("(a, b)", "(a:1.1), (b:1.1)"),
+    # 转义的括号是普通字符
+    ("\\(", "\\("),
+    ("\\(a\\)", "\\(a\\)"),
+    ("\\\\", "\\\\"),
+    # 未闭合的左括号到末尾结束，多余的右括号按普通字符处理
+    ("(a", "(a:1.1)"),
+    ("[a", "(a:0.909)"),
+    ("a)", "a\\)"),
+    ("a, A, (a:1.3)", "(a:1.3)"),
+    ("[a|b]", "[a|b]"),
+    ("[a:b:0.5]", "[a:b:0.5]"),
+    ("<lora:x:0.8>, a", "<lora:x:0.8>, a"),
+    ("a BREAK a", "a BREAK a"),
+])
+def test_edge_cases(text, expected):
+    assert normalize_prompt(text) == expected
+
+
+def test_normalize_many_matches_normalize_prompt():
+    prompts = list(random_prompts(4))[:200]
+    assert normalize_many(prompts) == [normalize(p, True) if p else "" for p in prompts]
@@ -0,0 +1,25 @@
+import sqlite3
+
+from changelog import station_id
+from seed import build_seed, install_seed
+
+
+def test_install_seed_assigns_new_station_id(tmp_path):
+    plist = tmp_path / "default.plist"
+    plist.write_text("人物^girl^1girl^女孩\n风景^sky^blue sky^天空\n", encoding="utf-8")
+    seed = str(tmp_path / "seed.db")
+    build_seed(str(plist), seed)
+
+    ids = []
+    for name in ("a.db", "b.db"):
+        db_path = str(tmp_path / name)
+        assert install_seed(db_path, seed)
+        conn = sqlite3.connect(db_path)
+        try:
+            ids.append(station_id(conn))
+            assert conn.execute("SELECT COUNT(*) FROM sync_state WHERE name != 'station_id'").fetchone()[0] == 0
+            assert conn.execute("SELECT COUNT(*) FROM row_versions").fetchone()[0] == 0
+            assert conn.execute("SELECT COUNT(*) FROM prompts").fetchone()[0] == 2
+        finally:
+            conn.close()
+    assert ids[0] and ids[1] and ids[0] != ids[1]
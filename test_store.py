@@ -0,0 +1,43 @@
+import sqlite3
+
+import pytest
+
+from bench import MIN_MEMORY_RATIO, LibraryModel, load_nested_dict, retained_bytes
+from library import import_plist_lines, load_prompt_type_dict
+from migrations import migrate
+from store import PromptColumns
+
+SIZE = 20000
+
+
+@pytest.fixture(scope="module")
+def conn():
+    # 按 default.plist 的分布生成合成库，与 bench.py 相同
+    rows = LibraryModel().generate(SIZE)
+    conn = sqlite3.connect(":memory:")
+    migrate(conn)
+    import_plist_lines(conn, ("^".join(row) for row in rows))
+    yield conn
+    conn.close()
+
+
+def test_columns_match_nested_dict(conn):
+    nested = load_nested_dict(conn)
+    store = load_prompt_type_dict(conn)
+    assert set(store) == set(nested)
+    for type_name, entry in nested.items():
+        assert store[type_name]['id'] == entry['id']
+        assert dict(store[type_name]['prompts'].items()) == entry['prompts']
+
+
+def test_memory_footprint_reduced(conn):
+    nested = retained_bytes(load_nested_dict, conn)
+    store = retained_bytes(load_prompt_type_dict, conn)
+    assert nested / store >= MIN_MEMORY_RATIO, (nested, store)
+
+
+def test_duplicate_names_keep_first_position_last_value():
+    columns = PromptColumns([1, 2, 3], ["a", "b", "a"], ["x", "y", "z"], ["", None, "i"])
+    assert list(columns) == ["a", "b"]
+    assert columns["a"] == (3, "z", "i")
+    assert columns["b"] == (2, "y", "")
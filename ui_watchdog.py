@@ -0,0 +1,131 @@
+"""
+界面主循环卡顿检测。
+
+主线程用 root.after 定时更新心跳时间，后台线程检查心跳：超过阈值没有更新说明某个
+Tk 回调占住了主循环。此时后台线程用 sys._current_frames() 抓取主线程的 Python 调用栈，
+卡顿期间每隔一个阈值再抓一次（最多 MAX_SAMPLES 次），写入卡顿报告文件；
+恢复后在报告末尾补上总时长。报告里的调用栈指明了哪些回调应该移出界面线程。
+
+设置环境变量 PROMPTS_WATCHDOG 开启：值为阈值毫秒数，或 "1" 使用默认阈值。
+"""
+import os
+import sys
+import threading
+import time
+import traceback
+
+import metrics
+
+WATCHDOG_ENV = "PROMPTS_WATCHDOG"
+DEFAULT_THRESHOLD_MS = 500
+HEARTBEAT_MS = 100
+# 一次卡顿最多抓取的调用栈数
+MAX_SAMPLES = 5
+
+
+class Watchdog:
+    """
+    参数:
+    root: Tk 根窗口。
+    directory: 卡顿报告的保存目录，第一次卡顿时创建。
+    threshold_ms: 心跳超过多少毫秒没有更新视为卡顿。
+    """
+
+    def __init__(self, root, directory, threshold_ms=DEFAULT_THRESHOLD_MS, heartbeat_ms=HEARTBEAT_MS):
+        self.root = root
+        self.directory = directory
+        self.threshold = threshold_ms / 1000
+        self.heartbeat_ms = heartbeat_ms
+        self.main_thread_id = threading.main_thread().ident
+        self.last_beat = time.monotonic()
+        self.reports = []
+        self._job = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._monitor, name="watchdog", daemon=True)
+        self._stalls = metrics.counter("ui.stalls")
+        self._stall_latency = metrics.histogram("ui.stall")
+
+    def start(self):
+        self._beat()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._job is not None:
+            try:
+                self.root.after_cancel(self._job)
+            except Exception:
+                pass
+            self._job = None
+
+    def _beat(self):
+        self.last_beat = time.monotonic()
+        self._job = self.root.after(self.heartbeat_ms, self._beat)
+
+    def _monitor(self):
+        poll = min(self.threshold / 4, self.heartbeat_ms / 1000)
+        stall_start = None
+        report = None
+        samples = 0
+        while not self._stop.wait(poll):
+            beat = self.last_beat
+            now = time.monotonic()
+            if now - beat < self.threshold:
+                if stall_start is not None:
+                    # 主循环恢复，补上本次卡顿的总时长
+                    duration = beat - stall_start
+                    self._stall_latency.record(duration * 1e9)
+                    self._append(report, f"\n恢复，卡顿共 {duration * 1000:.0f} ms\n")
+                    stall_start = None
+                continue
+            if stall_start is None:
+                stall_start = beat
+                samples = 0
+                self._stalls.inc()
+                report = self._open_report()
+            if samples < MAX_SAMPLES and now - stall_start >= self.threshold * (samples + 1):
+                samples += 1
+                self._append(report, self._sample(now - stall_start, samples))
+
+    def _sample(self, elapsed, index):
+        frame = sys._current_frames().get(self.main_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else "(无法获取主线程调用栈)\n"
+        action = metrics.current_action(self.main_thread_id) or "(无)"
+        return f"\n--- 第 {index} 次采样：已卡顿 {elapsed * 1000:.0f} ms，当前操作 {action} ---\n{stack}"
+
+    def _open_report(self):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+        except OSError as e:
+            print(f"无法创建卡顿报告目录: {e}")
+            return None
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(self.directory, f"stall-{stamp}-{len(self.reports) + 1}.txt")
+        self.reports.append(path)
+        self._append(path, f"界面卡顿报告 {time.strftime('%Y-%m-%d %H:%M:%S')}\n阈值 {self.threshold * 1000:.0f} ms\n")
+        return path
+
+    @staticmethod
+    def _append(path, text):
+        if path is None:
+            return
+        try:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(text)
+        except OSError as e:
+            print(f"写入卡顿报告失败: {e}")
+
+
+def start_watchdog(root, directory):
+    """
+    按环境变量 PROMPTS_WATCHDOG 启动卡顿检测，未开启时返回 None。
+    """
+    value = os.environ.get(WATCHDOG_ENV)
+    if not value:
+        return None
+    try:
+        threshold_ms = DEFAULT_THRESHOLD_MS if value == "1" else float(value)
+    except ValueError:
+        threshold_ms = DEFAULT_THRESHOLD_MS
+    return Watchdog(root, directory, threshold_ms).start()